@@ -0,0 +1,110 @@
+import os
+
+# Service configuration, every value can be overridden through the environment
+
+# Bulk points lookups for more ids than this are streamed instead of built in memory
+BULK_POINTS_STREAM_THRESHOLD = int(os.environ.get('BULK_POINTS_STREAM_THRESHOLD', 10000))
+
+# Receipt storage backend, 'memory', 'sharded', 'sqlite', 'bounded', 'journal' or 'shared'. Use 'shared'
+# when running more than one worker process, every worker then talks to one store server
+# (python -m app.storage)
+STORE_BACKEND = os.environ.get('STORE_BACKEND', 'memory')
+
+# Partitions of the sharded backend, an in memory store with a lock per partition for
+# handlers running on HANDLER_EXECUTOR=thread
+STORE_SHARDS = int(os.environ.get('STORE_SHARDS', 16))
+
+# Database file used by the sqlite backend
+STORE_PATH = os.environ.get('STORE_PATH', 'receipts.db')
+
+# Limits of the bounded backend, an in memory store holding at most STORE_MAX_ENTRIES
+# receipts and about STORE_MAX_BYTES bytes of them (0 for no limit). STORE_EVICTION 'lru'
+# evicts the least recently used receipts first, 'ttl' the oldest, which also expire
+# STORE_TTL_SECONDS after they were stored. Evicted receipts are moved to a SQLite file at
+# STORE_SPILL_PATH and read back from it, without one they are dropped
+STORE_MAX_ENTRIES = int(os.environ.get('STORE_MAX_ENTRIES', 0))
+STORE_MAX_BYTES = int(os.environ.get('STORE_MAX_BYTES', 0))
+STORE_EVICTION = os.environ.get('STORE_EVICTION', 'lru')
+STORE_TTL_SECONDS = float(os.environ.get('STORE_TTL_SECONDS', 0))
+STORE_SPILL_PATH = os.environ.get('STORE_SPILL_PATH', '')
+
+# Keep retailer and purchase date indexes of the stored receipts for GET /receipts, 1 or 0.
+# They are kept per process, so queries answer 501 with STORE_BACKEND shared or
+# HANDLER_EXECUTOR process, where other processes write receipts this one can't index
+STORE_INDEXES = int(os.environ.get('STORE_INDEXES', 1))
+
+# Keep points aggregates per retailer and purchase date for GET /receipts/aggregates, 1 or 0.
+# Like the indexes they are kept per process and answer 501 where other processes store receipts
+AGGREGATES = int(os.environ.get('AGGREGATES', 1))
+
+# Rescore the stored receipts in the background whenever another rule set becomes active,
+# 1 or 0. Receipts are rescored RESCORE_CHUNK_SIZE at a time, pausing between chunks so
+# rescoring takes about RESCORE_SHARE of one core and requests keep the rest. Either way
+# reads rescore stale receipts themselves. Like the aggregates it runs per process and not
+# with STORE_BACKEND=shared or HANDLER_EXECUTOR=process
+RESCORE = int(os.environ.get('RESCORE', 1))
+RESCORE_CHUNK_SIZE = int(os.environ.get('RESCORE_CHUNK_SIZE', 100))
+RESCORE_SHARE = float(os.environ.get('RESCORE_SHARE', 0.25))
+
+# Write behind journal of the journal backend, an in memory store whose writes are appended
+# to log files in the JOURNAL_PATH directory by a background writer. Writes are synced in
+# groups of up to JOURNAL_BATCH_SIZE of those queued during the last sync, waiting up to
+# JOURNAL_FLUSH_SECONDS for more. JOURNAL_WAIT=1 answers ingest requests once their receipt is synced, pair it with
+# HANDLER_EXECUTOR=thread so concurrent requests share syncs. At most JOURNAL_QUEUE_SIZE writes
+# wait for the writer. Every JOURNAL_SNAPSHOT_RECORDS records a snapshot replaces the log
+JOURNAL_PATH = os.environ.get('JOURNAL_PATH', 'receipts.journal')
+JOURNAL_BATCH_SIZE = int(os.environ.get('JOURNAL_BATCH_SIZE', 256))
+JOURNAL_FLUSH_SECONDS = float(os.environ.get('JOURNAL_FLUSH_SECONDS', 0))
+JOURNAL_WAIT = int(os.environ.get('JOURNAL_WAIT', 0))
+JOURNAL_QUEUE_SIZE = int(os.environ.get('JOURNAL_QUEUE_SIZE', 10000))
+JOURNAL_SNAPSHOT_RECORDS = int(os.environ.get('JOURNAL_SNAPSHOT_RECORDS', 1000000))
+
+# Unix socket and auth key of the store server used by the shared backend
+STORE_ADDRESS = os.environ.get('STORE_ADDRESS', '/tmp/receipts.sock')
+STORE_AUTHKEY = os.environ.get('STORE_AUTHKEY', 'receipts').encode()
+
+# Where handlers run. 'inline' runs them on the event loop, 'thread' and 'process' run
+# them on a pool of HANDLER_WORKERS. 'process' needs a store every process can reach
+# (STORE_BACKEND sqlite or shared)
+HANDLER_EXECUTOR = os.environ.get('HANDLER_EXECUTOR', 'inline')
+HANDLER_WORKERS = int(os.environ.get('HANDLER_WORKERS', 4))
+
+# Requests allowed to wait for a pool worker, requests beyond that get a 503
+HANDLER_QUEUE_SIZE = int(os.environ.get('HANDLER_QUEUE_SIZE', 64))
+
+# Points rule set, a JSON file like DEFAULT_RULES in handlers/rules.py. Without one the
+# built in rules are used. The file is checked for changes every RULES_CHECK_SECONDS and
+# reloaded without a restart
+RULES_PATH = os.environ.get('RULES_PATH', '')
+RULES_CHECK_SECONDS = float(os.environ.get('RULES_CHECK_SECONDS', 5))
+
+# Let POST /rules/reload change the rules, 1 or 0. Anyone who can reach the service can
+# then rescore every stored receipt, so it's off unless asked for. It answers 409 with
+# HANDLER_EXECUTOR=process or STORE_BACKEND=shared, where only RULES_PATH reaches every process
+RULES_RELOAD = int(os.environ.get('RULES_RELOAD', 0))
+
+# Every Nth receipt scored is timed rule by rule for the rules stats
+RULE_TIMING_INTERVAL = int(os.environ.get('RULE_TIMING_INTERVAL', 100))
+
+# Entries kept by each scoring memo, the per retailer results of the most recently scored
+# names (0 turns them off). SCORING_MEMO_CLEAR_ON_RELOAD=1 empties them whenever a new
+# rule set becomes active
+SCORING_MEMO_SIZE = int(os.environ.get('SCORING_MEMO_SIZE', 10000))
+SCORING_MEMO_CLEAR_ON_RELOAD = int(os.environ.get('SCORING_MEMO_CLEAR_ON_RELOAD', 0))
+
+# What happens to a receipt submitted again with the same content within
+# DEDUP_WINDOW_SECONDS: 'return' answers with the id it was first stored under, 'reject'
+# answers 409, 'off' stores it again. At most DEDUP_MAX_ENTRIES recent receipts are remembered
+DEDUP_POLICY = os.environ.get('DEDUP_POLICY', 'return')
+DEDUP_WINDOW_SECONDS = float(os.environ.get('DEDUP_WINDOW_SECONDS', 86400))
+DEDUP_MAX_ENTRIES = int(os.environ.get('DEDUP_MAX_ENTRIES', 100000))
+
+# Log level of the service, per request summaries are written at INFO and scoring detail at DEBUG
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+
+# Log records waiting to be written are held in a bounded queue, records arriving while
+# it's full are dropped rather than slowing down requests
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+# Fraction of requests that log their full request body when LOG_LEVEL is DEBUG
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01))
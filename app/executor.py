@@ -0,0 +1,85 @@
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ('inline', 'thread', 'process')
+
+
+class ExecutorSaturated(Exception):
+    pass
+
+
+def timed_call(function, args):
+    # runs on the worker, the handler time is measured there so no clock is shared across processes
+    started = time.perf_counter()
+    try:
+        return True, function(*args), time.perf_counter() - started
+    except Exception as error:
+        return False, error, time.perf_counter() - started
+
+
+class BoundedExecutor:
+    '''
+    Runs synchronous work off the event loop on a thread or process pool. At most
+    workers + queue_size calls are accepted at once, calls beyond that are rejected
+    straight away with ExecutorSaturated instead of queueing without bound. The
+    'inline' mode runs calls directly on the event loop, as the routes always did.
+    '''
+
+    def __init__(self, mode='inline', workers=4, queue_size=64, initializer=None, initargs=()):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f'Unknown executor mode: {mode}')
+        self.mode = mode
+        self.limit = workers + queue_size
+        self.in_flight = 0
+        self.rejected = 0
+
+        if mode == 'thread':
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='handler',
+                                           initializer=initializer, initargs=initargs)
+        elif mode == 'process':
+            # spawned so workers don't inherit the server's threads and open connections
+            self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=initializer, initargs=initargs)
+        else:
+            self.pool = None
+
+    async def run(self, function, *args, timings=None):
+        '''
+        Returns function(*args). When a timings dict is given its 'queued' and 'handler'
+        entries are set to the seconds spent waiting for a worker and running the call.
+        '''
+        if timings is None:
+            timings = {}
+
+        if self.pool is None:
+            ok, result, timings['handler'] = timed_call(function, args)
+            timings['queued'] = 0.0
+        else:
+            if self.in_flight >= self.limit:
+                self.rejected += 1
+                raise ExecutorSaturated(f'{self.in_flight} calls already in progress')
+
+            submitted = time.perf_counter()
+            self.in_flight += 1
+            future = self.pool.submit(timed_call, function, args)
+            loop = asyncio.get_running_loop()
+            # released when the call actually finishes, even if the awaiting request is cancelled
+            future.add_done_callback(lambda _: loop.call_soon_threadsafe(self.release))
+            ok, result, timings['handler'] = await asyncio.wrap_future(future)
+            timings['queued'] = max(time.perf_counter() - submitted - timings['handler'], 0.0)
+
+        if not ok:
+            raise result
+        return result
+
+    def release(self):
+        self.in_flight -= 1
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
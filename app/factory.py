@@ -1,15 +1,44 @@
 import logging
 from handlers.get.receipts_points import ReceiptsPointsHandler
+from handlers.get.receipts_query import ReceiptsQueryHandler
+from handlers.get.receipts_aggregates import ReceiptsAggregatesHandler
 from handlers.post.receipts_process import ReceiptsProcessHandler
+from handlers.post.receipts_process_batch import ReceiptsProcessBatchHandler
+from handlers.post.receipts_points_bulk import ReceiptsPointsBulkHandler
+from handlers.get.rules_stats import RulesStatsHandler
+from handlers.get.rules_rescoring import RulesRescoringHandler
+from handlers.post.rules_reload import RulesReloadHandler, configure_rules_reload
+from handlers.rules import configure_rules
+from handlers.dedup import configure_dedup
+from handlers.memo import configure_memos
 from fastapi import HTTPException
+from storage import create_store
+from handlers.records import ReceiptRecord
+from logs import configure_logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 handler_map = {
-    'receipts': {
-        'points': ReceiptsPointsHandler,
-        'process': ReceiptsProcessHandler
+    'get': {
+        'receipts': {
+            'points': ReceiptsPointsHandler,
+            'query': ReceiptsQueryHandler,
+            'aggregates': ReceiptsAggregatesHandler
+        },
+        'rules': {
+            'stats': RulesStatsHandler,
+            'rescoring': RulesRescoringHandler
+        }
+    },
+    'post': {
+        'receipts': {
+            'points': ReceiptsPointsBulkHandler,
+            'process': ReceiptsProcessHandler,
+            'process/batch': ReceiptsProcessBatchHandler
+        },
+        'rules': {
+            'reload': RulesReloadHandler
+        }
     }
 }
 
@@ -17,23 +46,54 @@ handler_map = {
 class HandlerFactory:
 
     @staticmethod
-    def handle_route(base, handler, storage, identifier=None, request=None):
+    def handle_route(base, handler, storage, identifier=None, request=None, method='get'):
         try:
-            handler_class = handler_map.get(base, {}).get(handler, None)
+            handler_class = handler_map.get(method, {}).get(base, {}).get(handler, None)
 
             if handler_class is None:
-                logger.info(f'Base: {base}, handler: {handler} not found, returning 404')
+                logger.debug('Base: %s, handler: %s not found, returning 404', base, handler)
                 raise HTTPException(status_code=404)
             
-            return handler_map.get(base).get(handler)(base, handler, storage, identifier, request)
+            return handler_class(base, handler, storage, identifier, request)
         except HTTPException as http_error:
-            logger.error(f'''Caught http exception processing handler with base: {base}, handler: {handler}. 
-                         Detail - {http_error.detail} 
-                         Status Code - {http_error.status_code}''')
+            logger.debug('Caught http exception processing handler with base: %s, handler: %s. Detail - %s Status Code - %s',
+                         base, handler, http_error.detail, http_error.status_code)
             raise HTTPException(status_code=http_error.status_code, detail=http_error.detail)
         except Exception as general_exception:
-            logger.error(f'''Caught general exception in factory handler, raising as 500. 
-                         Error: {general_exception}''')
+            logger.error('Caught general exception in factory handler, raising as 500. Error: %s', general_exception)
             raise HTTPException(status_code=500)
-            
 
+
+def handle_route_results(storage, base, handler, identifier=None, request=None, method='get'):
+    return HandlerFactory.handle_route(base, handler, storage, identifier, request, method).results
+
+
+# Process pool workers set up their own logging, rules, dedup index and connection to the store
+
+worker_store = None
+
+
+class WorkerHTTPException(Exception):
+    # HTTPException can't be unpickled, workers send back (status_code, detail) instead
+    pass
+
+
+def initialize_worker(backend, path, address, authkey, log_level, rules_path, rules_check_seconds, rule_timing_interval,
+                      rules_reload, dedup_policy, dedup_window_seconds, dedup_max_entries, memo_size, memo_clear_on_reload):
+    global worker_store
+    configure_logging(log_level)
+    configure_memos(memo_size, memo_clear_on_reload)
+    configure_rules(rules_path, rules_check_seconds, rule_timing_interval)
+    configure_rules_reload(rules_reload, 'with HANDLER_EXECUTOR=process')
+    configure_dedup(dedup_policy, dedup_window_seconds, dedup_max_entries)
+    worker_store = create_store(backend, path, address, authkey,
+                                encode=ReceiptRecord.to_json, decode=ReceiptRecord.from_json)
+
+
+def handle_route_in_worker(base, handler, identifier=None, request=None, method='get'):
+    try:
+        results = handle_route_results(worker_store, base, handler, identifier, request, method)
+    except HTTPException as http_error:
+        raise WorkerHTTPException(http_error.status_code, http_error.detail)
+    # generators can't be sent back to the server process, streamed results are built here
+    return results if isinstance(results, dict) else list(results)
@@ -0,0 +1,366 @@
+import time
+import logging
+import threading
+from datetime import date
+from .rules import current_rules
+
+logger = logging.getLogger(__name__)
+
+# receipts scored per store write while rebuilding
+REBUILD_CHUNK_SIZE = 1000
+
+
+AGGREGATE_GROUPS = ('retailer', 'date', 'retailer_date')
+
+
+def format_cents(cents):
+    return f'{cents // 100}.{cents % 100:02d}'
+
+
+def format_date(packed_date):
+    return f'{packed_date // 10000:04d}-{packed_date // 100 % 100:02d}-{packed_date % 100:02d}'
+
+
+def ordinal(packed_date):
+    # packed_date must be a valid calendar date
+    return date(packed_date // 10000, packed_date // 100 % 100, packed_date % 100).toordinal()
+
+
+def days_between(start, end):
+    # packed dates from start through end
+    for day in range(ordinal(start), ordinal(end) + 1):
+        current = date.fromordinal(day)
+        yield current.year * 10000 + current.month * 100 + current.day
+
+
+class Totals:
+    # count, sum, min and max of the points and totals of a group of receipts
+
+    __slots__ = ('count', 'points', 'min_points', 'max_points', 'cents', 'min_cents', 'max_cents')
+
+    def __init__(self):
+        self.count = 0
+        self.points = 0
+        self.min_points = None
+        self.max_points = None
+        self.cents = 0
+        self.min_cents = None
+        self.max_cents = None
+
+    def add(self, points, cents):
+        if not self.count:
+            self.min_points = self.max_points = points
+            self.min_cents = self.max_cents = cents
+        else:
+            if points < self.min_points:
+                self.min_points = points
+            elif points > self.max_points:
+                self.max_points = points
+            if cents < self.min_cents:
+                self.min_cents = cents
+            elif cents > self.max_cents:
+                self.max_cents = cents
+        self.count += 1
+        self.points += points
+        self.cents += cents
+
+    def merge(self, other):
+        if not other.count:
+            return
+        if not self.count:
+            self.min_points, self.max_points = other.min_points, other.max_points
+            self.min_cents, self.max_cents = other.min_cents, other.max_cents
+        else:
+            self.min_points = min(self.min_points, other.min_points)
+            self.max_points = max(self.max_points, other.max_points)
+            self.min_cents = min(self.min_cents, other.min_cents)
+            self.max_cents = max(self.max_cents, other.max_cents)
+        self.count += other.count
+        self.points += other.points
+        self.cents += other.cents
+
+    def copy(self):
+        copied = Totals()
+        copied.merge(self)
+        return copied
+
+    def to_dict(self):
+        # amounts are formatted like receipt totals
+        if not self.count:
+            return {'count': 0, 'points': None, 'total': None}
+        return {
+            'count': self.count,
+            'points': {'sum': self.points, 'min': self.min_points, 'max': self.max_points,
+                       'average': round(self.points / self.count, 2)},
+            'total': {'sum': format_cents(self.cents), 'min': format_cents(self.min_cents),
+                      'max': format_cents(self.max_cents), 'average': format_cents(round(self.cents / self.count))}
+        }
+
+
+class PointsAggregates:
+    '''
+    Totals of receipts scored with one rules version per retailer, per purchase date and
+    per retailer per purchase date. Adding a receipt updates three Totals, O(1). Retailers
+    are grouped ignoring case and surrounding whitespace and reported by the spelling first
+    seen. Dates are yyyymmdd integers.
+    '''
+
+    def __init__(self, version):
+        self.version = version
+        self.by_retailer = {}
+        self.by_date = {}
+        # retailer key -> purchase date -> Totals
+        self.by_retailer_date = {}
+        self.names = {}
+        # retailer as received -> retailer key
+        self.keys = {}
+
+    def add(self, record):
+        points = record.points
+        cents = record.total_cents
+        key = self.keys.get(record.retailer, None)
+        if key is None:
+            key = self.keys[record.retailer] = record.retailer.strip().casefold()
+        retailer = self.by_retailer.get(key, None)
+        if retailer is None:
+            retailer = self.by_retailer[key] = Totals()
+            self.by_retailer_date[key] = {}
+            self.names[key] = record.retailer.strip()
+        retailer.add(points, cents)
+        day = self.by_date.get(record.purchase_date, None)
+        if day is None:
+            day = self.by_date[record.purchase_date] = Totals()
+        day.add(points, cents)
+        days = self.by_retailer_date[key]
+        retailer_day = days.get(record.purchase_date, None)
+        if retailer_day is None:
+            retailer_day = days[record.purchase_date] = Totals()
+        retailer_day.add(points, cents)
+
+    def __len__(self):
+        return sum(totals.count for totals in self.by_date.values())
+
+    def groups(self, group, retailer=None, start=None, end=None):
+        '''
+        (retailer, purchase date, Totals) per group, sorted, for the receipts from retailer
+        (any without one) purchased from start through end (either open without one).
+        Grouped by retailer with a date range, each retailer's days in range are merged.
+        '''
+        keys = sorted(self.by_retailer) if retailer is None else [retailer.strip().casefold()]
+        keys = [key for key in keys if key in self.by_retailer]
+        calendar = None
+        if start is not None and end is not None and ordinal(end) - ordinal(start) < len(self.by_date):
+            # short ranges look up each of their days rather than going through every day kept
+            calendar = list(days_between(start, end))
+
+        def in_range(days):
+            if calendar is not None and len(calendar) < len(days):
+                return [day for day in calendar if day in days]
+            return sorted(day for day in days if (start is None or day >= start) and (end is None or day <= end))
+
+        if group == 'retailer':
+            if start is None and end is None:
+                return [(self.names[key], None, self.by_retailer[key]) for key in keys]
+            rows = []
+            for key in keys:
+                days = self.by_retailer_date[key]
+                totals = Totals()
+                for day in in_range(days):
+                    totals.merge(days[day])
+                if totals.count:
+                    rows.append((self.names[key], None, totals))
+            return rows
+        if group == 'date':
+            days = self.by_date if retailer is None else self.by_retailer_date[keys[0]] if keys else {}
+            return [(None, day, days[day]) for day in in_range(days)]
+        return [(self.names[key], day, self.by_retailer_date[key][day]) for key in keys
+                for day in in_range(self.by_retailer_date[key])]
+
+
+class Rebuild:
+    # aggregates being rebuilt for a rules version, and the records ingest added to them by id
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.aggregates = PointsAggregates(rules.version)
+        self.claimed = {}
+        self.thread = None
+
+    def claim(self, receipt_id, record):
+        if record.rules_version != self.rules.version:
+            record = record.with_points(self.rules.score(record), self.rules.version)
+        self.claimed[receipt_id] = record
+        self.aggregates.add(record)
+
+
+# The aggregates of the receipts stored by this process, None when they aren't kept.
+# Under the process executor or a shared store other processes store receipts too, and
+# the server doesn't keep them
+
+aggregates = None
+rebuild = None
+aggregates_store = None
+# ids ingest is storing, counted once they're stored, see expect_receipts
+pending = set()
+aggregates_lock = threading.Lock()
+
+
+def configure_aggregates(store=None):
+    '''
+    Keeps aggregates of the receipts in store, built from what it already holds in the
+    background, or stops keeping them without a store.
+    '''
+    global aggregates, rebuild, aggregates_store
+    with aggregates_lock:
+        aggregates_store = store
+        aggregates = rebuild = None
+        pending.clear()
+        if store is not None:
+            aggregates = PointsAggregates(None)
+            start_rebuild(current_rules())
+
+
+def expect_receipts(receipt_ids):
+    '''
+    Called before ingest stores receipt_ids. Until record_receipts or forget_receipts is
+    called for them a rebuild scanning the store leaves them out, so each receipt is counted
+    once, by record_receipts, and only once it was stored.
+    '''
+    if aggregates is None:
+        return
+    with aggregates_lock:
+        pending.update(receipt_ids)
+
+
+def record_receipts(entries):
+    '''
+    Adds the scored records ingest just stored, by receipt id, to the aggregates, O(1) each.
+    A record scored with rules the aggregates weren't built for starts a rebuild, which
+    counts it under the current rules.
+    '''
+    if aggregates is None:
+        return
+    with aggregates_lock:
+        if aggregates is None:
+            return
+        for receipt_id, record in entries.items():
+            pending.discard(receipt_id)
+            if rebuild is None:
+                if record.rules_version == aggregates.version:
+                    aggregates.add(record)
+                    continue
+                start_rebuild(current_rules())
+            rebuild.claim(receipt_id, record)
+
+
+def forget_receipts(receipt_ids):
+    # storing receipt_ids failed, they're never counted
+    if aggregates is None:
+        return
+    with aggregates_lock:
+        pending.difference_update(receipt_ids)
+
+
+def current_aggregates():
+    '''
+    (aggregates, rebuilding). The aggregates are the latest complete ones, rebuilding is
+    true while newer ones are built for changed rules. Reading them after the rules changed
+    without a receipt stored since starts that rebuild. None when aggregates aren't kept.
+    '''
+    if aggregates is None:
+        return None, False
+    with aggregates_lock:
+        if aggregates is None:
+            return None, False
+        if rebuild is None and aggregates.version != current_rules().version:
+            start_rebuild(current_rules())
+        return aggregates, rebuild is not None
+
+
+def summarize(group, retailer=None, start=None, end=None):
+    '''
+    The aggregates grouped by 'retailer', 'date' or 'retailer_date', see
+    PointsAggregates.groups, with the totals over every group. None when they aren't kept.
+    '''
+    latest, rebuilding = current_aggregates()
+    if latest is None:
+        return None
+    with aggregates_lock:
+        # copied holding the lock, ingest doesn't wait for the formatting
+        groups = [(name, day, Totals.copy(totals)) for name, day, totals in latest.groups(group, retailer, start, end)]
+    overall = Totals()
+    rows = []
+    for name, day, totals in groups:
+        overall.merge(totals)
+        row = {}
+        if name is not None:
+            row['retailer'] = name
+        if day is not None:
+            row['purchaseDate'] = format_date(day)
+        row.update(totals.to_dict())
+        rows.append(row)
+    return {'rules_version': latest.version, 'rebuilding': rebuilding, 'overall': overall.to_dict(), 'groups': rows}
+
+
+def start_rebuild(rules, claimed=None):
+    # called holding the lock, claimed are records ingest added to a rebuild this one replaces
+    global rebuild
+    rebuild = Rebuild(rules)
+    for receipt_id, record in (claimed or {}).items():
+        rebuild.claim(receipt_id, record)
+    logger.info('Rebuilding points aggregates for rule set %s v%s', rules.name, rules.version)
+    rebuild.thread = threading.Thread(target=run_rebuild, args=(rebuild, aggregates_store), daemon=True,
+                                      name='aggregates-rebuild')
+    rebuild.thread.start()
+
+
+def run_rebuild(target, store):
+    '''
+    Scores every stored receipt with target's rules, one scan of the store. Records scored
+    with other rules are scored in memory, writing them back is left to the rescorer, see
+    handlers/rescore.py. When the rules changed again meanwhile another rebuild starts
+    over for the new ones.
+    '''
+    global aggregates, rebuild
+    started = time.perf_counter()
+    rules = target.rules
+    try:
+        chunk = []
+        for receipt_id, record in store.iterate(REBUILD_CHUNK_SIZE):
+            chunk.append((receipt_id, record))
+            if len(chunk) == REBUILD_CHUNK_SIZE:
+                rebuild_chunk(target, chunk)
+                chunk = []
+        rebuild_chunk(target, chunk)
+    except Exception as error:
+        logger.error('Rebuilding points aggregates failed: %s', error)
+        with aggregates_lock:
+            if rebuild is target:
+                rebuild = None
+        return
+
+    with aggregates_lock:
+        if rebuild is not target:
+            # reconfigured meanwhile
+            return
+        if current_rules().version != rules.version:
+            start_rebuild(current_rules(), target.claimed)
+            return
+        aggregates = target.aggregates
+        rebuild = None
+    logger.info('Rebuilt points aggregates of %s receipts for rule set %s v%s in %.3fs',
+                len(aggregates), rules.name, rules.version, time.perf_counter() - started)
+
+
+def rebuild_chunk(target, chunk):
+    # scored outside the lock, ingest only waits for the additions
+    rules = target.rules
+    scored = []
+    for receipt_id, record in chunk:
+        if record.rules_version != rules.version:
+            record = record.with_points(rules.score(record), rules.version)
+        scored.append((receipt_id, record))
+    with aggregates_lock:
+        for receipt_id, record in scored:
+            if receipt_id not in target.claimed and receipt_id not in pending:
+                target.aggregates.add(record)
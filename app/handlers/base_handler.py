@@ -1,18 +1,17 @@
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class BaseHandler:
 
     def __init__(self, base, handler, storage, identifier=None, request_body=None):
-        logger.info(f'Entered base handler, processing base: {base}, handler: {handler}')
+        logger.debug('Entered base handler, processing base: %s, handler: %s', base, handler)
         self.request_body = request_body
         self.identifier = identifier
         self.storage = storage
         self.results = {}
 
-        logger.info(f'Calling base: {base}, handler: {handler} process function')
+        logger.debug('Calling base: %s, handler: %s process function', base, handler)
         self.process()
 
     def process():
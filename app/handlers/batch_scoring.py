@@ -0,0 +1,166 @@
+import logging
+from .records import DESCRIPTION_SEPARATOR
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DAYS_IN_MONTH = [0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError('Batch scoring requires numpy, install it with: pip install numpy')
+
+
+def codepoints(text):
+    return np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+
+
+ascii_tables = {}
+
+
+def character_class(points, predicate):
+    # predicate applied per code point, ASCII through a lookup table and anything
+    # else evaluated once per distinct character
+    table = ascii_tables.get(predicate, None)
+    if table is None:
+        table = ascii_tables[predicate] = np.array([predicate(chr(point)) for point in range(128)])
+
+    matches = table[np.minimum(points, 127)]
+    non_ascii = np.flatnonzero(points > 127)
+    if len(non_ascii):
+        unique, inverse = np.unique(points[non_ascii], return_inverse=True)
+        matches[non_ascii] = np.fromiter((predicate(chr(point)) for point in unique.tolist()),
+                                         dtype=bool, count=len(unique))[inverse]
+    return matches
+
+
+def segment_sums(values, offsets):
+    # sums of values[offsets[i]:offsets[i + 1]] for every segment
+    totals = np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+    return totals[offsets[1:]] - totals[offsets[:-1]]
+
+
+class ReceiptColumns:
+    '''
+    A batch of receipts laid out column by column. Strings are flattened into code point
+    arrays with per receipt (or per item) offsets, items are flattened into per item
+    columns with item_offsets marking where each receipt's items start.
+    '''
+
+    def __init__(self, retailer_codepoints, retailer_offsets, total_cents, purchase_date, purchase_minute,
+                 item_offsets, item_cents, description_codepoints, description_offsets):
+        self.retailer_codepoints = retailer_codepoints
+        self.retailer_offsets = retailer_offsets
+        self.total_cents = total_cents
+        self.purchase_date = purchase_date
+        self.purchase_minute = purchase_minute
+        self.item_offsets = item_offsets
+        self.item_cents = item_cents
+        self.description_codepoints = description_codepoints
+        self.description_offsets = description_offsets
+
+    def __len__(self):
+        return len(self.total_cents)
+
+    @classmethod
+    def from_records(cls, records):
+        require_numpy()
+        records = list(records)
+
+        retailers = [record.retailer for record in records]
+        retailer_offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum([len(retailer) for retailer in retailers], out=retailer_offsets[1:])
+
+        item_offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum([len(record.prices) for record in records], out=item_offsets[1:])
+        item_cents = np.concatenate([np.frombuffer(record.prices, dtype=np.int64) for record in records]) \
+            if records else np.zeros(0, dtype=np.int64)
+
+        # one separator between every pair of descriptions, within and across records
+        descriptions = codepoints(DESCRIPTION_SEPARATOR.join([description for record in records
+                                                              for description in record.descriptions]))
+        separators = np.flatnonzero(descriptions == ord(DESCRIPTION_SEPARATOR))
+        description_offsets = np.concatenate(([0], separators + 1, [len(descriptions) + 1]))
+
+        return cls(
+            codepoints(''.join(retailers)),
+            retailer_offsets,
+            np.fromiter((record.total_cents for record in records), dtype=np.int64, count=len(records)),
+            np.fromiter((record.purchase_date for record in records), dtype=np.int64, count=len(records)),
+            np.fromiter((record.purchase_minute for record in records), dtype=np.int64, count=len(records)),
+            item_offsets,
+            item_cents,
+            descriptions,
+            description_offsets if records else np.zeros(1, dtype=np.int64)
+        )
+
+
+def trimmed_lengths(points, offsets):
+    # len(description.strip()) for every segment, offsets[i + 1] - 1 is the end of segment i
+    # because segments are separated by one separator character
+    starts = offsets[:-1]
+    ends = offsets[1:] - 1
+    if len(points) == 0:
+        return np.zeros(len(starts), dtype=np.int64)
+
+    positions = np.arange(len(points), dtype=np.int64)
+    non_space = ~character_class(points, str.isspace)
+    # index of the next non space character at or after, and last one at or before, every position
+    next_non_space = np.minimum.accumulate(np.where(non_space, positions, len(points))[::-1])[::-1]
+    previous_non_space = np.maximum.accumulate(np.where(non_space, positions, -1))
+
+    first = next_non_space[np.minimum(starts, len(points) - 1)]
+    last = previous_non_space[np.maximum(ends - 1, 0)]
+    return np.where((first < ends) & (ends > starts), last - first + 1, 0)
+
+
+def score_columns(columns):
+    '''
+    Scores every receipt in a ReceiptColumns batch with the same rules, and the same
+    float rounding, as determine_points, the built in rule set. Rule sets loaded at
+    runtime aren't applied here. Returns an int64 array of points.
+    '''
+    require_numpy()
+
+    # alphanumeric characters in the retailer name
+    alphanumeric = character_class(columns.retailer_codepoints, str.isalnum) \
+        if len(columns.retailer_codepoints) else np.zeros(0, dtype=bool)
+    points = segment_sums(alphanumeric, columns.retailer_offsets)
+
+    # round dollar and quarter totals
+    points += np.where(columns.total_cents % 100 == 0, 50, 0)
+    points += np.where(columns.total_cents % 25 == 0, 25, 0)
+
+    # every two items
+    points += 5 * (np.diff(columns.item_offsets) // 2)
+
+    # items with a trimmed description length that is a multiple of 3
+    lengths = trimmed_lengths(columns.description_codepoints, columns.description_offsets)
+    bonus = np.where(lengths % 3 == 0, np.ceil(columns.item_cents / 100 * 0.2), 0).astype(np.int64)
+    points += segment_sums(bonus, columns.item_offsets)
+
+    # odd purchase day, on a date strptime accepts
+    year = columns.purchase_date // 10000
+    month = columns.purchase_date // 100 % 100
+    day = columns.purchase_date % 100
+    leap = ((year % 4 == 0) & (year % 100 != 0)) | (year % 400 == 0)
+    days_in_month = np.asarray(DAYS_IN_MONTH, dtype=np.int64)[month] + ((month == 2) & leap)
+    points += np.where((day % 2 == 1) & (year >= 1) & (day <= days_in_month), 6, 0)
+
+    # purchased after 2:00pm and before 4:00pm
+    points += np.where((columns.purchase_minute > 840) & (columns.purchase_minute < 960), 10, 0)
+
+    return points
+
+
+def score_records(records):
+    # convenience wrapper, ReceiptRecords in, list of points out
+    records = list(records)
+    if not records:
+        return []
+    return score_columns(ReceiptColumns.from_records(records)).tolist()
@@ -0,0 +1,29 @@
+import json
+from .utils import read_receipt
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(body):
+    # bytes or str -> document, malformed JSON raises ValueError either way
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def dumps(document):
+    # document -> compact JSON bytes, the same output JSONResponse renders
+    if orjson is not None:
+        return orjson.dumps(document)
+    return json.dumps(document, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+
+
+def decode_receipt(body, score=True):
+    '''
+    Raw request body -> (record, error) as read_receipt returns them. The body is parsed
+    straight from bytes and then validated and converted in a single pass over the document.
+    '''
+    return read_receipt(loads(body), score)
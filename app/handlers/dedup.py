@@ -0,0 +1,119 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from .records import DESCRIPTION_SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+DEDUP_POLICIES = ('off', 'return', 'reject')
+
+
+def receipt_digest(record):
+    '''
+    Content hash of an unscored ReceiptRecord. Records are built from the parsed fields, so
+    key order, number formatting and JSON whitespace in the request body don't change it.
+    Leading and trailing whitespace of the retailer and descriptions is ignored too, no
+    rule scores it. Whitespace inside them is kept, description lengths are scored.
+    '''
+    descriptions = DESCRIPTION_SEPARATOR.join([description.strip() for description in record.descriptions])
+    canonical = (f'{record.retailer.strip()}{DESCRIPTION_SEPARATOR}{record.total_cents}{DESCRIPTION_SEPARATOR}'
+                 f'{record.purchase_date}{DESCRIPTION_SEPARATOR}{record.purchase_minute}{DESCRIPTION_SEPARATOR}'
+                 f'{descriptions}')
+    digest = hashlib.blake2b(canonical.encode(), digest_size=16)
+    digest.update(record.prices.tobytes())
+    return digest.digest()
+
+
+class DedupIndex:
+    '''
+    Receipt id of every digest claimed in the last window_seconds, at most max_entries of
+    them, the oldest are forgotten first. Entries are kept in claim order, so expired ones
+    are always at the front.
+    '''
+
+    def __init__(self, window_seconds, max_entries):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def claim(self, digest, receipt_id):
+        # returns the id digest was claimed for within the window, or None after claiming it for receipt_id
+        now = time.monotonic()
+        with self.lock:
+            self.expire(now)
+            existing = self.entries.get(digest, None)
+            if existing is not None:
+                return existing[0]
+            self.entries[digest] = (receipt_id, now)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return None
+
+    def release(self, digest, receipt_id):
+        # forgets digest if it's still claimed for receipt_id
+        with self.lock:
+            existing = self.entries.get(digest, None)
+            if existing is not None and existing[0] == receipt_id:
+                del self.entries[digest]
+
+    def expire(self, now):
+        entries = self.entries
+        cutoff = now - self.window_seconds
+        while entries:
+            digest, (_, claimed) = next(iter(entries.items()))
+            if claimed > cutoff:
+                return
+            entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# The index of the receipts ingested by this process. Each process executor worker keeps
+# its own, so duplicates are only caught when they reach the same worker
+
+dedup_policy = 'return'
+dedup_index = DedupIndex(86400.0, 100000)
+
+
+def configure_dedup(policy='return', window_seconds=86400.0, max_entries=100000):
+    '''
+    policy 'return' answers a duplicate with the id of the receipt first stored, 'reject'
+    refuses it, 'off' stores every submission. Forgets every receipt seen before.
+    '''
+    global dedup_policy, dedup_index
+    if policy not in DEDUP_POLICIES:
+        raise ValueError(f'Unknown dedup policy: {policy}, expected one of {", ".join(DEDUP_POLICIES)}')
+    dedup_policy = policy
+    dedup_index = DedupIndex(window_seconds, max_entries)
+
+
+def find_duplicate(record, receipt_id):
+    '''
+    Claims record's content for receipt_id, which the caller then stores, and returns None.
+    A caller that fails to store it calls release_claim. When the same content was claimed
+    within the window returns that receipt's id instead and the caller stores nothing.
+    Always None with the policy off.
+    '''
+    if dedup_policy == 'off':
+        return None
+    existing = dedup_index.claim(receipt_digest(record), receipt_id)
+    if existing is not None:
+        logger.debug('Receipt is a duplicate of: %s', existing)
+    return existing
+
+
+def release_claim(record, receipt_id):
+    # record's content claimed for receipt_id by find_duplicate is free again, storing it failed
+    if dedup_policy != 'off':
+        dedup_index.release(receipt_digest(record), receipt_id)
+
+
+def forget_dropped(entries):
+    # on_drop callback of the store, receipts it dropped on its own are stored again when resubmitted
+    if dedup_policy != 'off':
+        for receipt_id, record in entries.items():
+            dedup_index.release(receipt_digest(record), receipt_id)
@@ -0,0 +1,35 @@
+from handlers.base_handler import BaseHandler
+import logging
+from fastapi import HTTPException
+from handlers.aggregates import AGGREGATE_GROUPS, summarize
+from handlers.utils import is_valid_date
+from handlers.records import parse_date, is_calendar_date
+
+logger = logging.getLogger(__name__)
+
+
+class ReceiptsAggregatesHandler(BaseHandler):
+
+    def process(self):
+        logger.debug('Entered process function for receipts aggregates handler')
+
+        params = self.request_body or {}
+        group = params.get('group', None) or 'retailer'
+        if group not in AGGREGATE_GROUPS:
+            raise HTTPException(status_code=400, detail=f'group must be one of {", ".join(AGGREGATE_GROUPS)}')
+        dates = []
+        for name in ('start', 'end'):
+            value = params.get(name, None)
+            if value is not None and not (is_valid_date(value) and is_calendar_date(parse_date(value))):
+                raise HTTPException(status_code=400, detail=f'{name} must be a date like 2022-01-31')
+            dates.append(None if value is None else parse_date(value))
+        start, end = dates
+        retailer = params.get('retailer', None)
+        if group == 'retailer_date' and retailer is None and (start is None or end is None):
+            # one group per retailer per day of every receipt kept, too many to send
+            raise HTTPException(status_code=400, detail='group retailer_date needs a retailer, or a start and end date')
+
+        results = summarize(group, retailer, start, end)
+        if results is None:
+            raise HTTPException(status_code=501, detail='Aggregates are not kept by this server')
+        self.results = results
@@ -1,20 +1,25 @@
 from handlers.base_handler import BaseHandler
 import logging
 from fastapi import HTTPException
-from handlers.utils import determine_points
+from handlers.utils import refresh_record
+from metrics import record_points_lookup
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ReceiptsPointsHandler(BaseHandler):
 
     def process(self):
-        logger.info('Entered process function for receipts points handler')
-        logger.info(f'Looking for receipt id: {self.identifier} in storage')
+        logger.debug('Entered process function for receipts points handler')
+        logger.debug('Looking for receipt id: %s in storage', self.identifier)
 
-        receipt = self.storage.get(self.identifier, None)
-        if receipt is None:
-            logger.error(f'Receipt with provided id: {self.identifier} not found')
+        record = self.storage.get(self.identifier)
+        record_points_lookup(record is not None)
+        if record is None:
+            logger.debug('Receipt with provided id: %s not found', self.identifier)
             raise HTTPException(status_code=404, detail='No receipt found for that id')
+
+        current = refresh_record(record)
+        if current is not record:
+            self.storage.put(self.identifier, current)
     
-        self.results = {'points': determine_points(receipt)}
+        self.results = {'points': current.points}
@@ -0,0 +1,76 @@
+from handlers.base_handler import BaseHandler
+import base64
+import binascii
+import logging
+from fastapi import HTTPException
+from handlers.utils import is_valid_date, refresh_record
+from handlers.records import parse_date
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def encode_cursor(after):
+    # (purchase_date, receipt_id) -> opaque url safe token
+    purchase_date, receipt_id = after
+    return base64.urlsafe_b64encode(f'{purchase_date}:{receipt_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        purchase_date, _, receipt_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition(':')
+        return int(purchase_date), receipt_id
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+class ReceiptsQueryHandler(BaseHandler):
+
+    def process(self):
+        logger.debug('Entered process function for receipts query handler')
+
+        params = self.request_body or {}
+        retailer = params.get('retailer', None)
+        dates = []
+        for name in ('start', 'end'):
+            value = params.get(name, None)
+            if value is not None and not is_valid_date(value):
+                raise HTTPException(status_code=400, detail=f'{name} must be a date like 2022-01-31')
+            dates.append(None if value is None else parse_date(value))
+        start, end = dates
+
+        after = None
+        if params.get('cursor', None) is not None:
+            after = decode_cursor(params['cursor'])
+            if after is None:
+                raise HTTPException(status_code=400, detail='Invalid cursor')
+
+        limit = params.get('limit', None)
+        if limit is None:
+            limit = DEFAULT_LIMIT
+        elif not limit.isdecimal() or not 1 <= int(limit) <= MAX_LIMIT:
+            raise HTTPException(status_code=400, detail=f'limit must be from 1 to {MAX_LIMIT}')
+        else:
+            limit = int(limit)
+
+        logger.debug('Querying receipts for retailer: %s from: %s to: %s', retailer, start, end)
+        if not self.storage.supports_query:
+            raise HTTPException(status_code=501, detail='Receipt queries are not supported by this store')
+        page, next_after = self.storage.query(retailer, start, end, after, limit)
+
+        refreshed = {}
+        receipts = []
+        for receipt_id, record in page:
+            current = refresh_record(record)
+            if current is not record:
+                refreshed[receipt_id] = current
+            receipt = current.to_receipt()
+            receipts.append({'id': receipt_id, 'retailer': receipt['retailer'],
+                             'purchaseDate': receipt['purchaseDate'], 'total': receipt['total'],
+                             'points': current.points})
+        if refreshed:
+            self.storage.put_many(refreshed)
+
+        self.results = {'receipts': receipts, 'cursor': None if next_after is None else encode_cursor(next_after)}
@@ -0,0 +1,20 @@
+from handlers.base_handler import BaseHandler
+import logging
+from fastapi import HTTPException
+from handlers.rescore import rescoring_stats
+
+logger = logging.getLogger(__name__)
+
+
+class RulesRescoringHandler(BaseHandler):
+
+    def process(self):
+        # progress of rescoring the stored receipts with the active rule set
+        logger.debug('Entered process function for rules rescoring handler')
+        if self.identifier != 'current':
+            raise HTTPException(status_code=404, detail='Rescoring is only reported for the current rule set')
+
+        results = rescoring_stats()
+        if results is None:
+            raise HTTPException(status_code=501, detail='Stored receipts are not rescored by this server')
+        self.results = results
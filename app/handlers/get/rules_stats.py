@@ -0,0 +1,19 @@
+from handlers.base_handler import BaseHandler
+import logging
+from fastapi import HTTPException
+from handlers.rules import current_rules
+
+logger = logging.getLogger(__name__)
+
+
+class RulesStatsHandler(BaseHandler):
+
+    def process(self):
+        # identifier is 'current' or the name of the active rule set
+        logger.debug('Entered process function for rules stats handler')
+        rules = current_rules()
+        if self.identifier not in ('current', rules.name):
+            logger.debug('Rule set: %s is not active', self.identifier)
+            raise HTTPException(status_code=404, detail='No active rule set with that name')
+
+        self.results = rules.stats()
@@ -0,0 +1,71 @@
+from functools import lru_cache
+
+# Entries each memo keeps by default, see configure_memos
+DEFAULT_MEMO_SIZE = 10000
+
+
+class Memo:
+    '''
+    Bounded LRU memo of function, a pure function of hashable arguments. lookup(*arguments)
+    returns function(*arguments), computed once while the arguments stay among the size
+    most recently looked up, size 0 computes every call. The cache is functools.lru_cache,
+    its LRU bookkeeping runs in C, so a hit costs a few dict operations. Exceptions pass
+    through uncached.
+    '''
+
+    def __init__(self, name, function, size=DEFAULT_MEMO_SIZE):
+        self.name = name
+        self.function = function
+        self.resize(size)
+        memos.append(self)
+
+    def resize(self, size):
+        # forgets every entry and resets the counters
+        self.size = size
+        self.counts = [0, 0, 0]
+        self.lookup = lru_cache(maxsize=size)(self.function)
+
+    def clear(self):
+        # cache_clear resets the lru_cache counters too, they're carried over in counts
+        self.counts = self.totals()
+        self.lookup.cache_clear()
+
+    def totals(self):
+        # [hits, misses, evictions] since the last resize
+        info = self.lookup.cache_info()
+        hits, misses, evictions = self.counts
+        # every miss added an entry, those no longer held were evicted
+        evicted = info.misses - info.currsize if self.size else 0
+        return [hits + info.hits, misses + info.misses, evictions + evicted]
+
+    def stats(self):
+        hits, misses, evictions = self.totals()
+        return {'name': self.name, 'size': self.size, 'entries': self.lookup.cache_info().currsize, 'hits': hits,
+                'misses': misses, 'evictions': evictions}
+
+
+# Every memo created, configure_memos applies to all of them
+memos = []
+clear_on_rules_change = False
+
+
+def configure_memos(size=DEFAULT_MEMO_SIZE, clear_on_reload=False):
+    '''
+    Entries each memo keeps, emptying them. With clear_on_reload every memo is emptied
+    whenever another rule set becomes active, see rules_changed.
+    '''
+    global clear_on_rules_change
+    clear_on_rules_change = clear_on_reload
+    for memo in memos:
+        memo.resize(size)
+
+
+def rules_changed():
+    # called with every rule set activated
+    if clear_on_rules_change:
+        for memo in memos:
+            memo.clear()
+
+
+def memo_stats():
+    return [memo.stats() for memo in memos]
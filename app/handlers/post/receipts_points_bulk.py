@@ -0,0 +1,67 @@
+from handlers.base_handler import BaseHandler
+import logging
+from fastapi import HTTPException
+from handlers.codec import dumps
+from handlers.utils import refresh_record
+from config import BULK_POINTS_STREAM_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# ids written per streamed response chunk
+STREAM_CHUNK_SIZE = 1000
+
+
+class ReceiptsPointsBulkHandler(BaseHandler):
+
+    def process(self):
+        logger.debug('Entered process function for receipts points bulk handler')
+
+        ids = self.request_body.get('ids', None) if isinstance(self.request_body, dict) else self.request_body
+        if not isinstance(ids, list) or not all(isinstance(receipt_id, str) for receipt_id in ids):
+            raise HTTPException(status_code=400, detail='Expected a list of receipt ids')
+
+        logger.debug('Looking up points for %s receipt ids', len(ids))
+        if len(ids) > BULK_POINTS_STREAM_THRESHOLD:
+            self.results = self.stream_points(ids)
+            return
+
+        points, missing = self.lookup(ids)
+        self.results = {'points': points, 'missing': missing}
+
+    def lookup(self, ids):
+        # one get_many against the store, rescored records are written back with one put_many
+        records = self.storage.get_many(ids)
+        refreshed = {}
+        points = {}
+        missing = []
+
+        for receipt_id in ids:
+            record = records.get(receipt_id, None)
+            if record is None:
+                missing.append(receipt_id)
+                continue
+            current = refresh_record(record)
+            if current is not record:
+                refreshed[receipt_id] = current
+            points[receipt_id] = current.points
+
+        if refreshed:
+            self.storage.put_many(refreshed)
+        return points, missing
+
+    def stream_points(self, ids):
+        # same response document as the in memory path, compact like every JSON response,
+        # written STREAM_CHUNK_SIZE ids at a time
+        missing = []
+        separator = b''
+        yield b'{"points":{'
+
+        for start in range(0, len(ids), STREAM_CHUNK_SIZE):
+            points, chunk_missing = self.lookup(ids[start:start + STREAM_CHUNK_SIZE])
+            missing.extend(chunk_missing)
+            if points:
+                # the chunk's pairs without the braces around them
+                yield separator + dumps(points)[1:-1]
+                separator = b','
+
+        yield b'},"missing":' + dumps(missing) + b'}'
@@ -1,27 +1,54 @@
 from handlers.base_handler import BaseHandler
 import logging
 from uuid import uuid4
-from handlers.utils import validate_receipt
+from handlers import dedup, aggregates
+from handlers.codec import decode_receipt
+from handlers.utils import score_record
 from fastapi import HTTPException
+from logs import sample_debug
+from metrics import record_validation_failure, record_duplicate
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class ReceiptsProcessHandler(BaseHandler):
     
     def process(self):
-        logger.info(f'Entered process function for receipts process handler, validating receipt')
-        if not validate_receipt(self.request_body):
+        # request_body is the raw request body, decoded and validated in one pass
+        logger.debug('Entered process function for receipts process handler, validating receipt')
+        if sample_debug(logger):
+            logger.debug('Receipt body: %s', self.request_body)
+        record, error = decode_receipt(self.request_body, score=False)
+        if error is not None:
+            logger.debug('Receipt invalid, field: %s, reason: %s', error.field, error.reason)
+            record_validation_failure(error.field)
             raise HTTPException(status_code=400, detail='The receipt is invalid')
 
         receipt_id = str(uuid4())
 
-        logger.info(f'Updating storage with receipt id: {receipt_id}')
-        self.storage.update({
-            receipt_id: self.request_body
-        })
-        
+        # a resubmitted receipt is neither scored nor stored again
+        existing_id = dedup.find_duplicate(record, receipt_id)
+        if existing_id is not None:
+            record_duplicate()
+            if dedup.dedup_policy == 'reject':
+                raise HTTPException(status_code=409, detail='The receipt was already submitted')
+            self.results.update({
+                'id': existing_id
+            })
+            return
+
+        logger.debug('Updating storage with receipt id: %s', receipt_id)
+        record = score_record(record)
+        aggregates.expect_receipts((receipt_id,))
+        try:
+            self.storage.put(receipt_id, record)
+        except Exception:
+            # resubmissions mustn't be answered with the id of a receipt that wasn't stored
+            dedup.release_claim(record, receipt_id)
+            aggregates.forget_receipts((receipt_id,))
+            raise
+        aggregates.record_receipts({receipt_id: record})
+
         self.results.update({
             'id': receipt_id
         })
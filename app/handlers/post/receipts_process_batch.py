@@ -0,0 +1,72 @@
+from handlers.base_handler import BaseHandler
+import time
+import logging
+from uuid import uuid4
+from handlers import dedup, aggregates
+from handlers.codec import dumps
+from handlers.utils import read_receipt, score_record
+from handlers.streaming import iter_json_documents
+from metrics import record_validation_failure, record_duplicate
+
+logger = logging.getLogger(__name__)
+
+
+class ReceiptsProcessBatchHandler(BaseHandler):
+
+    def process(self):
+        # request_body is the raw body stream, results is the streamed NDJSON response body
+        logger.debug('Entered process function for receipts batch process handler')
+        self.results = self.process_stream()
+
+    async def process_stream(self):
+        started = time.perf_counter()
+        stored = 0
+        rejected = 0
+
+        async for documents in iter_json_documents(self.request_body):
+            entries = {}
+            lines = []
+
+            for line, receipt, decode_error in documents:
+                if decode_error is not None:
+                    rejected += 1
+                    lines.append(dumps({'line': line, 'error': decode_error}))
+                    continue
+
+                record, error = read_receipt(receipt, score=False)
+                if error is not None:
+                    rejected += 1
+                    record_validation_failure(error.field)
+                    lines.append(dumps({'line': line, 'error': 'The receipt is invalid', 'field': error.field}))
+                    continue
+
+                receipt_id = str(uuid4())
+                existing_id = dedup.find_duplicate(record, receipt_id)
+                if existing_id is not None:
+                    record_duplicate()
+                    if dedup.dedup_policy == 'reject':
+                        rejected += 1
+                        lines.append(dumps({'line': line, 'error': 'The receipt was already submitted'}))
+                    else:
+                        lines.append(dumps({'line': line, 'id': existing_id}))
+                    continue
+
+                entries[receipt_id] = score_record(record)
+                lines.append(dumps({'line': line, 'id': receipt_id}))
+
+            # one storage update and one response write per received chunk
+            aggregates.expect_receipts(entries)
+            try:
+                self.storage.put_many(entries)
+            except Exception:
+                # resubmissions mustn't be answered with the ids of receipts that weren't stored
+                for receipt_id, record in entries.items():
+                    dedup.release_claim(record, receipt_id)
+                aggregates.forget_receipts(entries)
+                raise
+            aggregates.record_receipts(entries)
+            stored += len(entries)
+            yield b'\n'.join(lines) + b'\n'
+
+        logger.debug('Batch processed, stored: %s, rejected: %s, duration: %.3fs',
+                    stored, rejected, time.perf_counter() - started)
@@ -0,0 +1,49 @@
+from handlers.base_handler import BaseHandler
+import logging
+from fastapi import HTTPException
+from handlers.rules import reload_rules, RuleError
+from handlers.aggregates import current_aggregates
+from handlers.rescore import wake_rescoring
+
+logger = logging.getLogger(__name__)
+
+# Whether the endpoint may change the rules, and why it can't where other processes score
+# receipts too, see configure_rules_reload
+
+reload_enabled = False
+reload_conflict = None
+
+
+def configure_rules_reload(enabled=False, conflict=None):
+    '''
+    Lets POST /rules/reload change the active rule set when enabled, it's answered with 403
+    otherwise. conflict, set where other processes score and store receipts, answers 409
+    instead: a posted rule set would only reach the process that received it, and receipts
+    they share would be rescored back and forth between the versions. RULES_PATH reaches
+    every process.
+    '''
+    global reload_enabled, reload_conflict
+    reload_enabled = enabled
+    reload_conflict = conflict
+
+
+class RulesReloadHandler(BaseHandler):
+
+    def process(self):
+        # an empty body reloads the configured rules file, otherwise the body is the new rule set
+        logger.debug('Entered process function for rules reload handler')
+        if not reload_enabled:
+            raise HTTPException(status_code=403, detail='Rule reloads are disabled, set RULES_RELOAD=1 to enable them')
+        if reload_conflict is not None:
+            raise HTTPException(status_code=409, detail=f'Rules can only be changed through RULES_PATH {reload_conflict}')
+        try:
+            rules = reload_rules(self.request_body or None)
+        except RuleError as error:
+            logger.debug('Rule set rejected: %s', error)
+            raise HTTPException(status_code=400, detail=str(error))
+        # new rules start the aggregates rebuild and rescoring now rather than on the next
+        # receipt or rules check
+        current_aggregates()
+        wake_rescoring()
+
+        self.results = {'name': rules.name, 'version': rules.version, 'rules': len(rules.rules)}
@@ -0,0 +1,124 @@
+import json
+from sys import intern
+from array import array
+from datetime import date
+
+# Item descriptions are packed into one string when encoded, the separator can't appear
+# in a description that passed validation
+DESCRIPTION_SEPARATOR = '\x00'
+
+
+def parse_cents(value):
+    # '12.25' -> 1225, value already matched ^\d+\.\d{2}$
+    return int(value[:-3]) * 100 + int(value[-2:])
+
+
+def parse_date(value):
+    # '2022-01-31' -> 20220131, sorts like the date and keeps the day as the last two digits
+    return int(value[:4]) * 10000 + int(value[5:7]) * 100 + int(value[8:])
+
+
+def parse_time(value):
+    # '14:33' -> 873 minutes after midnight
+    hour, _, minute = value.partition(':')
+    return int(hour) * 60 + int(minute)
+
+
+def is_calendar_date(packed_date):
+    # yyyymmdd that strptime would accept, validation only checks the day is 01-31
+    try:
+        date(packed_date // 10000, packed_date // 100 % 100, packed_date % 100)
+        return True
+    except ValueError:
+        return False
+
+
+class ReceiptRecord:
+    '''
+    Compact form of a validated receipt, kept in storage in place of the request body.
+    Prices are integer cents, the purchase date is packed as yyyymmdd, the purchase time
+    is minutes after midnight and the items are held as parallel description/price columns.
+    Retailer names and descriptions repeat across receipts, they're interned so records
+    share one copy of each. Interned strings are freed with the last record holding them.
+    '''
+
+    __slots__ = ('retailer', 'total_cents', 'purchase_date', 'purchase_minute',
+                 'descriptions', 'prices', 'points', 'rules_version')
+
+    def __init__(self, retailer, total_cents, purchase_date, purchase_minute, descriptions, prices,
+                 points=None, rules_version=None):
+        self.retailer = retailer
+        self.total_cents = total_cents
+        self.purchase_date = purchase_date
+        self.purchase_minute = purchase_minute
+        self.descriptions = descriptions
+        self.prices = prices
+        self.points = points
+        self.rules_version = rules_version
+
+    @classmethod
+    def from_receipt(cls, receipt):
+        # receipt must already have passed validation
+        items = receipt['items']
+        return cls(
+            intern(receipt['retailer']),
+            parse_cents(receipt['total']),
+            parse_date(receipt['purchaseDate']),
+            parse_time(receipt['purchaseTime']),
+            tuple([intern(item['shortDescription']) for item in items]),
+            array('q', [parse_cents(item['price']) for item in items])
+        )
+
+    @property
+    def item_descriptions(self):
+        return list(self.descriptions)
+
+    def to_receipt(self):
+        # rebuilds the request body, numbers come back in their canonical formatting
+        date = self.purchase_date
+        return {
+            'retailer': self.retailer,
+            'purchaseDate': f'{date // 10000:04d}-{date // 100 % 100:02d}-{date % 100:02d}',
+            'purchaseTime': f'{self.purchase_minute // 60:02d}:{self.purchase_minute % 60:02d}',
+            'items': [
+                {'shortDescription': description, 'price': f'{price // 100}.{price % 100:02d}'}
+                for description, price in zip(self.item_descriptions, self.prices)
+            ],
+            'total': f'{self.total_cents // 100}.{self.total_cents % 100:02d}'
+        }
+
+    def with_points(self, points, rules_version):
+        return ReceiptRecord(self.retailer, self.total_cents, self.purchase_date, self.purchase_minute,
+                             self.descriptions, self.prices, points, rules_version)
+
+    def to_json(self):
+        return json.dumps([self.retailer, self.total_cents, self.purchase_date, self.purchase_minute,
+                           DESCRIPTION_SEPARATOR.join(self.descriptions), list(self.prices), self.points,
+                           self.rules_version],
+                          separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, encoded):
+        retailer, total_cents, purchase_date, purchase_minute, descriptions, prices, points, rules_version = \
+            json.loads(encoded)
+        return cls(intern(retailer), total_cents, purchase_date, purchase_minute,
+                   tuple([intern(description) for description in descriptions.split(DESCRIPTION_SEPARATOR)]),
+                   array('q', prices), points, rules_version)
+
+    def __reduce__(self):
+        return interned_record, tuple([getattr(self, name) for name in self.__slots__])
+
+    def __eq__(self, other):
+        return isinstance(other, ReceiptRecord) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f'ReceiptRecord({self.to_receipt()!r}, points={self.points}, rules_version={self.rules_version})'
+
+
+def interned_record(retailer, total_cents, purchase_date, purchase_minute, descriptions, prices, points,
+                    rules_version):
+    # unpickles a record, its strings are shared again in the loading process, see ReceiptRecord
+    return ReceiptRecord(intern(retailer), total_cents, purchase_date, purchase_minute,
+                         tuple([intern(description) for description in descriptions]), prices,
+                         points, rules_version)
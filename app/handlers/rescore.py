@@ -0,0 +1,187 @@
+import time
+import logging
+import threading
+from .rules import current_rules
+
+logger = logging.getLogger(__name__)
+
+# Receipts scored per store write, and the fraction of one core a pass may use. See
+# configure_rescoring
+RESCORE_CHUNK_SIZE = 100
+RESCORE_SHARE = 0.25
+
+
+class Rescore:
+    # one pass over the store for a rules version, counted by the rescoring thread alone
+
+    def __init__(self, rules, total):
+        self.rules = rules
+        # receipts stored when the pass started, receipts stored since are already current
+        self.total = total
+        self.scanned = 0
+        self.rescored = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def progress(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        rate = self.scanned / elapsed if elapsed else 0.0
+        left = max(self.total - self.scanned, 0) if self.finished is None else 0
+        return {
+            'rules_version': self.rules.version,
+            'total': self.total,
+            'scanned': self.scanned,
+            'rescored': self.rescored,
+            'seconds': round(elapsed, 3),
+            'receipts_per_second': round(rate),
+            'remaining_seconds': round(left / rate, 1) if rate else None
+        }
+
+
+class Rescorer:
+    '''
+    Thread rescoring every receipt in store whenever another rule set becomes active. A
+    pass walks the store chunk_size receipts at a time, rescores those scored with other
+    rules and writes them back with one replace_many per chunk, which leaves each where the
+    store keeps it. After each chunk it sleeps long enough to use about share of one core,
+    which also hands the GIL back to the event loop, so requests never wait for more than
+    one chunk. A pass stops for a newer rule set and starts over.
+
+    Reads don't wait for a pass: they compare a receipt's rules_version with the active
+    rule set's and rescore stale receipts themselves, so every response is scored with
+    the active rules whether the pass reached the receipt yet or not.
+    '''
+
+    def __init__(self, store, chunk_size=RESCORE_CHUNK_SIZE, share=RESCORE_SHARE, check_seconds=5.0):
+        if chunk_size < 1 or not 0 < share <= 1:
+            raise ValueError(f'Rescoring needs a chunk size of at least 1 and a share in (0, 1], '
+                             f'got {chunk_size} and {share}')
+        self.store = store
+        self.chunk_size = chunk_size
+        self.share = share
+        self.check_seconds = check_seconds
+        # version every stored receipt was rescored with by a finished pass
+        self.version = None
+        # the running pass, or the last one
+        self.current = None
+        self.passes = 0
+        self.scanned = 0
+        self.rescored = 0
+        self.resumed = None
+        self.stopped = False
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True, name='rescorer')
+
+    def run(self):
+        while not self.stopped:
+            rules = current_rules()
+            if rules.version != self.version:
+                try:
+                    finished = self.rescore_all(rules)
+                except Exception as error:
+                    # retried once the next check finds the rules still differ
+                    logger.error('Rescoring stored receipts failed: %s', error)
+                else:
+                    if finished:
+                        self.version = rules.version
+                        self.passes += 1
+                    continue
+            self.wake.wait(self.check_seconds)
+            self.wake.clear()
+
+    def rescore_all(self, rules):
+        # True once every stored receipt is scored with rules, False when the pass was cut short
+        current = self.current = Rescore(rules, len(self.store))
+        logger.info('Rescoring %s stored receipts with rule set %s v%s', current.total, rules.name, rules.version)
+        self.resumed = time.perf_counter()
+        chunk = []
+        for receipt_id, record in self.store.iterate(self.chunk_size):
+            chunk.append((receipt_id, record))
+            if len(chunk) == self.chunk_size:
+                if not self.rescore_chunk(current, chunk):
+                    return False
+                chunk = []
+        if not self.rescore_chunk(current, chunk):
+            return False
+        current.finished = time.perf_counter()
+        logger.info('Rescored %s of %s stored receipts with rule set %s v%s in %.3fs', current.rescored,
+                    current.scanned, rules.name, rules.version, current.finished - current.started)
+        return True
+
+    def rescore_chunk(self, current, chunk):
+        # False when the pass should stop, rescoring was stopped or the rules changed
+        rules = current.rules
+        if self.stopped or current_rules().version != rules.version:
+            return False
+        version = rules.version
+        score = rules.score
+        # stored records are never changed, rescored copies replace them where they're kept
+        stale = {receipt_id: record.with_points(score(record), version) for receipt_id, record in chunk
+                 if record.rules_version != version}
+        if stale:
+            self.store.replace_many(stale)
+        current.scanned += len(chunk)
+        current.rescored += len(stale)
+        self.scanned += len(chunk)
+        self.rescored += len(stale)
+        # busy since the last pause, reading the chunk from the store included
+        busy = time.perf_counter() - self.resumed
+        time.sleep(busy * (1 - self.share) / self.share)
+        self.resumed = time.perf_counter()
+        return True
+
+    def stats(self):
+        return {
+            'rules_version': self.version,
+            'running': self.current is not None and self.current.finished is None,
+            'passes': self.passes,
+            'scanned': self.scanned,
+            'rescored': self.rescored,
+            'pass': self.current.progress() if self.current is not None else None
+        }
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+        self.thread.join()
+
+
+# The rescorer of the receipts stored by this process, None when they aren't rescored.
+# Under the process executor or a shared store other processes store receipts too, and
+# the server doesn't rescore them
+
+rescorer = None
+rescorer_lock = threading.Lock()
+
+
+def configure_rescoring(store=None, chunk_size=RESCORE_CHUNK_SIZE, share=RESCORE_SHARE, check_seconds=5.0):
+    '''
+    Rescores the receipts in store in the background, starting with what it already holds
+    and again whenever another rule set becomes active, see Rescorer. The active rules are
+    checked every check_seconds, wake_rescoring checks them now. Without a store, stops
+    rescoring. Raises ValueError for a chunk_size below 1 or a share outside (0, 1].
+    '''
+    global rescorer
+    with rescorer_lock:
+        if rescorer is not None:
+            rescorer.stop()
+            rescorer = None
+        if store is not None:
+            rescorer = Rescorer(store, chunk_size, share, check_seconds)
+            rescorer.thread.start()
+
+
+def wake_rescoring():
+    # called after a rule set is activated, starts its pass without waiting for the next check
+    if rescorer is not None:
+        rescorer.wake.set()
+
+
+def rescoring_stats():
+    '''
+    rules_version every stored receipt is scored with (None until the first pass finishes),
+    running, passes finished, receipts scanned and rescored over every pass, and the
+    progress of the running or last pass. None when receipts aren't rescored.
+    '''
+    current = rescorer
+    return current.stats() if current is not None else None
@@ -0,0 +1,362 @@
+import os
+import re
+import json
+import math
+import time
+import logging
+import threading
+from datetime import date
+from .records import is_calendar_date, parse_date, parse_time
+from .memo import Memo, rules_changed
+
+logger = logging.getLogger(__name__)
+
+# The rules the service has always scored receipts with. A rule set's version is stored
+# with every score, records scored under another version are rescored when next read,
+# so a version must never be reused for different rules
+DEFAULT_RULES = {
+    'name': 'default',
+    'version': 1,
+    'rules': [
+        {'name': 'retailer alphanumeric characters', 'kind': 'retailer_alphanumeric', 'points': 1},
+        {'name': 'round dollar total', 'kind': 'total_multiple', 'cents': 100, 'points': 50},
+        {'name': 'quarter multiple total', 'kind': 'total_multiple', 'cents': 25, 'points': 25},
+        {'name': 'every two items', 'kind': 'item_count_multiple', 'count': 2, 'points': 5},
+        {'name': 'description length multiple of 3', 'kind': 'item_description_length_multiple',
+         'length': 3, 'price_multiplier': 0.2},
+        {'name': 'odd purchase day', 'kind': 'purchase_day_odd', 'points': 6},
+        {'name': 'purchased between 2pm and 4pm', 'kind': 'purchase_time_between',
+         'after': '14:00', 'before': '16:00', 'points': 10}
+    ]
+}
+
+# Every Nth receipt is scored by the instrumented scorer to sample per rule timings
+DEFAULT_TIMING_INTERVAL = 100
+
+
+class RuleError(ValueError):
+    pass
+
+
+def parameter(rule, key, types):
+    value = rule.get(key, None)
+    if isinstance(value, bool) or not isinstance(value, types):
+        raise RuleError(f'Rule {rule.get("name")!r}: {key} is missing or not a {types}')
+    return value
+
+
+def positive(rule, key):
+    value = parameter(rule, key, int)
+    if value <= 0:
+        raise RuleError(f'Rule {rule.get("name")!r}: {key} must be positive')
+    return value
+
+
+def multiplier(rule, key):
+    # spliced into the scorer as a float literal, inf and nan have none
+    try:
+        value = float(parameter(rule, key, (int, float)))
+    except OverflowError:
+        value = math.inf
+    if not math.isfinite(value) or value < 0:
+        raise RuleError(f'Rule {rule.get("name")!r}: {key} must be a finite number, zero or more')
+    return value
+
+
+def packed_date(rule, key):
+    try:
+        return parse_date(date.fromisoformat(parameter(rule, key, str)).isoformat())
+    except ValueError:
+        raise RuleError(f'Rule {rule.get("name")!r}: {key} is not a yyyy-mm-dd date')
+
+
+def minute_of_day(rule, key):
+    value = parameter(rule, key, str)
+    hour, separator, minute = value.partition(':')
+    if not (separator and hour.isdigit() and minute.isdigit() and int(hour) < 24 and int(minute) < 60):
+        raise RuleError(f'Rule {rule.get("name")!r}: {key} is not a hh:mm time')
+    return parse_time(value)
+
+
+# Each rule kind compiles to (scope, expression). Receipt scope expressions are evaluated
+# once per receipt, item scope expressions once per item inside the one shared item loop.
+# Expressions read the locals the scorer prologue sets up: retailer, retailer_lower,
+# retailer_alphanumeric (its count of alphanumeric characters), total_cents, purchase_date,
+# purchase_minute, item_count and, per item, description, trimmed_length, description_lower
+# and price (in cents). Numbers are inlined as literals, strings are bound as constants
+# through constant(value)
+
+def retailer_alphanumeric(rule, constant):
+    return 'receipt', f'{parameter(rule, "points", int)!r} * retailer_alphanumeric'
+
+def retailer_contains(rule, constant):
+    text = constant(parameter(rule, 'text', str).lower())
+    return 'receipt', f'({parameter(rule, "points", int)!r} if {text} in retailer_lower else 0)'
+
+def total_multiple(rule, constant):
+    return 'receipt', f'({parameter(rule, "points", int)!r} if total_cents % {positive(rule, "cents")!r} == 0 else 0)'
+
+def total_at_least(rule, constant):
+    return 'receipt', f'({parameter(rule, "points", int)!r} if total_cents >= {parameter(rule, "cents", int)!r} else 0)'
+
+def item_count_multiple(rule, constant):
+    return 'receipt', f'{parameter(rule, "points", int)!r} * (item_count // {positive(rule, "count")!r})'
+
+def item_description_length_multiple(rule, constant):
+    # the same float arithmetic as float(price) * multiplier, see determine_points
+    return 'item', (f'(ceil(price / 100 * {multiplier(rule, "price_multiplier")!r}) '
+                    f'if trimmed_length % {positive(rule, "length")!r} == 0 else 0)')
+
+def item_description_contains(rule, constant):
+    text = constant(parameter(rule, 'text', str).lower())
+    return 'item', f'({parameter(rule, "points", int)!r} if {text} in description_lower else 0)'
+
+def purchase_day_odd(rule, constant):
+    return 'receipt', (f'({parameter(rule, "points", int)!r} '
+                       f'if purchase_date % 2 and is_calendar_date(purchase_date) else 0)')
+
+def purchase_date_between(rule, constant):
+    # inclusive of both days
+    return 'receipt', (f'({parameter(rule, "points", int)!r} if {packed_date(rule, "from")!r} '
+                       f'<= purchase_date <= {packed_date(rule, "to")!r} else 0)')
+
+def purchase_time_between(rule, constant):
+    # exclusive of both times
+    return 'receipt', (f'({parameter(rule, "points", int)!r} if {minute_of_day(rule, "after")!r} '
+                       f'< purchase_minute < {minute_of_day(rule, "before")!r} else 0)')
+
+
+rule_kinds = {
+    'retailer_alphanumeric': retailer_alphanumeric,
+    'retailer_contains': retailer_contains,
+    'total_multiple': total_multiple,
+    'total_at_least': total_at_least,
+    'item_count_multiple': item_count_multiple,
+    'item_description_length_multiple': item_description_length_multiple,
+    'item_description_contains': item_description_contains,
+    'purchase_day_odd': purchase_day_odd,
+    'purchase_date_between': purchase_date_between,
+    'purchase_time_between': purchase_time_between
+}
+
+# prologue lines, each emitted only when some rule expression uses the local it sets
+RECEIPT_LOCALS = [
+    ('retailer', 'retailer = record.retailer'),
+    ('retailer_lower', 'retailer_lower = retailer_facts.lookup(record.retailer)[0]'),
+    ('retailer_alphanumeric', 'retailer_alphanumeric = retailer_facts.lookup(record.retailer)[1]'),
+    ('total_cents', 'total_cents = record.total_cents'),
+    ('purchase_date', 'purchase_date = record.purchase_date'),
+    ('purchase_minute', 'purchase_minute = record.purchase_minute'),
+    ('item_count', 'item_count = len(record.prices)')
+]
+ITEM_LOCALS = [
+    ('trimmed_length', 'trimmed_length = len(description.strip())'),
+    ('description_lower', 'description_lower = description.lower()')
+]
+
+
+def describe_retailer(retailer):
+    return retailer.lower(), sum(map(str.isalnum, retailer))
+
+
+# (lowercase, alphanumeric character count) by retailer name, names repeat across receipts
+retailer_facts = Memo('retailer_facts', describe_retailer)
+
+
+def uses(local, expressions):
+    return re.search(rf'\b{local}\b', expressions) is not None
+
+
+def generate_scorer(name, compiled, timed, first_lines=()):
+    # source of one function scoring every rule in a single pass over the record
+    lines = [f'def {name}(record):', *first_lines, '    points = 0']
+    expressions = ' '.join(expression for _, _, expression in compiled)
+    lines += [f'    {line}' for local, line in RECEIPT_LOCALS if uses(local, expressions)]
+
+    for index, scope, expression in compiled:
+        if scope != 'receipt':
+            continue
+        if timed:
+            lines.append('    started = perf_counter()')
+        lines.append(f'    earned = {expression}')
+        if timed:
+            lines.append(f'    seconds[{index}] += perf_counter() - started')
+        lines += ['    if earned:', '        points += earned', f'        hits[{index}] += 1']
+
+    item_rules = [(index, expression) for index, scope, expression in compiled if scope == 'item']
+    if item_rules:
+        lines += [f'    item_{index} = 0' for index, _ in item_rules]
+        lines.append('    for description, price in zip(record.descriptions, record.prices):')
+        item_expressions = ' '.join(expression for _, expression in item_rules)
+        lines += [f'        {line}' for local, line in ITEM_LOCALS if uses(local, item_expressions)]
+        for index, expression in item_rules:
+            if timed:
+                lines.append('        started = perf_counter()')
+            lines.append(f'        item_{index} += {expression}')
+            if timed:
+                lines.append(f'        seconds[{index}] += perf_counter() - started')
+        for index, _ in item_rules:
+            lines += [f'    if item_{index}:', f'        points += item_{index}', f'        hits[{index}] += 1']
+
+    lines.append('    return points')
+    return '\n'.join(lines)
+
+
+class RuleSet:
+    '''
+    A rule set definition compiled into one scoring function. score(record) reads each
+    record field once and applies every rule in a single pass, item rules share one loop
+    over the items. Hit counts are kept for every receipt scored, per rule timings are
+    sampled from every timing_interval-th receipt by an instrumented copy of the scorer.
+    Counters are updated without locking and may miss a few counts under threads.
+    '''
+
+    def __init__(self, definition, timing_interval=DEFAULT_TIMING_INTERVAL):
+        if not isinstance(definition, dict):
+            raise RuleError('A rule set must be an object')
+        self.definition = definition
+        self.name = definition.get('name', None)
+        self.version = definition.get('version', None)
+        rules = definition.get('rules', None)
+        if not isinstance(self.name, str) or isinstance(self.version, bool) or not isinstance(self.version, int):
+            raise RuleError('A rule set needs a name and an integer version')
+        if not isinstance(rules, list) or not all(isinstance(rule, dict) for rule in rules):
+            raise RuleError('A rule set needs a list of rules')
+
+        constants = {}
+
+        def constant(value):
+            constants[f'constant_{len(constants)}'] = value
+            return f'constant_{len(constants) - 1}'
+
+        compiled = []
+        for index, rule in enumerate(rules):
+            kind = rule_kinds.get(rule.get('kind', None), None)
+            if kind is None or not isinstance(rule.get('name', None), str):
+                raise RuleError(f'Rule {index} needs a name and one of the kinds: {", ".join(rule_kinds)}')
+            scope, expression = kind(rule, constant)
+            compiled.append((index, scope, expression))
+
+        self.rules = [(rule['name'], rule['kind']) for rule in rules]
+        self.hits = [0] * len(rules)
+        self.seconds = [0.0] * len(rules)
+        self.calls = [0]
+        self.timing_interval = timing_interval
+
+        self.source = '\n\n'.join([
+            generate_scorer('score_timed', compiled, timed=True),
+            generate_scorer('score', compiled, timed=False, first_lines=[
+                '    calls[0] += 1',
+                f'    if not calls[0] % {int(timing_interval)!r}:',
+                '        return score_timed(record)'
+            ])
+        ])
+        namespace = dict(constants, ceil=math.ceil, retailer_facts=retailer_facts, is_calendar_date=is_calendar_date,
+                         perf_counter=time.perf_counter, hits=self.hits, seconds=self.seconds, calls=self.calls)
+        exec(compile(self.source, f'<rule set {self.name} v{self.version}>', 'exec'), namespace)
+        # a plain function attribute, scoring doesn't go through method binding
+        self.score = namespace['score']
+
+    def stats(self):
+        scored = self.calls[0]
+        timed = scored // self.timing_interval
+        return {
+            'name': self.name,
+            'version': self.version,
+            'scored': scored,
+            'rules': [
+                {
+                    'name': name,
+                    'kind': kind,
+                    'hits': self.hits[index],
+                    'mean_us': round(self.seconds[index] / timed * 1e6, 3) if timed else None
+                }
+                for index, (name, kind) in enumerate(self.rules)
+            ]
+        }
+
+
+# The rule set receipts are currently scored with. It's replaced as a whole on reload,
+# scorers pick up whichever rule set is active when they start a receipt
+
+active_rules = RuleSet(DEFAULT_RULES)
+rules_path = None
+rules_check_seconds = 5.0
+rules_timing_interval = DEFAULT_TIMING_INTERVAL
+rules_next_check = 0.0
+rules_mtime = None
+reload_lock = threading.Lock()
+# every rule set definition activated by this process, by version
+known_versions = {DEFAULT_RULES['version']: DEFAULT_RULES}
+
+
+def configure_rules(path=None, check_seconds=5.0, timing_interval=DEFAULT_TIMING_INTERVAL):
+    '''
+    Loads the rule set from path, a JSON file holding a definition like DEFAULT_RULES,
+    or the default rules without one, forgetting any rule sets used before. The file is
+    checked for changes every check_seconds and reloaded when it changes. Raises
+    RuleError if the file can't be used.
+    '''
+    global rules_path, rules_check_seconds, rules_timing_interval, rules_mtime, rules_next_check
+    rules_path = path or None
+    rules_check_seconds = check_seconds
+    rules_timing_interval = timing_interval
+    rules_mtime = None
+    known_versions.clear()
+    known_versions[DEFAULT_RULES['version']] = DEFAULT_RULES
+    if rules_path is None:
+        install_rules(RuleSet(DEFAULT_RULES, timing_interval))
+    else:
+        reload_rules()
+    rules_next_check = time.monotonic() + check_seconds
+
+
+def current_rules():
+    global rules_next_check
+    if rules_path is not None and time.monotonic() >= rules_next_check:
+        rules_next_check = time.monotonic() + rules_check_seconds
+        try:
+            if os.stat(rules_path).st_mtime_ns != rules_mtime:
+                reload_rules()
+        except (OSError, RuleError) as error:
+            logger.error('Keeping rule set %s v%s, reload failed: %s', active_rules.name, active_rules.version, error)
+    return active_rules
+
+
+def reload_rules(definition=None):
+    '''
+    Compiles and activates definition, or the configured rules file when definition is
+    None, and returns the active RuleSet. Raises RuleError, leaving the active rule set
+    in place, when the definition is invalid or reuses a version for different rules.
+    '''
+    global rules_mtime
+    with reload_lock:
+        if definition is None:
+            if rules_path is None:
+                raise RuleError('No rules file configured')
+            # a broken file is only retried once it changes again
+            rules_mtime = os.stat(rules_path).st_mtime_ns
+            try:
+                with open(rules_path) as rules_file:
+                    definition = json.load(rules_file)
+            except ValueError as error:
+                raise RuleError(f'{rules_path} is not valid JSON: {error}')
+
+        if not isinstance(definition, dict):
+            raise RuleError('A rule set must be an object')
+        if definition == active_rules.definition:
+            return active_rules
+        version = definition.get('version', None)
+        if known_versions.get(version, definition) != definition:
+            raise RuleError(f'Version {version} was already used for different rules, '
+                            'give the new rule set a new version')
+        return install_rules(RuleSet(definition, rules_timing_interval))
+
+
+def install_rules(rule_set):
+    global active_rules
+    known_versions[rule_set.version] = rule_set.definition
+    active_rules = rule_set
+    rules_changed()
+    logger.info('Scoring with rule set %s v%s, %s rules', rule_set.name, rule_set.version, len(rule_set.rules))
+    return rule_set
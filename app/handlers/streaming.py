@@ -0,0 +1,186 @@
+import re
+import json
+import codecs
+
+# Largest single receipt accepted in a streamed batch body, larger documents are
+# reported as errors instead of being buffered
+MAX_DOCUMENT_BYTES = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\r\n'
+_structural = re.compile(r'[][{}",\\]')
+
+
+async def iter_json_documents(chunks, max_document_bytes=MAX_DOCUMENT_BYTES):
+    '''
+    Incrementally decodes a streamed request body, either newline delimited JSON
+    or a single JSON array, without buffering more than one document at a time.
+
+    Yields lists of (line, document, error) tuples, one list per received chunk, where
+    line is the 1 based position of the document in the body and error is None when
+    the document decoded successfully.
+    '''
+    text_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    buffer = ''
+    parser = None
+
+    async for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        if parser is None:
+            stripped = buffer.lstrip(_whitespace)
+            if not stripped:
+                continue
+            parser = _ArrayParser(max_document_bytes) if stripped[0] == '[' else _LineParser(max_document_bytes)
+        buffer, documents = parser.feed(buffer)
+        if documents:
+            yield documents
+
+    buffer += text_decoder.decode(b'', final=True)
+    if parser is None:
+        parser = _LineParser(max_document_bytes)
+    documents = parser.finish(buffer)
+    if documents:
+        yield documents
+
+
+class _LineParser:
+
+    def __init__(self, max_document_bytes):
+        self.max_document_bytes = max_document_bytes
+        self.line = 0
+        self.skipping = False
+
+    def _decode(self, text):
+        self.line += 1
+        try:
+            return (self.line, json.loads(text), None)
+        except ValueError:
+            return (self.line, None, 'Malformed JSON')
+
+    def feed(self, buffer):
+        documents = []
+        lines = buffer.split('\n')
+        buffer = lines.pop()
+
+        for text in lines:
+            if self.skipping:
+                # tail of an oversized line that was already reported
+                self.skipping = False
+                continue
+            if text.strip(_whitespace):
+                documents.append(self._decode(text))
+
+        if len(buffer) > self.max_document_bytes and not self.skipping:
+            self.line += 1
+            documents.append((self.line, None, 'Document too large'))
+            self.skipping = True
+        if self.skipping:
+            buffer = ''
+
+        return buffer, documents
+
+    def finish(self, buffer):
+        buffer, documents = self.feed(buffer + '\n')
+        return documents
+
+
+def _element_end(buffer, position):
+    '''
+    End of the array element starting at position: past its closing bracket, or at the
+    comma or bracket after a scalar. None when the buffer ends first. Only brackets and
+    strings are followed, whether the element is valid JSON is left to the decoder.
+    '''
+    depth = 0
+    in_string = False
+    escaped = -1
+    for match in _structural.finditer(buffer, position):
+        character = match.group()
+        index = match.start()
+        if in_string:
+            if index == escaped:
+                continue
+            if character == '\\':
+                escaped = index + 1
+            elif character == '"':
+                in_string = False
+        elif character == '"':
+            in_string = True
+        elif character in '[{':
+            depth += 1
+        elif character in ']}':
+            depth -= 1
+            if depth == 0:
+                return index + 1
+            if depth < 0:
+                return index
+        elif character == ',' and depth == 0:
+            return index
+    return None
+
+
+class _ArrayParser:
+
+    def __init__(self, max_document_bytes):
+        self.max_document_bytes = max_document_bytes
+        self.line = 0
+        self.started = False
+        self.done = False
+
+    def feed(self, buffer, final=False):
+        documents = []
+        position = 0
+
+        while not self.done:
+            while position < len(buffer) and buffer[position] in _whitespace:
+                position += 1
+            if position == len(buffer):
+                break
+
+            character = buffer[position]
+            if not self.started:
+                # consume the opening bracket
+                self.started = True
+                position += 1
+                continue
+            if character == ',':
+                position += 1
+                continue
+            if character == ']':
+                self.done = True
+                position += 1
+                break
+
+            try:
+                document, end = _decoder.raw_decode(buffer, position)
+            except ValueError:
+                # malformed when the element is complete, otherwise the rest may be in the next
+                # chunk. Either way we can't resync after reporting it
+                if final or _element_end(buffer, position) is not None:
+                    error = 'Malformed JSON'
+                elif len(buffer) - position > self.max_document_bytes:
+                    error = 'Document too large'
+                else:
+                    break
+                self.line += 1
+                documents.append((self.line, None, error))
+                self.done = True
+                break
+
+            if end == len(buffer) and not final and not isinstance(document, (dict, list)):
+                # a number at the end of the buffer may continue in the next chunk
+                break
+
+            self.line += 1
+            documents.append((self.line, document, None))
+            position = end
+
+        if self.done:
+            return '', documents
+        return buffer[position:], documents
+
+    def finish(self, buffer):
+        buffer, documents = self.feed(buffer, final=True)
+        if not self.done:
+            self.line += 1
+            documents.append((self.line, None, 'Unterminated JSON array'))
+        return documents
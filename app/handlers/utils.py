@@ -1,194 +1,209 @@
 import math
 import logging
 import re
+from collections import namedtuple
+from array import array
 from datetime import datetime
+from sys import intern
+from .records import ReceiptRecord, parse_cents, parse_date, parse_time
+from .rules import DEFAULT_RULES, current_rules, retailer_facts
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def item_full_match(item):
-    logger.info(f'Validting item: {item}')
-    description = item.get('shortDescription', None)
-    price = item.get('price', None)
+# Version of the built in rule set, the rules determine_points implements
+RULES_VERSION = DEFAULT_RULES['version']
+
+# Validation patterns are compiled once at import, the fixed width fields are
+# checked with the hand written fast paths below instead of regular expressions
+retailer_match = re.compile('[\\w\\s\\-&]+').fullmatch
+description_match = re.compile('[\\w\\s\\-]+').fullmatch
+
+ValidationError = namedtuple('ValidationError', ['field', 'reason'])
+
+# Largest amount a record holds, in cents. Prices are stored as signed 64 bit integers
+MAX_CENTS = 2 ** 63 - 1
+
+
+def is_valid_price(value):
+    # equivalent to ^\d+\.\d{2}$
+    return (len(value) > 3 and value[-3] == '.'
+            and value[:-3].isdecimal() and value[-2:].isdecimal())
+
+def is_in_range(value):
+    # value already passed is_valid_price, amounts of up to 16 digits before the point always fit
+    return len(value) < 20 or parse_cents(value) <= MAX_CENTS
+
+def is_valid_time(value):
+    # equivalent to ^([01]?[0-9]|2[0-3]):([0-5]?[0-9])$
+    hour, separator, minute = value.partition(':')
+    return (separator == ':' and 0 < len(hour) < 3 and 0 < len(minute) < 3
+            and hour.isascii() and hour.isdigit() and minute.isascii() and minute.isdigit()
+            and int(hour) < 24 and int(minute) < 60)
+
+def is_valid_date(value):
+    # equivalent to ^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])$
+    if len(value) != 10 or value[4] != '-' or value[7] != '-' or not value[:4].isdecimal():
+        return False
+    month = value[5:7]
+    day = value[8:]
+    return (month.isascii() and day.isascii() and '01' <= month <= '12' and '01' <= day <= '31'
+            and month.isdigit() and day.isdigit())
+
+def find_item_error(item):
+    try:
+        description = item.get('shortDescription', None)
+        price = item.get('price', None)
+    except AttributeError:
+        return 'item is not an object'
 
     if not (description and price):
-        logger.info('Required field(s) missing, item invalid')
-        return None
-    
-    logger.info(f'Validating description: {description}')
-    if re.fullmatch('^[\\w\\s\\-]+$', description) is None:
-        logger.info('Invalid')
-        return None
-    logger.info('Valid')
-    
-    logger.info(f'Validating price: {price}')
-    if re.fullmatch('^\\d+\\.\\d{2}$', price) is None:
-        logger.info('Invalid')
+        return 'required field(s) missing'
+    if not isinstance(description, str) or description_match(description) is None:
+        return 'invalid shortDescription'
+    if not isinstance(price, str) or not is_valid_price(price):
+        return 'invalid price'
+    if not is_in_range(price):
+        return 'price out of range'
+    return None
+
+def find_receipt_error(receipt):
+    # returns None for a valid receipt, otherwise a ValidationError naming the first offending field
+    return read_receipt(receipt, build=False)[1]
+
+def item_full_match(item):
+    reason = find_item_error(item)
+    if reason is not None:
+        logger.debug('Item invalid: %s', reason)
         return None
-    logger.info('Valid')
-    
-    logger.info('Item valid')
     return True
 
 def validate_receipt(receipt):
-    try:
-        logger.info('Validating receipt')
-        retailer = receipt.get('retailer', None)
-        purchase_date = receipt.get('purchaseDate', None)
-        purchase_time = receipt.get('purchaseTime', None)
-        items = receipt.get('items', None)
-        total = receipt.get('total', None)
-
-        if not (retailer and purchase_date and purchase_time and items and total):
-            logger.info('Required field(s) missing, receipt invalid')
-            return False
-        
-        logger.info(f'Validating retailer: {retailer}')
-        if re.fullmatch('^[\\w\\s\\-&]+$', retailer) is None:
-            logger.info('Invalid')
-            return False
-        logger.info('Valid')
-        
-        logger.info(f'Validating total: {total}')
-        if re.fullmatch('^\\d+\\.\\d{2}$', total) is None:
-            logger.info('Invalid')
-            return False
-        logger.info('Valid')
-        
-        for item in items:
-            if item_full_match(item) is None:
-                return False
-            
-        logger.info(f'Validating purchase time: {purchase_time}')
-        if re.fullmatch('^([01]?[0-9]|2[0-3]):([0-5]?[0-9])$', purchase_time) is None:
-            logger.info('Invalid')
-            return False
-        logger.info('Valid')
-        
-        logger.info(f'Validating purchase date: {purchase_date}')
-        if re.fullmatch('^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])$', purchase_date) is None:
-            logger.info('Invalid')
-            return False
-        logger.info('Valid')
-    except Exception as error:
-        logger.error(f'''Caught exception validating receipt, returning invalid. 
-                     Error: {error}''')
+    error = find_receipt_error(receipt)
+    if error is not None:
+        logger.debug('Receipt invalid, field: %s, reason: %s', error.field, error.reason)
         return False
-
     return True
 
 def get_points_from_retailer(retailer):
-    logger.info(f'Determining points from retailer name: {retailer}')
+    logger.debug('Determining points from retailer name: %s', retailer)
 
     points = 0
 
     if retailer is None:
-        logger.info('Retailer not found on receipt, returning 0 points')
+        logger.debug('Retailer not found on receipt, returning 0 points')
         return points
     
     try:
-        for char in retailer:
-            if char.isalnum():
-                points += 1
-
-        logger.info(f'Points calculated: {points}')
+        if isinstance(retailer, str):
+            # names repeat across receipts, the count is memoized with the rules' retailer facts
+            points = retailer_facts.lookup(retailer)[1]
+        else:
+            for char in retailer:
+                if char.isalnum():
+                    points += 1
+
+        logger.debug('Points calculated: %s', points)
         return points
     except Exception as error:
-        logger.error(f'Error determining points from alpha numeric count: {error}')
+        logger.error('Error determining points from alpha numeric count: %s', error)
         return 0
     
 
 def get_points_from_total(total):
-    logger.info(f'Determining points from total: {total}')
+    logger.debug('Determining points from total: %s', total)
 
     points = 0
 
     if total is None:
-        logger.info('Total not found on receipt, returning 0 points')
+        logger.debug('Total not found on receipt, returning 0 points')
         return points
     
     try:
         total = float(total)
         if math.ceil(total) == total:
-            logger.info(f'Total is integer, adding 50 points')
+            logger.debug('Total is integer, adding 50 points')
             points += 50
 
         if total % 0.25 == 0:
-            logger.info(f'Total is multiple of 0.25, adding 25 points')
+            logger.debug('Total is multiple of 0.25, adding 25 points')
             points += 25
 
-        logger.info(f'Points calculated: {points}')
+        logger.debug('Points calculated: %s', points)
         return points
     except Exception as error:
-        logger.error(f'Error determining points from total: {error}')
+        logger.error('Error determining points from total: %s', error)
         return 0
 
 
 def get_points_from_items(items):
-    logger.info(f'Determining points from items on receipt')
+    logger.debug('Determining points from items on receipt')
 
     points = 0
     
     try:
         if len(items) == 0:
-            logger.info('Items not found on receipt, returning 0 points')
+            logger.debug('Items not found on receipt, returning 0 points')
             return points
 
         points += 5*math.floor(len(items) / 2)
         
+        # checked once, the per item detail below costs nothing unless debug logging is on
+        debug = logger.isEnabledFor(logging.DEBUG)
         for item in items:
-            logger.info(f'Determining point from item: {item}')
+            if debug:
+                logger.debug('Determining point from item: %s', item)
 
             description = item.get('shortDescription', None)
             price = item.get('price', None)
 
             if description is None or price is None:
-                logger.info(f'Description or price not found, continuing')
+                logger.debug('Description or price not found, continuing')
                 continue
 
             price = float(price)
 
             if len(description.strip()) % 3 == 0:
-                logger.info(f'''Trimmed description length is multiple of 3. 
-                            Based on price: {price} adding: {math.ceil(price*0.2)} to points''')
+                if debug:
+                    logger.debug('Trimmed description length is multiple of 3, based on price: %s adding: %s to points',
+                                 price, math.ceil(price * 0.2))
                 points += math.ceil(price * 0.2)
 
-        logger.info(f'Points calculated: {points}')
+        logger.debug('Points calculated: %s', points)
         return points
     except Exception as error:
-        logger.error(f'Error determining points from items: {error}')
+        logger.error('Error determining points from items: %s', error)
         return 0
 
 def get_points_from_purchase_date(date):
-    logger.info(f'Determining points from date on receipt: {date}')
+    logger.debug('Determining points from date on receipt: %s', date)
 
     points = 0
 
     if date is None:
-        logger.info('Purchase date not found on receipt, returning 0 points')
+        logger.debug('Purchase date not found on receipt, returning 0 points')
         return points
 
     try:
         purchase_date = datetime.strptime(date, '%Y-%m-%d')
 
         if purchase_date.day % 2 != 0:
-            logger.info(f'Purchase date is on odd day, adding 6 points')
+            logger.debug('Purchase date is on odd day, adding 6 points')
             points += 6
 
-        logger.info(f'Points calculated: {points}')
+        logger.debug('Points calculated: %s', points)
         return points
     except Exception as error:
-        logger.error(f'Exception caught determining points from purchase date: {error}')
+        logger.error('Exception caught determining points from purchase date: %s', error)
         return 0
 
 
 def get_points_from_purchase_time(time):
-    logger.info(f'Determining points from time on receipt: {time}')
+    logger.debug('Determining points from time on receipt: %s', time)
 
     points = 0
 
     if time is None:
-        logger.info('Purchase time not found on receipt, returning 0 points')
+        logger.debug('Purchase time not found on receipt, returning 0 points')
         return points
     
     try:
@@ -196,15 +211,15 @@ def get_points_from_purchase_time(time):
 
         hour_minute = 100*int(hour) + int(minute)
         
-        logger.info(f'Split time string, hour*100 + minute: {hour_minute}')
+        logger.debug('Split time string, hour*100 + minute: %s', hour_minute)
         if hour_minute > 1400 and hour_minute < 1600:
-            logger.info(f'Hour between 2 and 4, adding 10 points')
+            logger.debug('Hour between 2 and 4, adding 10 points')
             points += 10
 
-        logger.info(f'Points calculated: {points}')
+        logger.debug('Points calculated: %s', points)
         return points
     except Exception as error:
-        logger.error(f'Exception caught determining points from purchase time: {error}')
+        logger.error('Exception caught determining points from purchase time: %s', error)
         return 0
 
 
@@ -217,8 +232,91 @@ def determine_points(receipt):
         points += get_points_from_purchase_date(receipt.get('purchaseDate', None))
         points += get_points_from_purchase_time(receipt.get('purchaseTime', None))
     except Exception as error:
-        logger.error(f'Error caught determining points for receipt: {error}')
+        logger.error('Error caught determining points for receipt: %s', error)
         return 0
 
-    logger.info(f'Total points calculated: {points}')
+    logger.debug('Total points calculated: %s', points)
     return points
+
+def determine_record_points(record):
+    # the active rule set applied to a ReceiptRecord, the default rule set gives the same
+    # points as determine_points
+    return current_rules().score(record)
+
+def score_record(record):
+    # scores record in place with the active rule set and tags it with that rule set's version
+    rules = current_rules()
+    record.points = rules.score(record)
+    record.rules_version = rules.version
+    return record
+
+def build_receipt_record(receipt):
+    # validated receipt -> compact record, scored once at ingest and tagged with the rules version
+    return score_record(ReceiptRecord.from_receipt(receipt))
+
+def read_receipt(receipt, score=True, build=True):
+    '''
+    Validates a decoded receipt and builds its scored ReceiptRecord in the same pass, or
+    an unscored one when score is false. Returns (record, None), or (None, error) with a
+    ValidationError naming the first offending field. With build false the receipt is
+    only validated and a valid one returns (None, None), find_receipt_error does that.
+    '''
+    error = None
+    try:
+        retailer = receipt.get('retailer', None)
+        purchase_date = receipt.get('purchaseDate', None)
+        purchase_time = receipt.get('purchaseTime', None)
+        items = receipt.get('items', None)
+        total = receipt.get('total', None)
+    except AttributeError:
+        return None, ValidationError('receipt', 'receipt is not an object')
+
+    if not retailer:
+        error = ValidationError('retailer', 'required field missing')
+    elif not purchase_date:
+        error = ValidationError('purchaseDate', 'required field missing')
+    elif not purchase_time:
+        error = ValidationError('purchaseTime', 'required field missing')
+    elif not items:
+        error = ValidationError('items', 'required field missing')
+    elif not total:
+        error = ValidationError('total', 'required field missing')
+    elif not isinstance(retailer, str) or retailer_match(retailer) is None:
+        error = ValidationError('retailer', 'invalid format')
+    elif not isinstance(total, str) or not is_valid_price(total):
+        error = ValidationError('total', 'invalid format')
+    elif not is_in_range(total):
+        error = ValidationError('total', 'out of range')
+    elif not isinstance(items, list):
+        error = ValidationError('items', 'items is not a list')
+    if error is not None:
+        return None, error
+
+    descriptions = []
+    prices = array('q')
+    for index, item in enumerate(items):
+        reason = find_item_error(item)
+        if reason is not None:
+            return None, ValidationError(f'items[{index}]', reason)
+        if build:
+            descriptions.append(intern(item['shortDescription']))
+            prices.append(parse_cents(item['price']))
+
+    if not isinstance(purchase_time, str) or not is_valid_time(purchase_time):
+        return None, ValidationError('purchaseTime', 'invalid format')
+    if not isinstance(purchase_date, str) or not is_valid_date(purchase_date):
+        return None, ValidationError('purchaseDate', 'invalid format')
+    if not build:
+        return None, None
+
+    record = ReceiptRecord(intern(retailer), parse_cents(total), parse_date(purchase_date),
+                           parse_time(purchase_time), tuple(descriptions), prices)
+    return (score_record(record) if score else record), None
+
+def refresh_record(record):
+    # returns record unchanged when current, otherwise a rescored copy the caller should store
+    rules = current_rules()
+    if record.rules_version == rules.version:
+        return record
+    logger.debug('Cached points are stale, recomputing')
+    return record.with_points(rules.score(record), rules.version)
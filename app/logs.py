@@ -0,0 +1,95 @@
+import time
+import queue
+import atexit
+import random
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# not 'requests', the HTTP client library logs under that name
+request_logger = logging.getLogger('receipts.access')
+
+debug_sample_rate = 0.0
+listener = None
+
+
+class DroppingQueueHandler(QueueHandler):
+    '''
+    Hands records to the background writer without ever waiting. Records are queued
+    unformatted and formatted on the writer thread, so logged arguments must not be
+    changed after the call. Records arriving while the queue is full are dropped and
+    counted instead.
+    '''
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogWriter(QueueListener):
+    # background thread writing queued records to the real handlers
+
+    def enqueue_sentinel(self):
+        # the queue may be full when stopping, wait for the writer to make room
+        self.queue.put(self._sentinel)
+
+
+def configure_logging(level='INFO', queue_size=10000, sample_rate=0.0, stream=None):
+    '''
+    Configures the root logger once for the whole service. Records are handed to a
+    bounded queue and written by a background thread, so logging calls never block on
+    handler I/O, and messages below level are never formatted.
+    '''
+    global debug_sample_rate, listener
+    debug_sample_rate = sample_rate
+    stop_logging()
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    output = logging.StreamHandler(stream)
+    output.setFormatter(logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+    listener = LogWriter(log_queue, output, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = DroppingQueueHandler(log_queue)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener.start()
+    return handler
+
+
+@atexit.register
+def stop_logging():
+    # writes out everything still queued
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+def sample_debug(logger):
+    # true for a sample of calls when debug logging is enabled, gates expensive debug detail
+    return debug_sample_rate > 0 and logger.isEnabledFor(logging.DEBUG) and random.random() < debug_sample_rate
+
+
+def log_request(route, identifier, outcome, started, timings=None):
+    # the one summary line written per request, with the executor stage timings when there are any
+    if not request_logger.isEnabledFor(logging.INFO):
+        return
+    duration = (time.perf_counter() - started) * 1000
+    if timings:
+        request_logger.info('route=%s id=%s outcome=%s duration_ms=%.3f queued_ms=%.3f handler_ms=%.3f',
+                            route, identifier, outcome, duration,
+                            timings.get('queued', 0.0) * 1000, timings.get('handler', 0.0) * 1000)
+    else:
+        request_logger.info('route=%s id=%s outcome=%s duration_ms=%.3f', route, identifier, outcome, duration)
@@ -1,42 +1,238 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
-from factory import HandlerFactory
+from fastapi.responses import Response, JSONResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from factory import HandlerFactory, WorkerHTTPException, handler_map, handle_route_results, handle_route_in_worker, initialize_worker
+from executor import BoundedExecutor, ExecutorSaturated
+from storage import create_store, IndexedStore
+from handlers.records import ReceiptRecord
+from handlers.codec import dumps
+from config import STORE_BACKEND, STORE_PATH, STORE_ADDRESS, STORE_AUTHKEY
+from config import STORE_MAX_ENTRIES, STORE_MAX_BYTES, STORE_EVICTION, STORE_TTL_SECONDS, STORE_SPILL_PATH, STORE_SHARDS
+from config import STORE_INDEXES, AGGREGATES, RESCORE, RESCORE_CHUNK_SIZE, RESCORE_SHARE
+from config import JOURNAL_PATH, JOURNAL_BATCH_SIZE, JOURNAL_FLUSH_SECONDS, JOURNAL_WAIT, JOURNAL_QUEUE_SIZE
+from config import JOURNAL_SNAPSHOT_RECORDS
+from config import LOG_LEVEL, LOG_QUEUE_SIZE, LOG_DEBUG_SAMPLE_RATE
+from config import HANDLER_EXECUTOR, HANDLER_WORKERS, HANDLER_QUEUE_SIZE
+from config import RULES_PATH, RULES_CHECK_SECONDS, RULES_RELOAD, RULE_TIMING_INTERVAL
+from config import SCORING_MEMO_SIZE, SCORING_MEMO_CLEAR_ON_RELOAD
+from config import DEDUP_POLICY, DEDUP_WINDOW_SECONDS, DEDUP_MAX_ENTRIES
+from handlers.rules import configure_rules, current_rules
+from handlers.dedup import configure_dedup, forget_dropped
+from handlers.memo import configure_memos, memo_stats
+from handlers.aggregates import configure_aggregates
+from handlers.rescore import configure_rescoring, rescoring_stats
+from handlers.post.rules_reload import configure_rules_reload
+from logs import configure_logging, log_request
+from metrics import record_request, render
+import time
+import atexit
 import logging
 
-logging.basicConfig(level=logging.INFO)
+configure_logging(LOG_LEVEL, LOG_QUEUE_SIZE, LOG_DEBUG_SAMPLE_RATE)
 logger = logging.getLogger(__name__)
 
+configure_memos(SCORING_MEMO_SIZE, bool(SCORING_MEMO_CLEAR_ON_RELOAD))
+configure_rules(RULES_PATH, RULES_CHECK_SECONDS, RULE_TIMING_INTERVAL)
+configure_dedup(DEDUP_POLICY, DEDUP_WINDOW_SECONDS, DEDUP_MAX_ENTRIES)
+configure_rules_reload(bool(RULES_RELOAD), 'with HANDLER_EXECUTOR=process' if HANDLER_EXECUTOR == 'process'
+                       else 'with STORE_BACKEND=shared' if STORE_BACKEND == 'shared' else None)
+
 app = FastAPI()
 
-store = {}
+store = create_store(STORE_BACKEND, JOURNAL_PATH if STORE_BACKEND == 'journal' else STORE_PATH,
+                     STORE_ADDRESS, STORE_AUTHKEY, encode=ReceiptRecord.to_json, decode=ReceiptRecord.from_json,
+                     max_entries=STORE_MAX_ENTRIES, max_bytes=STORE_MAX_BYTES, eviction=STORE_EVICTION,
+                     ttl_seconds=STORE_TTL_SECONDS, spill_path=STORE_SPILL_PATH, shards=STORE_SHARDS,
+                     journal={'batch_size': JOURNAL_BATCH_SIZE, 'flush_seconds': JOURNAL_FLUSH_SECONDS,
+                              'queue_size': JOURNAL_QUEUE_SIZE, 'snapshot_records': JOURNAL_SNAPSHOT_RECORDS,
+                              'wait': bool(JOURNAL_WAIT)})
+# queued journal writes are synced and databases closed on the way out
+atexit.register(store.close)
+# evicted and expired receipts aren't answered as duplicates, their ids would 404
+store.on_drop(forget_dropped)
 
-@app.get('/{base}/{identifier}/{handler}')
-async def handle(base, identifier, handler):
-    logger.info(f'Entered get handler with base: {base}, identifier: {identifier}, and handler: {handler}')
+if HANDLER_EXECUTOR == 'process' and STORE_BACKEND in ('memory', 'sharded', 'bounded', 'journal'):
+    raise ValueError('HANDLER_EXECUTOR=process needs a store every process can reach, set STORE_BACKEND to sqlite or shared')
+
+if STORE_INDEXES and HANDLER_EXECUTOR != 'process' and STORE_BACKEND != 'shared':
+    # indexes of what this process stores, built from the receipts already stored
+    store = IndexedStore(store, lambda record: (record.retailer, record.purchase_date))
+
+if AGGREGATES and HANDLER_EXECUTOR != 'process' and STORE_BACKEND != 'shared':
+    # built from the receipts already stored in the background
+    configure_aggregates(store)
+
+if RESCORE and HANDLER_EXECUTOR != 'process' and STORE_BACKEND != 'shared':
+    # stored receipts are rescored in the background, starting with any stored under older rules
+    configure_rescoring(store, RESCORE_CHUNK_SIZE, RESCORE_SHARE, RULES_CHECK_SECONDS)
+    # stopped before the store closes, atexit runs the last registered first
+    atexit.register(configure_rescoring)
+
+executor = BoundedExecutor(HANDLER_EXECUTOR, HANDLER_WORKERS, HANDLER_QUEUE_SIZE,
+                           initializer=initialize_worker if HANDLER_EXECUTOR == 'process' else None,
+                           initargs=(STORE_BACKEND, STORE_PATH, STORE_ADDRESS, STORE_AUTHKEY, LOG_LEVEL,
+                                     RULES_PATH, RULES_CHECK_SECONDS, RULE_TIMING_INTERVAL, bool(RULES_RELOAD),
+                                     DEDUP_POLICY, DEDUP_WINDOW_SECONDS, DEDUP_MAX_ENTRIES,
+                                     SCORING_MEMO_SIZE, bool(SCORING_MEMO_CLEAR_ON_RELOAD)))
+
+
+async def run_route(base, handler, identifier=None, request=None, method='get', timings=None):
+    # handler results, computed on the configured executor. A saturated executor answers 503
+    try:
+        if executor.mode == 'process':
+            return await executor.run(handle_route_in_worker, base, handler, identifier, request, method,
+                                      timings=timings)
+        return await executor.run(handle_route_results, store, base, handler, identifier, request, method,
+                                  timings=timings)
+    except WorkerHTTPException as http_error:
+        status_code, detail = http_error.args
+        raise HTTPException(status_code=status_code, detail=detail)
+    except ExecutorSaturated as saturated:
+        logger.debug('Executor saturated, rejecting request: %s', saturated)
+        raise HTTPException(status_code=503, detail='Server is busy, try again later')
+
+
+def record_route(method, base, handler, outcome, started):
+    # request metrics, labelled with the route only when HandlerFactory resolves it
+    if handler not in handler_map.get(method, {}).get(base, {}):
+        base = handler = 'unmatched'
+    record_request(method, base, handler, outcome, started)
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    # StreamingResponse reads receive() to watch for client disconnects, which would
+    # swallow the request body chunks a batch handler is still streaming in
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+class FastJSONResponse(Response):
+    # same body as JSONResponse, encoded with the fast encoder
+    media_type = 'application/json'
+
+    def render(self, content):
+        return dumps(content)
+
+
+@app.get('/metrics')
+async def handle_metrics():
+    # Prometheus text format, the store is asked for its size on every scrape
+    return Response(render(store, current_rules(), executor, memo_stats(), rescoring_stats()),
+                    media_type='text/plain; version=0.0.4')
+
+
+async def serve(method, base, handler, label, compute, identifier=None, response_class=FastJSONResponse,
+                stream_class=StreamingResponse, media_type='application/json'):
+    '''
+    The response of every route. compute(timings) returns the handler results, a dict is
+    answered as JSON and anything else was produced lazily and is streamed. The request is
+    logged under label and its metrics recorded, for streamed results once the stream ends.
+    Handler errors keep their status, anything else answers 500.
+    '''
+    started = time.perf_counter()
+    outcome = 200
+    results = None
+    timings = {}
     try:
-        handler_class = HandlerFactory.handle_route(base, handler, store, identifier)
-        return JSONResponse(content=handler_class.results, status_code=200)
+        results = await compute(timings)
+        if not isinstance(results, dict):
+            outcome = None
+            return stream_class(recorded_stream(results, method, base, handler, label, started, timings),
+                                media_type=media_type)
+        return response_class(content=results, status_code=200)
     except HTTPException as http_exception:
-        logger.error(f'''HTTP Exception caught in get handler endpoint: 
-                     detail - {http_exception.detail}, 
-                     status - {http_exception.status_code}''')
-        raise HTTPException(status_code=http_exception.status_code, detail=http_exception.detail)
+        outcome = http_exception.status_code
+        logger.debug('HTTP Exception caught in %s: detail - %s, status - %s',
+                     label, http_exception.detail, http_exception.status_code)
+        raise
     except Exception as general_exception:
-        logger.error(f'General exception caught in get handler: {general_exception}')
+        outcome = 500
+        logger.error('General exception caught in %s: %s', label, general_exception)
         raise HTTPException(status_code=500)
+    finally:
+        if outcome is not None:
+            if identifier is None and isinstance(results, dict):
+                identifier = results.get('id', None)
+            log_request(label, identifier, outcome, started, timings)
+            record_route(method, base, handler, outcome, started)
 
 
-@app.post('/{base}/{handler}')
-async def handle(base, handler, request: Request):
+async def recorded_stream(results, method, base, handler, label, started, timings):
+    # streamed results, the request is logged and its metrics recorded after the last chunk.
+    # A stream the client closes early is recorded as 499, as nginx logs it
+    outcome = 499
     try:
-         request_body = await request.json()
-         handler_class = HandlerFactory.handle_route(base, handler, store, request=request_body)
-         return JSONResponse(content=handler_class.results, status_code=200)
-    except HTTPException as http_exception:
-        logger.error(f'''HTTP Exception caught in post handler endpoint: 
-                     detail - {http_exception.detail}, 
-                     status - {http_exception.status_code}''')
-        raise HTTPException(status_code=http_exception.status_code, detail=http_exception.detail)
+        if not hasattr(results, '__aiter__'):
+            # handlers produce their chunks on a worker thread, as StreamingResponse would run them
+            results = iterate_in_threadpool(results)
+        async for chunk in results:
+            yield chunk
+        outcome = 200
     except Exception as general_exception:
-        logger.error(f'General exception caught in post handler: {general_exception}')
-        raise HTTPException(status_code=500)
+        outcome = 500
+        logger.error('General exception caught streaming %s: %s', label, general_exception)
+        raise
+    finally:
+        log_request(label, None, outcome, started, timings)
+        record_route(method, base, handler, outcome, started)
+
+
+# Typed fast paths for the two hot receipt routes, declared ahead of the generic routes
+# so they match first. Errors keep the semantics of the generic routes.
+
+@app.post('/receipts/process')
+async def handle_receipt_process(request: Request):
+    async def compute(timings):
+        # the handler decodes and validates the raw body itself
+        return await run_route('receipts', 'process', request=await request.body(), method='post', timings=timings)
+    return await serve('post', 'receipts', 'process', 'POST /receipts/process', compute)
+
+
+@app.get('/receipts/{identifier}/points')
+async def handle_receipt_points(identifier):
+    async def compute(timings):
+        return await run_route('receipts', 'points', identifier, timings=timings)
+    return await serve('get', 'receipts', 'points', 'GET /receipts/points', compute, identifier)
+
+@app.get('/receipts')
+async def handle_receipt_query(retailer: str = None, start: str = None, end: str = None, cursor: str = None,
+                               limit: str = None):
+    async def compute(timings):
+        params = {'retailer': retailer, 'start': start, 'end': end, 'cursor': cursor, 'limit': limit}
+        return await run_route('receipts', 'query', request=params, timings=timings)
+    return await serve('get', 'receipts', 'query', 'GET /receipts', compute)
+
+
+@app.get('/receipts/aggregates')
+async def handle_receipt_aggregates(group: str = None, retailer: str = None, start: str = None, end: str = None):
+    async def compute(timings):
+        params = {'group': group, 'retailer': retailer, 'start': start, 'end': end}
+        return await run_route('receipts', 'aggregates', request=params, timings=timings)
+    return await serve('get', 'receipts', 'aggregates', 'GET /receipts/aggregates', compute)
+
+
+@app.get('/{base}/{identifier}/{handler}')
+async def handle(base, identifier, handler):
+    logger.debug('Entered get handler with base: %s, identifier: %s, and handler: %s', base, identifier, handler)
+    async def compute(timings):
+        return await run_route(base, handler, identifier, timings=timings)
+    return await serve('get', base, handler, f'GET /{base}/{handler}', compute, identifier, JSONResponse)
+
+
+@app.post('/{base}/{handler}')
+async def handle(base, handler, request: Request):
+    async def compute(timings):
+        # large results are produced lazily by the handler and streamed
+        return await run_route(base, handler, request=await request.json(), method='post', timings=timings)
+    return await serve('post', base, handler, f'POST /{base}/{handler}', compute, response_class=JSONResponse)
+
+
+@app.post('/{base}/{handler}/batch')
+async def handle_batch(base, handler, request: Request):
+    # the body is streamed through a single handler, one result line per receipt is streamed back.
+    # It runs on the event loop in every executor mode, the body is processed one received chunk
+    # at a time
+    async def compute(timings):
+        return HandlerFactory.handle_route(base, f'{handler}/batch', store, request=request.stream(), method='post').results
+    return await serve('post', base, f'{handler}/batch', f'POST /{base}/{handler}/batch', compute,
+                       stream_class=DuplexStreamingResponse, media_type='application/x-ndjson')
@@ -0,0 +1,232 @@
+import time
+from bisect import bisect_left
+
+# Upper bounds of the request latency buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Seconds the store's receipt count is reported again without recounting. Counting a SQLite
+# store, or a bounded store's spill tier, scans the whole table holding the store's lock
+STORE_COUNT_SECONDS = 30.0
+
+
+class Histogram:
+    '''
+    Counts of observed values per bucket, rendered as a cumulative Prometheus histogram.
+    Observing is one bisect and two additions, there is no lock and threads observing at
+    the same moment may lose a count.
+    '''
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # the last count is for values above every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+# Metrics are kept per process. Request metrics are recorded by the server process in
+# every executor mode, handler metrics by the process that ran the handler, which under
+# the process executor is a worker and isn't reported.
+
+# (method, base, handler, status) -> requests
+request_counts = {}
+# (method, base, handler) -> Histogram of request seconds
+request_latencies = {}
+# receipt field -> receipts rejected for it
+validation_failures = {}
+# 'found' / 'missing' -> points lookups by id
+points_lookups = {'found': 0, 'missing': 0}
+# receipts submitted again within the dedup window
+duplicates = [0]
+# [store, counted at, receipts] of the last count of the store's receipts
+store_count = [None, 0.0, 0]
+
+
+def record_request(method, base, handler, status, started):
+    # callers pass 'unmatched' for routes HandlerFactory doesn't resolve, so arbitrary
+    # paths can't add label values
+    key = (method, base, handler)
+    latencies = request_latencies.get(key, None)
+    if latencies is None:
+        latencies = request_latencies[key] = Histogram()
+    latencies.observe(time.perf_counter() - started)
+    key = (method, base, handler, status)
+    request_counts[key] = request_counts.get(key, 0) + 1
+
+
+def record_validation_failure(field):
+    validation_failures[field] = validation_failures.get(field, 0) + 1
+
+
+def record_points_lookup(found):
+    points_lookups['found' if found else 'missing'] += 1
+
+
+def record_duplicate():
+    duplicates[0] += 1
+
+
+def count_receipts(store):
+    # len(store), counted again at most every STORE_COUNT_SECONDS
+    counted, counted_at, receipts = store_count
+    now = time.monotonic()
+    if counted is not store or now - counted_at >= STORE_COUNT_SECONDS:
+        receipts = len(store)
+        store_count[:] = [store, now, receipts]
+    return receipts
+
+
+def reset():
+    request_counts.clear()
+    request_latencies.clear()
+    validation_failures.clear()
+    points_lookups.update(found=0, missing=0)
+    duplicates[0] = 0
+    store_count[:] = [None, 0.0, 0]
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**values):
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in values.items()) + '}' if values else ''
+
+
+def number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Exposition:
+    # lines of the Prometheus text format, one HELP and TYPE header per metric family
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help_text):
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {kind}')
+
+    def sample(self, name, value, **label_values):
+        self.lines.append(f'{name}{labels(**label_values)} {number(value)}')
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def render(store=None, rules=None, executor=None, memos=None, rescoring=None):
+    '''
+    Every metric in the Prometheus text exposition format. store, rules (a RuleSet),
+    executor (a BoundedExecutor), memos (memo_stats()) and rescoring (rescoring_stats())
+    add their gauges and counters when given.
+    '''
+    output = Exposition()
+
+    output.family('receipt_requests_total', 'counter', 'Requests by route and response status.')
+    for (method, base, handler, status), count in sorted(request_counts.items(), key=str):
+        output.sample('receipt_requests_total', count, method=method, base=base, handler=handler, status=status)
+
+    output.family('receipt_request_duration_seconds', 'histogram', 'Request latency by route.')
+    for (method, base, handler), latencies in sorted(request_latencies.items()):
+        route = {'method': method, 'base': base, 'handler': handler}
+        cumulative = 0
+        for bound, count in zip(latencies.bounds + ('+Inf',), latencies.counts):
+            cumulative += count
+            output.sample('receipt_request_duration_seconds_bucket', cumulative, **route, le=bound)
+        output.sample('receipt_request_duration_seconds_sum', latencies.sum, **route)
+        output.sample('receipt_request_duration_seconds_count', cumulative, **route)
+
+    output.family('receipt_validation_failures_total', 'counter', 'Receipts rejected, by the first invalid field.')
+    for field, count in sorted(validation_failures.items()):
+        output.sample('receipt_validation_failures_total', count, field=field)
+
+    output.family('receipt_points_lookups_total', 'counter', 'Points lookups by id, found or missing (404).')
+    for result, count in points_lookups.items():
+        output.sample('receipt_points_lookups_total', count, result=result)
+
+    output.family('receipt_duplicates_total', 'counter', 'Receipts submitted again within the dedup window.')
+    output.sample('receipt_duplicates_total', duplicates[0])
+
+    if store is not None:
+        output.family('receipt_store_receipts', 'gauge',
+                      f'Receipts in the store, counted at most every {STORE_COUNT_SECONDS:g}s.')
+        output.sample('receipt_store_receipts', count_receipts(store))
+        size = store.approximate_bytes()
+        if size is not None:
+            output.family('receipt_store_bytes', 'gauge', 'Approximate memory, or disk for on disk stores, used by the store.')
+            output.sample('receipt_store_bytes', size)
+        stats = store.stats() or {}
+        if 'evictions' in stats:
+            output.family('receipt_store_evictions_total', 'counter', 'Receipts evicted from memory, by reason.')
+            for reason, count in stats['evictions'].items():
+                output.sample('receipt_store_evictions_total', count, reason=reason)
+            output.family('receipt_store_reads_total', 'counter',
+                          'Receipt reads by the tier that answered them, or missing.')
+            for tier, count in stats['reads'].items():
+                output.sample('receipt_store_reads_total', count, tier=tier)
+        if 'journal' in stats:
+            journal = stats['journal']
+            output.family('receipt_journal_commits_total', 'counter', 'Groups of writes synced to the journal.')
+            output.sample('receipt_journal_commits_total', journal['commits'])
+            output.family('receipt_journal_records_total', 'counter', 'Writes synced to the journal.')
+            output.sample('receipt_journal_records_total', journal['records'])
+            output.family('receipt_journal_sync_seconds_total', 'counter', 'Seconds spent writing and syncing groups.')
+            output.sample('receipt_journal_sync_seconds_total', journal['sync_seconds'])
+            output.family('receipt_journal_queued', 'gauge', 'Writes waiting for the journal writer.')
+            output.sample('receipt_journal_queued', journal['queued'])
+            output.family('receipt_journal_snapshots_total', 'counter', 'Journal snapshots written.')
+            output.sample('receipt_journal_snapshots_total', journal['snapshots'])
+
+    if rules is not None:
+        stats = rules.stats()
+        rule_set = {'rule_set': stats['name'], 'version': stats['version']}
+        output.family('receipt_rules_scored_total', 'counter', 'Receipts scored by the active rule set.')
+        output.sample('receipt_rules_scored_total', stats['scored'], **rule_set)
+        output.family('receipt_rule_hits_total', 'counter', 'Receipts each rule awarded points to.')
+        for rule in stats['rules']:
+            output.sample('receipt_rule_hits_total', rule['hits'], **rule_set, rule=rule['name'])
+        output.family('receipt_rule_seconds_total', 'counter',
+                      'Seconds spent in each rule over the sampled receipts, see receipt_rules_timed_total.')
+        for index, (name, _) in enumerate(rules.rules):
+            output.sample('receipt_rule_seconds_total', rules.seconds[index], **rule_set, rule=name)
+        output.family('receipt_rules_timed_total', 'counter', 'Receipts scored with per rule timing.')
+        output.sample('receipt_rules_timed_total', stats['scored'] // rules.timing_interval, **rule_set)
+
+    if executor is not None:
+        output.family('receipt_executor_in_flight', 'gauge', 'Requests running or queued on the handler executor.')
+        output.sample('receipt_executor_in_flight', executor.in_flight, mode=executor.mode)
+        output.family('receipt_executor_rejected_total', 'counter', 'Requests answered 503 by a saturated executor.')
+        output.sample('receipt_executor_rejected_total', executor.rejected, mode=executor.mode)
+
+    if memos:
+        output.family('receipt_memo_entries', 'gauge', 'Entries held by each scoring memo.')
+        for memo in memos:
+            output.sample('receipt_memo_entries', memo['entries'], memo=memo['name'])
+        output.family('receipt_memo_lookups_total', 'counter', 'Scoring memo lookups, answered from the memo or computed.')
+        for memo in memos:
+            output.sample('receipt_memo_lookups_total', memo['hits'], memo=memo['name'], result='hit')
+            output.sample('receipt_memo_lookups_total', memo['misses'], memo=memo['name'], result='miss')
+        output.family('receipt_memo_evictions_total', 'counter', 'Least recently used entries dropped from a full memo.')
+        for memo in memos:
+            output.sample('receipt_memo_evictions_total', memo['evictions'], memo=memo['name'])
+
+    if rescoring is not None:
+        output.family('receipt_rescore_running', 'gauge', 'Whether stored receipts are being rescored.')
+        output.sample('receipt_rescore_running', int(rescoring['running']))
+        output.family('receipt_rescore_receipts_total', 'counter',
+                      'Stored receipts scanned by background rescoring, and those rescored.')
+        output.sample('receipt_rescore_receipts_total', rescoring['scanned'], result='scanned')
+        output.sample('receipt_rescore_receipts_total', rescoring['rescored'], result='rescored')
+        progress = rescoring['pass']
+        if progress is not None:
+            output.family('receipt_rescore_pass_ratio', 'gauge',
+                          'Fraction of the receipts stored when the latest pass started that it has scanned.')
+            done = 1.0
+            if rescoring['running'] and progress['total']:
+                done = min(progress['scanned'] / progress['total'], 1.0)
+            output.sample('receipt_rescore_pass_ratio', done, version=progress['rules_version'])
+
+    return output.text()
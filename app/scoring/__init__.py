@@ -0,0 +1 @@
+from .offline import score_file, score_lines, split_chunks
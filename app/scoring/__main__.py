@@ -0,0 +1,29 @@
+import os
+import sys
+import argparse
+from .offline import score_file, CHUNK_BYTES
+
+
+def main():
+    from_environment = os.environ.get
+    parser = argparse.ArgumentParser(description='Score a file of newline delimited JSON receipts without the service. '
+                                                 'Writes one result line per receipt, in input order')
+    parser.add_argument('input', help='NDJSON file of receipts')
+    parser.add_argument('--output', default='-', help='file for the results, - for stdout')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='scoring processes, 1 scores in this one')
+    parser.add_argument('--rules', default=from_environment('RULES_PATH', None),
+                        help='rule set JSON file, the built in rules without one')
+    parser.add_argument('--chunk-bytes', type=int, default=CHUNK_BYTES, help='input bytes per task')
+    parser.add_argument('--quiet', action='store_true', help="don't report progress on stderr")
+    arguments = parser.parse_args()
+
+    progress = None if arguments.quiet else sys.stderr
+    if arguments.output == '-':
+        score_file(arguments.input, sys.stdout.buffer, arguments.workers, arguments.rules, arguments.chunk_bytes, progress)
+    else:
+        with open(arguments.output, 'wb') as output:
+            score_file(arguments.input, output, arguments.workers, arguments.rules, arguments.chunk_bytes, progress)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import os
+import mmap
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ..handlers.codec import loads, dumps
+from ..handlers.rules import configure_rules
+from ..handlers.utils import read_receipt
+from ..handlers.streaming import MAX_DOCUMENT_BYTES
+
+# bytes of input per task, chunks end at the first line end after this many bytes
+CHUNK_BYTES = 4 * 1024 * 1024
+
+# tasks queued per worker, at most workers * this many chunks of output are held
+TASKS_PER_WORKER = 2
+
+WHITESPACE = b' \t\r\n'
+
+
+def split_chunks(data, chunk_bytes=CHUNK_BYTES):
+    '''
+    (start, end, first_line) of consecutive chunks of data, each about chunk_bytes and
+    ending just after a line end, or at the end of data. first_line is the 1 based line
+    number of the chunk's first line.
+    '''
+    start = 0
+    line = 1
+    while start < len(data):
+        end = data.find(b'\n', min(start + chunk_bytes, len(data)) - 1)
+        end = len(data) if end < 0 else end + 1
+        yield start, end, line
+        # mmap has no count, the copy costs far less than scoring the chunk
+        line += data[start:end].count(b'\n')
+        start = end
+
+
+def score_lines(data, first_line=1):
+    '''
+    One NDJSON result per non blank line of data, in order, as bytes. A result is the
+    line number and the points with the receipt's id when it carries one, or the line
+    number and the error, with the invalid field for receipts that fail validation.
+    '''
+    output = []
+    for offset, text in enumerate(data.split(b'\n')):
+        text = text.strip(WHITESPACE)
+        if not text:
+            continue
+        line = first_line + offset
+        if len(text) > MAX_DOCUMENT_BYTES:
+            output.append(dumps({'line': line, 'error': 'Document too large'}))
+            continue
+        try:
+            receipt = loads(text)
+        except ValueError:
+            output.append(dumps({'line': line, 'error': 'Malformed JSON'}))
+            continue
+        record, error = read_receipt(receipt)
+        if error is not None:
+            output.append(dumps({'line': line, 'error': 'The receipt is invalid', 'field': error.field}))
+            continue
+        result = {'line': line, 'points': record.points}
+        if isinstance(receipt.get('id', None), str):
+            result['id'] = receipt['id']
+        output.append(dumps(result))
+    return b'\n'.join(output) + b'\n' if output else b''
+
+
+# Each pool worker maps the input file once and scores the chunks it's handed
+
+worker_input = None
+
+
+def initialize_worker(path, rules_path):
+    global worker_input
+    configure_rules(rules_path)
+    with open(path, 'rb') as input_file:
+        worker_input = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def score_chunk(start, end, first_line):
+    # (output, lines, bytes) of one chunk of the mapped input
+    data = worker_input[start:end]
+    return score_lines(data, first_line), data.count(b'\n'), end - start
+
+
+class Progress:
+    # input bytes and lines scored so far, reported to stream at most every interval seconds
+
+    def __init__(self, total_bytes, stream=None, interval=1.0):
+        self.total_bytes = total_bytes
+        self.stream = stream
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.reported = self.started
+        self.bytes = 0
+        self.lines = 0
+
+    def update(self, lines, size):
+        self.lines += lines
+        self.bytes += size
+        now = time.perf_counter()
+        if self.stream is not None and now - self.reported >= self.interval:
+            self.reported = now
+            self.report(now)
+
+    def report(self, now):
+        elapsed = now - self.started
+        percent = self.bytes / self.total_bytes * 100 if self.total_bytes else 100.0
+        self.stream.write(f'{percent:5.1f}%  {self.lines:,} lines  {self.lines / elapsed:,.0f} lines/s  '
+                          f'{self.bytes / elapsed / 2 ** 20:,.1f} MiB/s\n')
+        self.stream.flush()
+
+
+def score_file(path, output, workers=None, rules_path=None, chunk_bytes=CHUNK_BYTES, progress=None):
+    '''
+    Scores every receipt in the NDJSON file at path, writing score_lines results to
+    output, a binary file, in input order. The file is memory mapped and split into
+    chunks scored by a pool of workers (os.cpu_count() by default, 1 scores in this
+    process). At most workers * TASKS_PER_WORKER chunks are in flight, so memory stays
+    bounded whatever the file size. progress, a text stream, gets a line every second.
+    Returns the Progress with the lines and bytes scored.
+    '''
+    workers = workers or os.cpu_count() or 1
+    size = os.path.getsize(path)
+    tracker = Progress(size, progress)
+    if size == 0:
+        return tracker
+
+    with open(path, 'rb') as input_file:
+        data = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if workers == 1:
+            configure_rules(rules_path)
+            for start, end, first_line in split_chunks(data, chunk_bytes):
+                chunk = data[start:end]
+                output.write(score_lines(chunk, first_line))
+                tracker.update(chunk.count(b'\n'), end - start)
+        else:
+            with ProcessPoolExecutor(workers, initializer=initialize_worker, initargs=(path, rules_path)) as pool:
+                pending = []
+                for task in split_chunks(data, chunk_bytes):
+                    pending.append(pool.submit(score_chunk, *task))
+                    if len(pending) >= workers * TASKS_PER_WORKER:
+                        write_result(pending.pop(0), output, tracker)
+                for future in pending:
+                    write_result(future, output, tracker)
+    finally:
+        data.close()
+    if progress is not None:
+        tracker.report(time.perf_counter())
+    return tracker
+
+
+def write_result(future, output, tracker):
+    chunk_output, lines, size = future.result()
+    output.write(chunk_output)
+    tracker.update(lines, size)
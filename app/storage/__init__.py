@@ -0,0 +1,29 @@
+from .base import ReceiptStore
+from .memory import MemoryStore
+from .sqlite import SqliteStore
+from .shared import SharedStore, StoreServer
+from .bounded import BoundedStore
+from .indexed import IndexedStore, ReceiptIndex
+from .journal import JournaledStore, JournalError
+from .sharded import ShardedStore
+
+
+def create_store(backend, path=None, address=None, authkey=None, encode=None, decode=None,
+                 max_entries=0, max_bytes=0, eviction='lru', ttl_seconds=0.0, spill_path=None, journal=None,
+                 shards=16):
+    if backend == 'memory':
+        return MemoryStore()
+    if backend == 'sharded':
+        return ShardedStore(shards)
+    if backend == 'bounded':
+        # evicted entries go to a sqlite disk tier at spill_path, or are dropped without one
+        disk = SqliteStore(spill_path, encode, decode) if spill_path else None
+        return BoundedStore(max_entries, max_bytes, eviction, ttl_seconds, disk)
+    if backend == 'journal':
+        # journal holds the JournaledStore options, the log directory is path
+        return JournaledStore(path, encode, decode, **(journal or {}))
+    if backend == 'sqlite':
+        return SqliteStore(path, encode, decode)
+    if backend == 'shared':
+        return SharedStore(address, authkey)
+    raise ValueError(f'Unknown store backend: {backend}')
@@ -0,0 +1,57 @@
+import os
+import logging
+import argparse
+from .memory import MemoryStore
+from .sqlite import SqliteStore
+from .bounded import BoundedStore
+from .shared import StoreServer
+from .journal import JournaledStore
+from .sharded import ShardedStore
+
+
+def main():
+    from_environment = os.environ.get
+    parser = argparse.ArgumentParser(description='Serve the receipts store to every API worker process')
+    parser.add_argument('--address', default=from_environment('STORE_ADDRESS', '/tmp/receipts.sock'))
+    parser.add_argument('--backend', default=from_environment('STORE_SERVER_BACKEND', 'memory'),
+                        choices=['memory', 'sharded', 'sqlite', 'bounded', 'journal'])
+    parser.add_argument('--path', default=from_environment('STORE_PATH', 'receipts.db'))
+    parser.add_argument('--journal-path', default=from_environment('JOURNAL_PATH', 'receipts.journal'))
+    # connections are served on threads each, the sharded backend lets them write without waiting on each other
+    parser.add_argument('--shards', type=int, default=int(from_environment('STORE_SHARDS', 16)))
+    # limits of the bounded backend, see app/config.py
+    parser.add_argument('--max-entries', type=int, default=int(from_environment('STORE_MAX_ENTRIES', 0)))
+    parser.add_argument('--max-bytes', type=int, default=int(from_environment('STORE_MAX_BYTES', 0)))
+    parser.add_argument('--eviction', default=from_environment('STORE_EVICTION', 'lru'), choices=['lru', 'ttl'])
+    parser.add_argument('--ttl-seconds', type=float, default=float(from_environment('STORE_TTL_SECONDS', 0)))
+    parser.add_argument('--spill-path', default=from_environment('STORE_SPILL_PATH', ''))
+    arguments = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # entries are already pickled by the clients
+    if arguments.backend == 'memory':
+        store = MemoryStore()
+    elif arguments.backend == 'sharded':
+        store = ShardedStore(arguments.shards)
+    elif arguments.backend == 'bounded':
+        disk = SqliteStore(arguments.spill_path, bytes, bytes) if arguments.spill_path else None
+        store = BoundedStore(arguments.max_entries, arguments.max_bytes, arguments.eviction, arguments.ttl_seconds, disk)
+    elif arguments.backend == 'journal':
+        # the journal options besides its directory are read from the environment, see app/config.py
+        store = JournaledStore(arguments.journal_path, bytes, bytes,
+                               batch_size=int(from_environment('JOURNAL_BATCH_SIZE', 256)),
+                               flush_seconds=float(from_environment('JOURNAL_FLUSH_SECONDS', 0)),
+                               queue_size=int(from_environment('JOURNAL_QUEUE_SIZE', 10000)),
+                               snapshot_records=int(from_environment('JOURNAL_SNAPSHOT_RECORDS', 1000000)),
+                               wait=bool(int(from_environment('JOURNAL_WAIT', 0))))
+    else:
+        store = SqliteStore(arguments.path, bytes, bytes)
+    authkey = from_environment('STORE_AUTHKEY', 'receipts').encode()
+    try:
+        StoreServer(store, arguments.address, authkey).serve_forever()
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+from abc import ABC, abstractmethod
+
+
+class ReceiptStore(ABC):
+    '''
+    Storage interface used by the handlers. Entries are keyed by receipt id, a store
+    never mutates the entries it is given and callers put an entry back after changing it.
+    Every store implements the abstract methods. Optional capabilities are advertised by
+    the supports_ attributes, callers check them before using the methods they cover.
+    '''
+
+    # query answers pages of the entries by retailer and purchase date
+    supports_query = False
+
+    @abstractmethod
+    def get(self, receipt_id, default=None):
+        ...
+
+    @abstractmethod
+    def put(self, receipt_id, entry):
+        ...
+
+    @abstractmethod
+    def get_many(self, receipt_ids):
+        # returns a dict of the ids that were found, missing ids are left out
+        ...
+
+    @abstractmethod
+    def put_many(self, entries):
+        # entries is a dict of receipt id to entry
+        ...
+
+    def replace_many(self, entries):
+        # new versions of stored entries, written where the store keeps them without counting
+        # as a use. Stores with one tier and no eviction order simply put them
+        self.put_many(entries)
+
+    @abstractmethod
+    def delete_many(self, receipt_ids):
+        # ids that aren't stored are ignored
+        ...
+
+    @abstractmethod
+    def iterate(self, chunk_size=1000):
+        # yields (receipt id, entry) pairs, chunk_size bounds the work done per step
+        ...
+
+    def query(self, retailer=None, start=None, end=None, after=None, limit=100):
+        # a page of the entries by retailer and purchase date, only where supports_query
+        raise NotImplementedError(f'{type(self).__name__} does not support queries')
+
+    @abstractmethod
+    def __len__(self):
+        ...
+
+    def on_drop(self, callback):
+        # callback(entries), a dict of receipt id to entry, is called with the entries the store
+        # drops on its own, evicted or expired. Stores keeping every entry until it's deleted
+        # never call it
+        pass
+
+    def approximate_bytes(self):
+        # rough size of the stored entries, None when the store can't tell
+        return None
+
+    def stats(self):
+        # store specific counters for the metrics, None when there are none
+        return None
+
+    def close(self):
+        pass
@@ -0,0 +1,249 @@
+import time
+import threading
+from collections import OrderedDict
+from .base import ReceiptStore
+from .memory import deep_size, sampled_bytes
+
+EVICTION_POLICIES = ('lru', 'ttl')
+
+# bytes an entry costs beyond its id and value: the ordered dict slot and link, and the
+# (entry, size, written) tuple
+ENTRY_OVERHEAD = 160
+
+# evicted entries written to the disk tier per transaction
+SPILL_BATCH = 256
+
+
+class BoundedStore(ReceiptStore):
+    '''
+    In memory store holding at most max_entries entries and about max_bytes bytes of them,
+    0 leaves either unlimited. With eviction 'lru' the least recently read or written
+    entries are evicted first. With 'ttl' entries are kept in write order and also expire
+    ttl_seconds after they were written.
+
+    Evicted and expired entries are handed to disk, another store such as a SqliteStore,
+    in batches of SPILL_BATCH, or dropped without one. Reads fall through to the disk tier
+    and move what they find back into memory. Evicting is amortized O(1) per write, every
+    entry is evicted at most once per write and only ever from the front of the order.
+    Entries are only measured, which costs more than storing them, when max_bytes is set.
+
+    len counts an entry twice when it's put again while only the disk tier holds it,
+    without being read first, until it's evicted again.
+
+    Entries dropped without a disk tier are passed to the on_drop callbacks, which run
+    holding the store's lock and mustn't call the store.
+    '''
+
+    def __init__(self, max_entries=0, max_bytes=0, eviction='lru', ttl_seconds=0.0, disk=None):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f'Unknown eviction policy: {eviction}, expected one of {", ".join(EVICTION_POLICIES)}')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lru = eviction == 'lru'
+        self.ttl_seconds = ttl_seconds if eviction == 'ttl' else 0.0
+        self.disk = disk
+        self.lock = threading.Lock()
+        # receipt id -> (entry, size, written)
+        self.entries = OrderedDict()
+        self.bytes = 0
+        # evicted entries waiting to be written to disk, and promoted ids waiting to be deleted from it
+        self.spilled = {}
+        self.promoted = set()
+        self.evictions = {'capacity': 0, 'expired': 0}
+        self.reads = {'memory': 0, 'disk': 0, 'missing': 0}
+        self.drop_callbacks = []
+
+    def get(self, receipt_id, default=None):
+        # the disk tier is read holding the lock, so an entry can't move between tiers unseen
+        with self.lock:
+            entry = self.read_memory(receipt_id)
+            if entry is None and self.disk is not None:
+                entry = self.disk.get(receipt_id)
+                if entry is not None:
+                    self.reads['disk'] += 1
+                    self.promote(receipt_id, entry)
+            if entry is None:
+                self.reads['missing'] += 1
+                return default
+            return entry
+
+    def put(self, receipt_id, entry):
+        with self.lock:
+            self.write(receipt_id, entry)
+            self.evict()
+
+    def get_many(self, receipt_ids):
+        found = {}
+        missing = []
+        with self.lock:
+            for receipt_id in receipt_ids:
+                entry = self.read_memory(receipt_id)
+                if entry is None:
+                    missing.append(receipt_id)
+                else:
+                    found[receipt_id] = entry
+            if missing and self.disk is not None:
+                from_disk = self.disk.get_many(missing)
+                self.reads['disk'] += len(from_disk)
+                for receipt_id, entry in from_disk.items():
+                    self.promote(receipt_id, entry)
+                found.update(from_disk)
+                missing = [receipt_id for receipt_id in missing if receipt_id not in from_disk]
+            self.reads['missing'] += len(missing)
+        return found
+
+    def put_many(self, entries):
+        with self.lock:
+            for receipt_id, entry in entries.items():
+                self.write(receipt_id, entry)
+            self.evict()
+
+    def replace_many(self, entries):
+        # each entry stays in the tier holding it, in memory at its place in the eviction order
+        # and with its write time, so rewriting every entry doesn't pull the disk tier into
+        # memory. Ids neither tier holds are skipped. The disk tier is written holding the lock,
+        # like it's read, so an entry can't be promoted from it meanwhile
+        with self.lock:
+            on_disk = {}
+            for receipt_id, entry in entries.items():
+                held = self.entries.get(receipt_id, None)
+                if held is not None:
+                    size = deep_size(receipt_id) + deep_size(entry) + ENTRY_OVERHEAD if self.max_bytes else 0
+                    self.bytes += size - held[1]
+                    # assigning an existing key keeps its position
+                    self.entries[receipt_id] = (entry, size, held[2])
+                elif receipt_id in self.spilled:
+                    self.spilled[receipt_id] = entry
+                elif self.disk is not None:
+                    on_disk[receipt_id] = entry
+            if on_disk:
+                held = self.disk.get_many(on_disk)
+                self.disk.replace_many({receipt_id: on_disk[receipt_id] for receipt_id in held})
+            if self.max_bytes:
+                self.evict()
+
+    def delete_many(self, receipt_ids):
+        receipt_ids = list(receipt_ids)
+        with self.lock:
+            for receipt_id in receipt_ids:
+                held = self.entries.pop(receipt_id, None)
+                if held is not None:
+                    self.bytes -= held[1]
+                self.spilled.pop(receipt_id, None)
+                self.promoted.discard(receipt_id)
+        if self.disk is not None:
+            self.disk.delete_many(receipt_ids)
+
+    def iterate(self, chunk_size=1000):
+        # memory first, then the disk tier without the entries memory already yielded
+        with self.lock:
+            in_memory = list(self.entries)
+            spilled = list(self.spilled.items())
+        for receipt_id in in_memory:
+            held = self.entries.get(receipt_id, None)
+            if held is not None:
+                yield receipt_id, held[0]
+        yield from spilled
+        if self.disk is not None:
+            seen = set(in_memory)
+            seen.update(receipt_id for receipt_id, _ in spilled)
+            for receipt_id, entry in self.disk.iterate(chunk_size):
+                if receipt_id not in seen:
+                    yield receipt_id, entry
+
+    def __len__(self):
+        # promoted ids are still on disk until the next spill deletes them, and also held here
+        with self.lock:
+            held = len(self.entries) + len(self.spilled) - len(self.promoted)
+        return held + (len(self.disk) if self.disk is not None else 0)
+
+    def on_drop(self, callback):
+        self.drop_callbacks.append(callback)
+
+    def approximate_bytes(self):
+        # the memory tier, what max_bytes limits
+        if self.max_bytes:
+            return self.bytes
+        with self.lock:
+            return sampled_bytes(self.entries, lambda receipt_id, held: deep_size(receipt_id) + deep_size(held[0])
+                                 + ENTRY_OVERHEAD)
+
+    def stats(self):
+        return {'evictions': dict(self.evictions), 'reads': dict(self.reads)}
+
+    def close(self):
+        if self.disk is not None:
+            with self.lock:
+                self.flush()
+            self.disk.close()
+
+    # the methods below are called holding the lock
+
+    def read_memory(self, receipt_id):
+        held = self.entries.get(receipt_id, None)
+        if held is not None:
+            if self.ttl_seconds and time.monotonic() - held[2] > self.ttl_seconds:
+                # expired, but not yet reached by eviction from the front
+                self.evict()
+            else:
+                if self.lru:
+                    self.entries.move_to_end(receipt_id)
+                self.reads['memory'] += 1
+                return held[0]
+        entry = self.spilled.pop(receipt_id, None)
+        if entry is not None:
+            # evicted but not yet written to disk
+            self.reads['disk'] += 1
+            self.write(receipt_id, entry)
+            self.evict()
+            return entry
+        return None
+
+    def promote(self, receipt_id, entry):
+        if receipt_id not in self.entries:
+            self.promoted.add(receipt_id)
+            self.write(receipt_id, entry)
+            self.evict()
+
+    def write(self, receipt_id, entry):
+        size = deep_size(receipt_id) + deep_size(entry) + ENTRY_OVERHEAD if self.max_bytes else 0
+        held = self.entries.pop(receipt_id, None)
+        if held is not None:
+            self.bytes -= held[1]
+        self.spilled.pop(receipt_id, None)
+        self.entries[receipt_id] = (entry, size, time.monotonic())
+        self.bytes += size
+
+    def evict(self):
+        entries = self.entries
+        dropped = {}
+        if self.ttl_seconds:
+            cutoff = time.monotonic() - self.ttl_seconds
+            while entries and next(iter(entries.values()))[2] <= cutoff:
+                self.evict_first('expired', dropped)
+        while entries and ((self.max_entries and len(entries) > self.max_entries)
+                           or (self.max_bytes and self.bytes > self.max_bytes)):
+            self.evict_first('capacity', dropped)
+        if len(self.spilled) >= SPILL_BATCH:
+            self.flush()
+        if dropped:
+            for callback in self.drop_callbacks:
+                callback(dropped)
+
+    def evict_first(self, reason, dropped):
+        receipt_id, (entry, size, _) = self.entries.popitem(last=False)
+        self.bytes -= size
+        self.evictions[reason] += 1
+        if self.disk is not None:
+            self.spilled[receipt_id] = entry
+        else:
+            dropped[receipt_id] = entry
+
+    def flush(self):
+        # stale copies of promoted entries are deleted before their newer copies are written
+        if self.promoted:
+            self.disk.delete_many(self.promoted)
+            self.promoted = set()
+        if self.spilled:
+            self.disk.put_many(self.spilled)
+            self.spilled = {}
@@ -0,0 +1,201 @@
+import threading
+from .base import ReceiptStore
+
+try:
+    from sortedcontainers import SortedList
+except ImportError:
+    SortedList = None
+
+
+def retailer_key(retailer):
+    # retailers are matched ignoring case and surrounding whitespace
+    return retailer.strip().casefold()
+
+
+class ReceiptIndex:
+    '''
+    Secondary indexes over receipt ids: every receipt sorted by purchase date, and per
+    retailer the same sorted by purchase date. Index items are (purchase_date, receipt_id,
+    retailer) tuples shared by both indexes, ties on the date are broken by id so every
+    item has a stable position and pages can resume after any item. Dates are yyyymmdd
+    integers. Retailer keys and dates are interned, each distinct one is held once.
+    '''
+
+    def __init__(self):
+        if SortedList is None:
+            raise ImportError('Receipt indexes require sortedcontainers, install it with: pip install sortedcontainers')
+        self.by_date = SortedList()
+        self.by_retailer = {}
+        self.items = {}
+        self.interned = {}
+
+    def add(self, receipt_id, retailer, purchase_date):
+        item = self.items.get(receipt_id, None)
+        key = retailer_key(retailer)
+        if item is not None:
+            if item[0] == purchase_date and item[2] == key:
+                return
+            self.remove(receipt_id)
+        key = self.interned.setdefault(key, key)
+        item = (self.interned.setdefault(purchase_date, purchase_date), receipt_id, key)
+        self.items[receipt_id] = item
+        self.by_date.add(item)
+        retailer_items = self.by_retailer.get(key, None)
+        if retailer_items is None:
+            retailer_items = self.by_retailer[key] = SortedList()
+        retailer_items.add(item)
+
+    def remove(self, receipt_id):
+        item = self.items.pop(receipt_id, None)
+        if item is None:
+            return
+        self.by_date.remove(item)
+        retailer_items = self.by_retailer[item[2]]
+        retailer_items.remove(item)
+        if not retailer_items:
+            del self.by_retailer[item[2]]
+
+    def range(self, retailer=None, start=None, end=None, after=None):
+        '''
+        Ids of the receipts from retailer (any without one) purchased from start through
+        end (either open without one), in (purchase date, id) order and resuming after the
+        (purchase_date, receipt_id) after. Each step is O(1), finding the first O(log n).
+        '''
+        items = self.by_date if retailer is None else self.by_retailer.get(retailer_key(retailer), None)
+        if items is None:
+            return iter(())
+        if after is not None:
+            # the smallest item with a greater id on the same date, ids never contain '\x00'
+            minimum = (after[0], after[1] + '\x00')
+            if start is not None and minimum < (start,):
+                minimum = (start,)
+        else:
+            minimum = None if start is None else (start,)
+        maximum = None if end is None else (end + 1,)
+        return (item[1] for item in items.irange(minimum, maximum, inclusive=(True, False)))
+
+    def __len__(self):
+        return len(self.items)
+
+
+class IndexedStore(ReceiptStore):
+    '''
+    Wraps store and keeps a ReceiptIndex of its entries up to date on every write. keys
+    maps an entry to its (retailer, purchase_date), or None for entries that aren't indexed.
+    The index is built from the entries already stored when wrapping, and is kept by this
+    process alone, writes by other processes to a shared store don't reach it. Entries the
+    wrapped store drops on its own are removed from the index as it drops them, see
+    ReceiptStore.on_drop. Entries another process deletes are removed when a query finds
+    them gone.
+    '''
+
+    supports_query = True
+
+    def __init__(self, store, keys):
+        self.store = store
+        self.keys = keys
+        self.index = ReceiptIndex()
+        self.lock = threading.Lock()
+        for receipt_id, entry in store.iterate():
+            self.add(receipt_id, entry)
+        store.on_drop(self.dropped)
+
+    def add(self, receipt_id, entry):
+        key = self.keys(entry)
+        if key is not None:
+            self.index.add(receipt_id, *key)
+
+    def dropped(self, entries):
+        # called by the wrapped store holding its lock
+        with self.lock:
+            for receipt_id in entries:
+                self.index.remove(receipt_id)
+
+    def get(self, receipt_id, default=None):
+        return self.store.get(receipt_id, default)
+
+    # entries are indexed before they're stored, so the store can't drop one before it's
+    # indexed and leave it in the index. Entries that failed to store are removed again
+
+    def put(self, receipt_id, entry):
+        with self.lock:
+            self.add(receipt_id, entry)
+        try:
+            self.store.put(receipt_id, entry)
+        except Exception:
+            with self.lock:
+                self.index.remove(receipt_id)
+            raise
+
+    def get_many(self, receipt_ids):
+        return self.store.get_many(receipt_ids)
+
+    def put_many(self, entries):
+        with self.lock:
+            for receipt_id, entry in entries.items():
+                self.add(receipt_id, entry)
+        try:
+            self.store.put_many(entries)
+        except Exception:
+            with self.lock:
+                for receipt_id in entries:
+                    self.index.remove(receipt_id)
+            raise
+
+    def replace_many(self, entries):
+        # only entries still indexed are reindexed, the store skips those it no longer holds
+        self.store.replace_many(entries)
+        with self.lock:
+            for receipt_id, entry in entries.items():
+                if receipt_id in self.index.items:
+                    self.add(receipt_id, entry)
+
+    def delete_many(self, receipt_ids):
+        receipt_ids = list(receipt_ids)
+        self.store.delete_many(receipt_ids)
+        with self.lock:
+            for receipt_id in receipt_ids:
+                self.index.remove(receipt_id)
+
+    def query(self, retailer=None, start=None, end=None, after=None, limit=100):
+        '''
+        Up to limit (receipt_id, entry) pairs matching, see ReceiptIndex.range, and the
+        (purchase_date, receipt_id) to pass as after for the next page, None on the last.
+        O(log n + limit), with one get_many for the page.
+        '''
+        with self.lock:
+            page = []
+            for receipt_id in self.index.range(retailer, start, end, after):
+                page.append(receipt_id)
+                if len(page) == limit:
+                    break
+            cursor = None
+            if len(page) == limit:
+                item = self.index.items[page[-1]]
+                cursor = (item[0], item[1])
+
+        found = self.store.get_many(page)
+        if len(found) < len(page):
+            with self.lock:
+                for receipt_id in page:
+                    if receipt_id not in found:
+                        self.index.remove(receipt_id)
+        return [(receipt_id, found[receipt_id]) for receipt_id in page if receipt_id in found], cursor
+
+    def iterate(self, chunk_size=1000):
+        return self.store.iterate(chunk_size)
+
+    def on_drop(self, callback):
+        self.store.on_drop(callback)
+
+    def __len__(self):
+        return len(self.store)
+
+    def approximate_bytes(self):
+        return self.store.approximate_bytes()
+
+    def stats(self):
+        return self.store.stats()
+
+    def close(self):
+        self.store.close()
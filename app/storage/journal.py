@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import zlib
+import queue
+import struct
+import logging
+import threading
+from .base import ReceiptStore
+from .memory import MemoryStore
+
+logger = logging.getLogger(__name__)
+
+# every record is its payload length and crc32, then the payload: the operation, the id
+# length, the id and for puts the encoded entry
+RECORD_HEADER = struct.Struct('<II')
+ID_LENGTH = struct.Struct('<H')
+PUT = b'p'
+DELETE = b'd'
+
+# snapshot.<n> holds every entry of log segments log.<n> and before
+SNAPSHOT_PREFIX = 'snapshot.'
+SEGMENT_PREFIX = 'log.'
+
+# entries per put_many while replaying
+REPLAY_BATCH = 10000
+
+
+def _encode(entry):
+    return json.dumps(entry, separators=(',', ':'))
+
+
+def pack_record(operation, receipt_id, encoded=b''):
+    key = receipt_id.encode()
+    payload = b''.join([operation, ID_LENGTH.pack(len(key)), key, encoded])
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path):
+    '''
+    (operation, receipt_id, encoded) of every record in the file at path, stopping at
+    the first torn or corrupt one, the tail of a write a crash interrupted. The generator
+    returns the offset where the valid records end.
+    '''
+    offset = 0
+    with open(path, 'rb') as records:
+        while True:
+            header = records.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return offset
+            length, checksum = RECORD_HEADER.unpack(header)
+            payload = records.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                return offset
+            key_length, = ID_LENGTH.unpack_from(payload, 1)
+            key_end = 1 + ID_LENGTH.size + key_length
+            yield payload[:1], payload[1 + ID_LENGTH.size:key_end].decode(), payload[key_end:]
+            offset += RECORD_HEADER.size + length
+
+
+def numbered(directory, prefix):
+    # n -> file name of the files named prefix<n> in directory, in order
+    names = {}
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name[len(prefix):].isdecimal():
+            names[int(name[len(prefix):])] = name
+    return dict(sorted(names.items()))
+
+
+def sync_directory(directory):
+    # makes renames and new files in directory durable
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class JournalError(Exception):
+    pass
+
+
+class JournaledStore(ReceiptStore):
+    '''
+    In memory store made durable by write behind. Writes update memory and are queued for
+    a writer thread, which encodes them and appends them to the current log segment with
+    one fsync per group. A group is up to batch_size records of the writes queued while
+    the previous group synced, waiting up to flush_seconds for more. With wait a write
+    returns once its group is synced, else as soon as it's queued. At most queue_size
+    writes wait for the writer, later ones block.
+
+    Every snapshot_records logged records the writer starts a new segment and a snapshot
+    of memory is written in the background, then the segments it covers are deleted, so
+    startup replays one snapshot and at most about snapshot_records records. Records are
+    checksummed, replay stops at a torn tail.
+    '''
+
+    def __init__(self, path, encode=None, decode=None, batch_size=256, flush_seconds=0.0, queue_size=10000,
+                 snapshot_records=1000000, wait=False):
+        self.path = path
+        self.encode = encode or _encode
+        self.decode = decode or json.loads
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.snapshot_records = snapshot_records
+        self.wait = wait
+        self.memory = MemoryStore()
+        os.makedirs(path, exist_ok=True)
+        segment = self.replay()
+
+        # the lock keeps memory and the log in the same order, the condition signals synced groups
+        self.lock = threading.Lock()
+        self.synced = threading.Condition()
+        self.queue = queue.Queue(queue_size)
+        self.sequence = 0
+        self.committed = 0
+        self.failure = None
+        self.counters = {'commits': 0, 'records': 0, 'snapshots': 0, 'sync_seconds': 0.0}
+        self.snapshotting = None
+        self.segment = segment
+        self.log = open(os.path.join(path, f'{SEGMENT_PREFIX}{segment}'), 'ab')
+        sync_directory(path)
+        self.writer = threading.Thread(target=self.write_behind, daemon=True, name='journal-writer')
+        self.writer.start()
+
+    def replay(self):
+        # loads the latest snapshot and the segments after it, returns the number of the segment to append to
+        started = time.perf_counter()
+        for name in os.listdir(self.path):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(self.path, name))
+        snapshots = numbered(self.path, SNAPSHOT_PREFIX)
+        covered = max(snapshots, default=0)
+        if snapshots:
+            self.apply(os.path.join(self.path, snapshots[covered]))
+        replayed = 0
+        segments = numbered(self.path, SEGMENT_PREFIX)
+        for number, name in segments.items():
+            if number > covered:
+                segment_path = os.path.join(self.path, name)
+                valid, records = self.apply(segment_path)
+                replayed += records
+                if valid < os.path.getsize(segment_path):
+                    logger.warning('Dropping the torn tail of %s after %s bytes', segment_path, valid)
+                    os.truncate(segment_path, valid)
+        self.replayed = replayed
+        self.remove_covered(covered)
+        logger.info('Replayed %s receipts from %s in %.3fs', len(self.memory), self.path, time.perf_counter() - started)
+        return max(max(segments, default=0), covered) + 1
+
+    def apply(self, path):
+        # replays one file into memory, returns (valid bytes, records)
+        records = read_records(path)
+        batch = {}
+        count = 0
+        try:
+            while True:
+                operation, receipt_id, encoded = next(records)
+                count += 1
+                if operation == PUT:
+                    batch[receipt_id] = self.decode(encoded)
+                    if len(batch) >= REPLAY_BATCH:
+                        self.memory.put_many(batch)
+                        batch = {}
+                else:
+                    self.memory.put_many(batch)
+                    batch = {}
+                    self.memory.delete_many([receipt_id])
+        except StopIteration as end:
+            self.memory.put_many(batch)
+            return end.value, count
+
+    def remove_covered(self, covered):
+        # segments and snapshots a newer snapshot replaced
+        for number, name in numbered(self.path, SEGMENT_PREFIX).items():
+            if number <= covered:
+                os.remove(os.path.join(self.path, name))
+        for number, name in numbered(self.path, SNAPSHOT_PREFIX).items():
+            if number < covered:
+                os.remove(os.path.join(self.path, name))
+
+    def get(self, receipt_id, default=None):
+        return self.memory.get(receipt_id, default)
+
+    def put(self, receipt_id, entry):
+        with self.lock:
+            self.memory.put(receipt_id, entry)
+            sequence = self.enqueue(PUT, [(receipt_id, entry)])
+        self.wait_for(sequence)
+
+    def get_many(self, receipt_ids):
+        return self.memory.get_many(receipt_ids)
+
+    def put_many(self, entries):
+        if not entries:
+            return
+        with self.lock:
+            self.memory.put_many(entries)
+            sequence = self.enqueue(PUT, list(entries.items()))
+        self.wait_for(sequence)
+
+    def delete_many(self, receipt_ids):
+        receipt_ids = list(receipt_ids)
+        if not receipt_ids:
+            return
+        with self.lock:
+            self.memory.delete_many(receipt_ids)
+            sequence = self.enqueue(DELETE, receipt_ids)
+        self.wait_for(sequence)
+
+    def iterate(self, chunk_size=1000):
+        return self.memory.iterate(chunk_size)
+
+    def __len__(self):
+        return len(self.memory)
+
+    def approximate_bytes(self):
+        return self.memory.approximate_bytes()
+
+    def stats(self):
+        return {'journal': dict(self.counters, queued=self.queue.qsize())}
+
+    def close(self):
+        # every queued write is synced before the writer stops
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        if self.snapshotting is not None:
+            self.snapshotting.join()
+        self.log.close()
+
+    def encoded(self, entry):
+        encoded = self.encode(entry)
+        return encoded.encode() if isinstance(encoded, str) else encoded
+
+    def enqueue(self, operation, writes):
+        # called holding the lock, blocks while the queue is full. The writer encodes the
+        # entries, stores don't mutate entries and neither do their callers once stored
+        if self.failure is not None:
+            raise JournalError(f'The journal stopped writing: {self.failure}')
+        self.sequence += 1
+        self.queue.put((self.sequence, operation, writes))
+        return self.sequence
+
+    def wait_for(self, sequence):
+        if not self.wait:
+            return
+        with self.synced:
+            while self.committed < sequence and self.failure is None:
+                self.synced.wait()
+        if self.committed < sequence:
+            raise JournalError(f'The journal stopped writing: {self.failure}')
+
+    # the methods below run on the writer thread
+
+    def write_behind(self):
+        since_snapshot = self.replayed
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is None:
+                break
+            # the group is whatever was queued while the last one synced, or arrives within flush_seconds
+            group = [item]
+            count = len(item[2])
+            deadline = time.monotonic() + self.flush_seconds
+            while count < self.batch_size:
+                try:
+                    timeout = deadline - time.monotonic()
+                    item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+                count += len(item[2])
+
+            try:
+                started = time.perf_counter()
+                self.log.write(b''.join([self.pack(operation, writes) for _, operation, writes in group]))
+                self.log.flush()
+                os.fsync(self.log.fileno())
+                self.counters['sync_seconds'] += time.perf_counter() - started
+            except OSError as error:
+                logger.error('Journal write to %s failed, no further writes are accepted: %s', self.path, error)
+                with self.synced:
+                    self.failure = error
+                    self.synced.notify_all()
+                return
+            self.counters['commits'] += 1
+            self.counters['records'] += count
+            with self.synced:
+                self.committed = group[-1][0]
+                self.synced.notify_all()
+
+            since_snapshot += count
+            if since_snapshot >= self.snapshot_records and (self.snapshotting is None or
+                                                            not self.snapshotting.is_alive()):
+                since_snapshot = 0
+                self.start_snapshot()
+
+    def pack(self, operation, writes):
+        if operation == DELETE:
+            return b''.join([pack_record(DELETE, receipt_id) for receipt_id in writes])
+        return b''.join([pack_record(PUT, receipt_id, self.encoded(entry)) for receipt_id, entry in writes])
+
+    def start_snapshot(self):
+        # later records go to a new segment, the snapshot covers the ones before it
+        covered = self.segment
+        self.log.close()
+        self.segment += 1
+        self.log = open(os.path.join(self.path, f'{SEGMENT_PREFIX}{self.segment}'), 'ab')
+        self.snapshotting = threading.Thread(target=self.snapshot, args=(covered,), daemon=True,
+                                             name='journal-snapshot')
+        self.snapshotting.start()
+
+    def snapshot(self, covered):
+        '''
+        Writes every entry in memory as snapshot.<covered>. Memory already holds every
+        write logged in segments up to covered. Writes made meanwhile may or may not be in
+        the snapshot, they are in later segments and replaying them again is harmless.
+        '''
+        started = time.perf_counter()
+        snapshot_path = os.path.join(self.path, f'{SNAPSHOT_PREFIX}{covered}')
+        try:
+            with open(snapshot_path + '.tmp', 'wb') as snapshot:
+                chunk = []
+                for receipt_id, entry in self.memory.iterate():
+                    chunk.append(pack_record(PUT, receipt_id, self.encoded(entry)))
+                    if len(chunk) >= REPLAY_BATCH:
+                        snapshot.write(b''.join(chunk))
+                        chunk = []
+                snapshot.write(b''.join(chunk))
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            os.replace(snapshot_path + '.tmp', snapshot_path)
+            sync_directory(self.path)
+            self.remove_covered(covered)
+        except OSError as error:
+            logger.error('Journal snapshot %s failed, the log segments are kept: %s', snapshot_path, error)
+            return
+        self.counters['snapshots'] += 1
+        logger.info('Wrote journal snapshot %s in %.3fs', snapshot_path, time.perf_counter() - started)
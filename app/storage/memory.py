@@ -0,0 +1,64 @@
+import sys
+from itertools import islice
+from .base import ReceiptStore
+
+# entries measured to estimate the size of the whole store
+SIZE_SAMPLE = 100
+
+
+def deep_size(value):
+    # bytes held by value and the objects it references, for the types entries are built from
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(key) + deep_size(item) for key, item in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(deep_size(item) for item in value)
+    elif hasattr(value, '__slots__'):
+        size += sum(deep_size(getattr(value, name, None)) for name in value.__slots__)
+    return size
+
+
+def sampled_bytes(mapping, size_of):
+    # the mapping itself plus the mean size_of(key, value) of a sample of its items
+    sample = list(islice(mapping.items(), SIZE_SAMPLE))
+    if not sample:
+        return sys.getsizeof(mapping)
+    sampled = sum(size_of(key, value) for key, value in sample)
+    return sys.getsizeof(mapping) + sampled * len(mapping) // len(sample)
+
+
+class MemoryStore(ReceiptStore):
+    # process local dict, the original storage of the service
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, receipt_id, default=None):
+        return self.entries.get(receipt_id, default)
+
+    def put(self, receipt_id, entry):
+        self.entries[receipt_id] = entry
+
+    def get_many(self, receipt_ids):
+        entries = self.entries
+        return {receipt_id: entries[receipt_id] for receipt_id in receipt_ids if receipt_id in entries}
+
+    def put_many(self, entries):
+        self.entries.update(entries)
+
+    def delete_many(self, receipt_ids):
+        for receipt_id in receipt_ids:
+            self.entries.pop(receipt_id, None)
+
+    def iterate(self, chunk_size=1000):
+        # snapshot the keys so puts during iteration don't break it
+        for receipt_id in list(self.entries):
+            entry = self.entries.get(receipt_id, None)
+            if entry is not None:
+                yield receipt_id, entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def approximate_bytes(self):
+        return sampled_bytes(self.entries, lambda receipt_id, entry: deep_size(receipt_id) + deep_size(entry))
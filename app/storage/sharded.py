@@ -0,0 +1,95 @@
+import threading
+from .base import ReceiptStore
+from .memory import deep_size, sampled_bytes
+
+
+class Shard:
+    __slots__ = ('entries', 'lock')
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+
+class ShardedStore(ReceiptStore):
+    '''
+    In memory store split into shards dicts, each behind its own lock, an id's shard is
+    picked by its hash. Threads writing different ids rarely wait for each other, which
+    lets handlers run on a thread pool without one lock serializing every store call.
+    The batch methods group ids by shard and take each shard's lock once.
+
+    A single dict operation is already atomic under the GIL, so the locks matter on
+    free threaded builds and for the batch methods, which are atomic per shard.
+    '''
+
+    def __init__(self, shards=16):
+        if shards < 1:
+            raise ValueError(f'A sharded store needs at least one shard, got {shards}')
+        self.shards = [Shard() for _ in range(shards)]
+        self.count = shards
+
+    def partition(self, receipt_ids):
+        # shard -> the ids it holds, for ids in any iterable
+        groups = {}
+        shards = self.shards
+        count = self.count
+        for receipt_id in receipt_ids:
+            shard = shards[hash(receipt_id) % count]
+            group = groups.get(shard, None)
+            if group is None:
+                group = groups[shard] = []
+            group.append(receipt_id)
+        return groups
+
+    def get(self, receipt_id, default=None):
+        shard = self.shards[hash(receipt_id) % self.count]
+        with shard.lock:
+            return shard.entries.get(receipt_id, default)
+
+    def put(self, receipt_id, entry):
+        shard = self.shards[hash(receipt_id) % self.count]
+        with shard.lock:
+            shard.entries[receipt_id] = entry
+
+    def get_many(self, receipt_ids):
+        found = {}
+        for shard, ids in self.partition(receipt_ids).items():
+            entries = shard.entries
+            with shard.lock:
+                found.update((receipt_id, entries[receipt_id]) for receipt_id in ids if receipt_id in entries)
+        return found
+
+    def put_many(self, entries):
+        for shard, ids in self.partition(entries).items():
+            with shard.lock:
+                shard.entries.update((receipt_id, entries[receipt_id]) for receipt_id in ids)
+
+    def delete_many(self, receipt_ids):
+        for shard, ids in self.partition(receipt_ids).items():
+            with shard.lock:
+                for receipt_id in ids:
+                    shard.entries.pop(receipt_id, None)
+
+    def iterate(self, chunk_size=1000):
+        # snapshot each shard's keys so puts during iteration don't break it
+        for shard in self.shards:
+            with shard.lock:
+                receipt_ids = list(shard.entries)
+            for start in range(0, len(receipt_ids), chunk_size):
+                with shard.lock:
+                    chunk = [(receipt_id, shard.entries.get(receipt_id, None))
+                             for receipt_id in receipt_ids[start:start + chunk_size]]
+                for receipt_id, entry in chunk:
+                    if entry is not None:
+                        yield receipt_id, entry
+
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self.shards)
+
+    def approximate_bytes(self):
+        # every shard is sampled, holding its lock so writes can't resize it mid sample
+        total = 0
+        for shard in self.shards:
+            with shard.lock:
+                total += sampled_bytes(shard.entries, lambda receipt_id, entry: deep_size(receipt_id) + deep_size(entry))
+        return total
@@ -0,0 +1,171 @@
+import os
+import time
+import pickle
+import logging
+import threading
+from itertools import islice
+from multiprocessing.connection import Listener, Client
+from .base import ReceiptStore
+
+logger = logging.getLogger(__name__)
+
+
+class StoreServer:
+    '''
+    Single owner of the receipts, served to every worker process over a unix socket.
+    All reads and writes go through this process so a receipt written by one worker is
+    immediately visible to every other worker. Entries arrive already pickled by the
+    client and are stored as opaque bytes.
+    '''
+
+    def __init__(self, store, address, authkey):
+        self.store = store
+        self.address = address
+        self.authkey = authkey
+        self.listener = None
+        self.closed = False
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            # left behind by a previous server that didn't shut down cleanly
+            os.unlink(self.address)
+
+        self.listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        logger.info('Store server listening on %s', self.address)
+        while not self.closed:
+            try:
+                connection = self.listener.accept()
+            except Exception as error:
+                if self.closed:
+                    return
+                logger.error('Rejected store client connection: %s', error)
+                continue
+            threading.Thread(target=self.serve_connection, args=(connection,), daemon=True).start()
+
+    def close(self):
+        self.closed = True
+        if self.listener is not None:
+            self.listener.close()
+
+    def serve_connection(self, connection):
+        iterators = {}
+        with connection:
+            while True:
+                try:
+                    operation, arguments = connection.recv()
+                except (EOFError, OSError):
+                    return
+
+                try:
+                    connection.send((True, self.dispatch(operation, arguments, iterators)))
+                except Exception as error:
+                    connection.send((False, f'{type(error).__name__}: {error}'))
+
+    def dispatch(self, operation, arguments, iterators):
+        store = self.store
+        if operation == 'get':
+            return store.get(*arguments)
+        if operation == 'put':
+            return store.put(*arguments)
+        if operation == 'get_many':
+            return store.get_many(*arguments)
+        if operation == 'put_many':
+            return store.put_many(*arguments)
+        if operation == 'delete_many':
+            return store.delete_many(*arguments)
+        if operation == 'len':
+            return len(store)
+        if operation == 'approximate_bytes':
+            return store.approximate_bytes()
+        if operation == 'stats':
+            return store.stats()
+        if operation == 'iterate':
+            # iteration state lives on the server, clients pull one chunk per call
+            token, chunk_size = arguments
+            if token not in iterators:
+                iterators[token] = store.iterate(chunk_size)
+            chunk = list(islice(iterators[token], chunk_size))
+            if len(chunk) < chunk_size:
+                del iterators[token]
+            return chunk
+        if operation == 'iterate_close':
+            iterators.pop(arguments[0], None)
+            return None
+        raise ValueError(f'Unknown store operation: {operation}')
+
+
+class SharedStore(ReceiptStore):
+    # client side of StoreServer, one connection per process
+
+    def __init__(self, address, authkey, connect_timeout=10.0):
+        self.lock = threading.Lock()
+        self.connection = self.connect(address, authkey, connect_timeout)
+        self.iterations = 0
+
+    @staticmethod
+    def connect(address, authkey, connect_timeout):
+        # workers may start before the store server is listening
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                return Client(address, family='AF_UNIX', authkey=authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def call(self, operation, *arguments):
+        with self.lock:
+            self.connection.send((operation, arguments))
+            ok, result = self.connection.recv()
+        if not ok:
+            raise RuntimeError(f'Store server error: {result}')
+        return result
+
+    def get(self, receipt_id, default=None):
+        encoded = self.call('get', receipt_id)
+        return default if encoded is None else pickle.loads(encoded)
+
+    def put(self, receipt_id, entry):
+        self.call('put', receipt_id, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+
+    def get_many(self, receipt_ids):
+        found = self.call('get_many', list(receipt_ids))
+        return {receipt_id: pickle.loads(encoded) for receipt_id, encoded in found.items()}
+
+    def put_many(self, entries):
+        if entries:
+            self.call('put_many', {receipt_id: pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+                                   for receipt_id, entry in entries.items()})
+
+    def delete_many(self, receipt_ids):
+        self.call('delete_many', list(receipt_ids))
+
+    def iterate(self, chunk_size=1000):
+        self.iterations += 1
+        token = self.iterations
+        exhausted = False
+        try:
+            while not exhausted:
+                chunk = self.call('iterate', token, chunk_size)
+                exhausted = len(chunk) < chunk_size
+                for receipt_id, encoded in chunk:
+                    yield receipt_id, pickle.loads(encoded)
+        finally:
+            if not exhausted:
+                # abandoned part way through, release the server side iterator
+                self.call('iterate_close', token)
+
+    def __len__(self):
+        return self.call('len')
+
+    def approximate_bytes(self):
+        return self.call('approximate_bytes')
+
+    def stats(self):
+        return self.call('stats')
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
@@ -0,0 +1,105 @@
+import json
+import sqlite3
+import threading
+from .base import ReceiptStore
+
+# ids per statement for multi gets and deletes, kept well under SQLITE_MAX_VARIABLE_NUMBER
+GET_MANY_CHUNK_SIZE = 500
+
+_CREATE = 'CREATE TABLE IF NOT EXISTS receipts (id TEXT PRIMARY KEY, entry BLOB NOT NULL) WITHOUT ROWID'
+_SELECT = 'SELECT entry FROM receipts WHERE id = ?'
+_UPSERT = 'INSERT OR REPLACE INTO receipts (id, entry) VALUES (?, ?)'
+_COUNT = 'SELECT COUNT(*) FROM receipts'
+_PAGE = 'SELECT id, entry FROM receipts WHERE id > ? ORDER BY id LIMIT ?'
+_SIZE = 'SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()'
+
+
+def _encode(entry):
+    return json.dumps(entry, separators=(',', ':'))
+
+
+class SqliteStore(ReceiptStore):
+    '''
+    On disk store backed by the standard library sqlite3 module in WAL mode, so readers
+    never block the writer and several processes can share one database file.
+    '''
+
+    def __init__(self, path, encode=None, decode=None):
+        # entries are stored as json unless the caller provides its own codec
+        self.encode = encode or _encode
+        self.decode = decode or json.loads
+        self.lock = threading.Lock()
+        # statements are constant strings so sqlite3's statement cache keeps them prepared
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                          cached_statements=256)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(_CREATE)
+
+    def get(self, receipt_id, default=None):
+        with self.lock:
+            row = self.connection.execute(_SELECT, (receipt_id,)).fetchone()
+        return default if row is None else self.decode(row[0])
+
+    def put(self, receipt_id, entry):
+        encoded = self.encode(entry)
+        with self.lock:
+            self.connection.execute(_UPSERT, (receipt_id, encoded))
+
+    def get_many(self, receipt_ids):
+        receipt_ids = list(receipt_ids)
+        found = {}
+        for start in range(0, len(receipt_ids), GET_MANY_CHUNK_SIZE):
+            chunk = receipt_ids[start:start + GET_MANY_CHUNK_SIZE]
+            statement = f'SELECT id, entry FROM receipts WHERE id IN ({",".join("?" * len(chunk))})'
+            with self.lock:
+                rows = self.connection.execute(statement, chunk).fetchall()
+            for receipt_id, entry in rows:
+                found[receipt_id] = self.decode(entry)
+        return found
+
+    def put_many(self, entries):
+        # one transaction and one executemany per batch
+        rows = [(receipt_id, self.encode(entry)) for receipt_id, entry in entries.items()]
+        if not rows:
+            return
+        with self.lock:
+            self.connection.execute('BEGIN')
+            try:
+                self.connection.executemany(_UPSERT, rows)
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def delete_many(self, receipt_ids):
+        receipt_ids = list(receipt_ids)
+        with self.lock:
+            for start in range(0, len(receipt_ids), GET_MANY_CHUNK_SIZE):
+                chunk = receipt_ids[start:start + GET_MANY_CHUNK_SIZE]
+                self.connection.execute(f'DELETE FROM receipts WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+
+    def iterate(self, chunk_size=1000):
+        # keyset pagination, no read transaction is held open between chunks
+        last_id = ''
+        while True:
+            with self.lock:
+                rows = self.connection.execute(_PAGE, (last_id, chunk_size)).fetchall()
+            for receipt_id, entry in rows:
+                yield receipt_id, self.decode(entry)
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][0]
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute(_COUNT).fetchone()[0]
+
+    def approximate_bytes(self):
+        # size of the database file, not counting the write ahead log
+        with self.lock:
+            return self.connection.execute(_SIZE).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
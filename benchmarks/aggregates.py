@@ -0,0 +1,79 @@
+"""Cost of keeping the points aggregates behind GET /receipts/aggregates.
+
+Receipts from 1,000 retailers over a year of purchase dates. Measures the ingest cost
+per receipt, answering each grouping from the aggregates, and rebuilding them from the
+store after a rules change, against scoring every stored receipt per dashboard request.
+
+From root of project: python -m benchmarks.aggregates [receipt count]
+"""
+import sys
+import time
+import random
+from datetime import date
+from benchmarks.common import make_receipt, per_second, print_table, quiet_logging
+from storage import MemoryStore
+from handlers import aggregates
+from handlers.aggregates import PointsAggregates, configure_aggregates, summarize
+from handlers.rules import DEFAULT_RULES, reload_rules, current_rules
+from handlers.utils import build_receipt_record
+
+
+def make_records(count, generator):
+    # a few distinct bodies per retailer, recombined with every purchase date
+    records = []
+    first_day = date(2022, 1, 1).toordinal()
+    for index in range(count):
+        receipt = make_receipt(generator.randrange(1, 10))
+        receipt['retailer'] = f'Retailer {generator.randrange(1000)}'
+        receipt['purchaseDate'] = date.fromordinal(first_day + generator.randrange(365)).isoformat()
+        records.append(build_receipt_record(receipt))
+    return records
+
+
+def seconds(function):
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    generator = random.Random(0)
+    records = make_records(count, generator)
+    store = MemoryStore()
+    store.put_many({str(index): record for index, record in enumerate(records)})
+
+    target = PointsAggregates(current_rules().version)
+    records_iterator = iter(records * 2)
+    add_rate = per_second(lambda _: target.add(next(records_iterator)), None)
+    score = current_rules().score
+    score_rate = per_second(lambda _: score(records[0]), None)
+    print(f'aggregating a receipt: {1e6 / add_rate:.2f} us, scoring it: {1e6 / score_rate:.2f} us\n')
+
+    configure_aggregates(store)
+    while aggregates.rebuild is not None:
+        aggregates.rebuild.thread.join()
+    rows = []
+    for group, query in [('retailer', {}), ('retailer', {'start': 20220301, 'end': 20220331}),
+                         ('date', {}), ('date', {'retailer': 'Retailer 7'}), ('retailer_date', {'retailer': 'Retailer 7'}),
+                         ('retailer_date', {'start': 20220301, 'end': 20220307})]:
+        elapsed = min(seconds(lambda: summarize(group, **query)) for _ in range(5))
+        rows.append([group, ', '.join(f'{name}={value}' for name, value in query.items()) or '-',
+                     len(summarize(group, **query)['groups']), f'{elapsed * 1000:,.2f}'])
+    print_table(['group', 'filter', 'groups', 'ms'], rows)
+
+    scan = seconds(lambda: [score(record) for _, record in store.iterate()])
+    print(f'\nscoring every stored receipt, what a dashboard request cost without aggregates: {scan:.2f} s')
+
+    reload_rules({'name': 'promotion', 'version': 2, 'rules': DEFAULT_RULES['rules'] + [
+        {'name': 'promotion', 'kind': 'total_at_least', 'cents': 0, 'points': 10}]})
+    started = time.perf_counter()
+    summarize('retailer')
+    while aggregates.rebuild is not None:
+        aggregates.rebuild.thread.join()
+    print(f'rebuild of {count:,} receipts after a rules change: {time.perf_counter() - started:.2f} s')
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
@@ -0,0 +1,42 @@
+"""Receipts scored per second, scalar determine_points vs the numpy batch scorer.
+
+From root of project: python -m benchmarks.batch_scoring [receipt count]
+"""
+import sys
+import time
+from benchmarks.common import make_receipt, print_table, quiet_logging
+from handlers.utils import determine_points, determine_record_points
+from handlers.records import ReceiptRecord
+from handlers.batch_scoring import ReceiptColumns, score_columns
+
+
+def rate(count, function):
+    start = time.perf_counter()
+    function()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    receipts = [make_receipt(1 + index % 10) for index in range(count)]
+    records = [ReceiptRecord.from_receipt(receipt) for receipt in receipts]
+
+    columns = None
+
+    def build():
+        nonlocal columns
+        columns = ReceiptColumns.from_records(records)
+
+    rows = [
+        ['determine_points', f'{rate(count, lambda: [determine_points(receipt) for receipt in receipts]):,.0f}'],
+        ['determine_record_points', f'{rate(count, lambda: [determine_record_points(record) for record in records]):,.0f}'],
+        ['ReceiptColumns.from_records', f'{rate(count, build):,.0f}'],
+        ['score_columns', f'{rate(count, lambda: score_columns(columns)):,.0f}'],
+    ]
+    print(f'{count:,} receipts, 1-10 items each')
+    print_table(['path', 'receipts/s'], rows)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
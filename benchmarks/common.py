@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+import logging
+
+# benchmarks import the app modules the same way the app does (from inside app/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+
+def make_receipt(item_count):
+    return {
+        'retailer': 'M&M Corner Market',
+        'purchaseDate': '2022-03-21',
+        'purchaseTime': '14:33',
+        'items': [
+            {'shortDescription': f'Gatorade {index}', 'price': f'{index % 20}.25'}
+            for index in range(item_count)
+        ],
+        'total': f'{item_count * 2}.25'
+    }
+
+
+def per_second(function, argument, min_seconds=1.0):
+    # runs function(argument) in growing batches until min_seconds have elapsed
+    calls = 0
+    batch = 1
+    start = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            function(argument)
+        calls += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return calls / elapsed
+        batch *= 2
+
+
+def quiet_logging():
+    # INFO and below are dropped, request and handler log lines would be timed along with the
+    # code under test. Benchmarks call it when run as scripts, importing one leaves logging
+    # alone. benchmarks.request_logging measures logging itself and doesn't call it
+    logging.disable(logging.INFO)
+
+
+def print_table(header, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(cell).rjust(width) for cell, width in zip(row, widths)))
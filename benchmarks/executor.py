@@ -0,0 +1,103 @@
+"""Request latency under a mix of small and large receipts, per handler executor mode.
+
+Receipts are posted at a steady rate, most with 5 items and some with 2000. With inline
+execution every request waits behind any large receipt being scored on the event loop.
+
+From root of project: python -m benchmarks.executor [requests] [requests per second]
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import tempfile
+from benchmarks.common import make_receipt, print_table, quiet_logging
+
+SMALL_ITEMS = 5
+LARGE_ITEMS = 2000
+LARGE_SHARE = 0.05
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+async def run_load(app, bodies, rate):
+    # open loop: requests are sent on a fixed schedule whether or not earlier ones have
+    # finished, latency is measured from the scheduled send time so time spent waiting
+    # on a blocked event loop is counted
+    import httpx
+
+    latencies = {'small': [], 'large': []}
+    rejected = 0
+
+    async def send(http, size, body, at):
+        nonlocal rejected
+        await asyncio.sleep(max(at - time.perf_counter(), 0))
+        response = await http.post('/receipts/process', content=body)
+        if response.status_code == 503:
+            rejected += 1
+            return
+        assert response.status_code == 200, response.text
+        latencies[size].append((time.perf_counter() - at) * 1000)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://benchmark') as http:
+        started = time.perf_counter()
+        await asyncio.gather(*[send(http, size, body, started + index / rate)
+                               for index, (size, body) in enumerate(bodies)])
+    return latencies, rejected
+
+
+def main():
+    import main as service
+    from storage import create_store
+    from handlers.records import ReceiptRecord
+    from executor import BoundedExecutor
+    from factory import initialize_worker
+    from handlers.dedup import configure_dedup
+
+    request_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    random.seed(11)
+    small = json.dumps(make_receipt(SMALL_ITEMS)).encode()
+    large = json.dumps(make_receipt(LARGE_ITEMS)).encode()
+    bodies = [('large', large) if random.random() < LARGE_SHARE else ('small', small)
+              for _ in range(request_count)]
+
+    # the same two bodies are posted over and over, every one of them is scored and stored
+    configure_dedup('off')
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        # process pool workers can't see the server's memory store, that mode runs on sqlite
+        path = f'{directory}/receipts.db'
+        for mode, backend in [('inline', 'memory'), ('thread', 'memory'), ('process', 'sqlite')]:
+            service.store = create_store(backend, path, encode=ReceiptRecord.to_json, decode=ReceiptRecord.from_json)
+            service.executor = BoundedExecutor(mode, 4, 64, initializer=initialize_worker if mode == 'process' else None,
+                                               initargs=(backend, path, None, None, 'WARNING', None, 5.0, 100,
+                                                         'off', 0.0, 0))
+            if mode == 'process':
+                # warm the pool so worker start up isn't counted
+                asyncio.run(run_load(service.app, bodies[:8], rate))
+
+            started = time.perf_counter()
+            latencies, rejected = asyncio.run(run_load(service.app, bodies, rate))
+            elapsed = time.perf_counter() - started
+            service.executor.shutdown()
+            service.store.close()
+
+            rows.append([f'{mode} ({backend})',
+                         f'{percentile(latencies["small"], 0.5):.2f}', f'{percentile(latencies["small"], 0.99):.2f}',
+                         f'{percentile(latencies["large"], 0.5):.2f}', f'{percentile(latencies["large"], 0.99):.2f}',
+                         f'{request_count / elapsed:,.0f}', rejected])
+
+    print(f'{request_count} requests at {rate:,.0f}/s, '
+          f'{LARGE_SHARE:.0%} with {LARGE_ITEMS} items, the rest with {SMALL_ITEMS}')
+    print_table(['executor', 'small p50 ms', 'small p99 ms', 'large p50 ms', 'large p99 ms', 'requests/s', '503s'],
+                rows)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
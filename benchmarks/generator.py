@@ -0,0 +1,62 @@
+"""Seeded synthetic receipts for benchmarks.
+
+The same seed and parameters always produce the same receipts, so runs on different
+commits or machines score the same data.
+"""
+import random
+
+RETAILERS = ['Target', 'M&M Corner Market', 'Walgreens', 'Costco Wholesale', 'Trader Joes', 'H-E-B']
+WORD_CHARACTERS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+# one way of breaking each rule validation enforces
+CORRUPTIONS = [
+    lambda receipt, rng: receipt.pop(rng.choice(['retailer', 'purchaseDate', 'purchaseTime', 'items', 'total'])),
+    lambda receipt, rng: receipt.update(retailer=receipt['retailer'] + ';'),
+    lambda receipt, rng: receipt.update(total=receipt['total'][:-1]),
+    lambda receipt, rng: receipt.update(purchaseDate=receipt['purchaseDate'][:5] + '13' + receipt['purchaseDate'][7:]),
+    lambda receipt, rng: receipt.update(purchaseTime='25' + receipt['purchaseTime'][2:]),
+    lambda receipt, rng: receipt.update(items=[]),
+    lambda receipt, rng: rng.choice(receipt['items']).update(price='1.5'),
+    lambda receipt, rng: rng.choice(receipt['items']).update(shortDescription='Pepsi!'),
+]
+
+
+def description(rng, length):
+    # words of letters and digits separated by spaces and hyphens, padded with spaces now and then
+    characters = [rng.choice(WORD_CHARACTERS) if index % 6 else rng.choice(' -') for index in range(1, length + 1)]
+    text = ''.join(characters).strip(' ') or 'x'
+    return f'  {text} ' if rng.random() < 0.1 else text
+
+
+def price(rng):
+    cents = rng.choice([rng.randint(1, 5000), rng.randint(1, 200) * 25])
+    return f'{cents // 100}.{cents % 100:02d}'
+
+
+def generate_receipt(rng, item_count, description_length, invalid=False):
+    items = [{'shortDescription': description(rng, description_length), 'price': price(rng)}
+             for _ in range(item_count)]
+    total_cents = sum(int(item['price'].replace('.', '')) for item in items)
+    receipt = {
+        'retailer': rng.choice(RETAILERS),
+        'purchaseDate': f'{rng.randint(2019, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        'purchaseTime': f'{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}',
+        'items': items,
+        'total': f'{total_cents // 100}.{total_cents % 100:02d}'
+    }
+    if invalid:
+        rng.choice(CORRUPTIONS)(receipt, rng)
+    return receipt
+
+
+def generate_receipts(count, seed=0, items=(1, 10), description_length=(3, 24), invalid_ratio=0.0):
+    '''
+    count receipts with item counts and description lengths drawn uniformly from the
+    inclusive (low, high) ranges. invalid_ratio of them are broken in one way validation
+    rejects, the rest are valid.
+    '''
+    rng = random.Random(seed)
+    return [
+        generate_receipt(rng, rng.randint(*items), rng.randint(*description_length), rng.random() < invalid_ratio)
+        for _ in range(count)
+    ]
@@ -0,0 +1,108 @@
+"""Memory and query latency of the retailer and purchase date indexes behind GET /receipts.
+
+Receipts from 1,000 retailers over three years of purchase dates are added one at a time,
+the way the store indexes them on insert. Memory is the growth of the process resident
+set while indexing, the receipt ids themselves aren't counted, the store holds them
+anyway. Queries are timed against a full scan over the same receipts.
+
+From root of project: python -m benchmarks.indexes [receipt count]
+"""
+import sys
+import time
+import random
+from datetime import date
+from uuid import uuid4
+from benchmarks.common import print_table, quiet_logging
+from storage import ReceiptIndex
+
+RETAILERS = 1000
+# 2021-01-01 plus up to three years, as yyyymmdd
+FIRST_DAY = 737791
+
+
+def resident_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * 4096
+
+
+def packed_date(day):
+    day = date.fromordinal(day)
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def time_queries(index, queries, limit=100):
+    latencies = []
+    for query in queries:
+        began = time.perf_counter()
+        page = []
+        for receipt_id in index.range(**query):
+            page.append(receipt_id)
+            if len(page) == limit:
+                break
+        latencies.append(time.perf_counter() - began)
+    return percentile(latencies, 0.5) * 1e6, percentile(latencies, 0.99) * 1e6
+
+
+def scan(index, retailer, start, end, limit=100):
+    # what the query costs without indexes: every receipt is looked at
+    page = []
+    for purchase_date, receipt_id, key in index.items.values():
+        if key == retailer and start <= purchase_date <= end:
+            page.append(receipt_id)
+    page.sort()
+    return page[:limit]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    generator = random.Random(0)
+    dates = [packed_date(FIRST_DAY + day) for day in range(3 * 365)]
+    retailers = [f'Retailer {number}' for number in range(RETAILERS)]
+    ids = [str(uuid4()) for _ in range(count)]
+
+    index = ReceiptIndex()
+    before = resident_bytes()
+    started = time.perf_counter()
+    for receipt_id in ids:
+        index.add(receipt_id, generator.choice(retailers), generator.choice(dates))
+    build_seconds = time.perf_counter() - started
+    index_bytes = resident_bytes() - before
+    print(f'{count:,} receipts indexed in {build_seconds:.1f} s, {count / build_seconds:,.0f} inserts/s, '
+          f'{index_bytes / 2 ** 20:,.0f} MiB, {index_bytes / count:.0f} bytes per receipt\n')
+
+    def month(retailer=None):
+        start = generator.randrange(len(dates) - 30)
+        return {'retailer': retailer, 'start': dates[start], 'end': dates[start + 30]}
+
+    queries = [
+        ('retailer, 30 days', [month(generator.choice(retailers)) for _ in range(2000)]),
+        ('retailer, any date', [{'retailer': generator.choice(retailers)} for _ in range(2000)]),
+        ('all retailers, 30 days', [month() for _ in range(2000)]),
+        ('missing retailer', [{'retailer': 'nobody'} for _ in range(2000)]),
+    ]
+    # resuming from a cursor deep into the result set
+    ordered = list(index.range(retailer=retailers[0]))
+    middle = index.items[ordered[len(ordered) // 2]]
+    queries.append(('retailer, page from cursor',
+                    [{'retailer': retailers[0], 'after': (middle[0], middle[1])} for _ in range(2000)]))
+
+    rows = []
+    for name, batch in queries:
+        p50, p99 = time_queries(index, batch)
+        rows.append([name, f'{p50:,.1f}', f'{p99:,.1f}'])
+    print_table(['query, 100 per page', 'p50 us', 'p99 us'], rows)
+
+    query = month(retailers[0].casefold())
+    started = time.perf_counter()
+    scan(index, query['retailer'], query['start'], query['end'])
+    print(f'\nfull scan for retailer, 30 days: {(time.perf_counter() - started) * 1000:,.0f} ms')
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
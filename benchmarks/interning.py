@@ -0,0 +1,86 @@
+"""Memory per stored receipt and scoring throughput with interned retailers and descriptions.
+
+Receipts are drawn from a catalogue of 200 retailers and 5,000 products, both picked
+with a Zipf like skew the way real baskets repeat popular items. Records built the way
+the service builds them share one copy of every name. The comparison keeps each receipt's
+own copies, as decoding every request body yields them.
+
+From root of project: python -m benchmarks.interning [receipt count]
+"""
+import gc
+import sys
+import json
+import time
+import random
+import tracemalloc
+from itertools import accumulate
+from benchmarks.common import print_table, quiet_logging
+from benchmarks.generator import description, price
+from handlers.records import ReceiptRecord
+from handlers.rules import RuleSet, DEFAULT_RULES
+from handlers.utils import read_receipt
+
+RETAILERS = 200
+PRODUCTS = 5000
+
+
+def encoded_receipts(count, seed=0):
+    rng = random.Random(seed)
+    retailers = [f'{description(rng, rng.randint(4, 20)).strip()} Store' for _ in range(RETAILERS)]
+    products = [(description(rng, rng.randint(3, 24)), price(rng)) for _ in range(PRODUCTS)]
+    retailer_weights = list(accumulate(1 / (rank + 1) for rank in range(RETAILERS)))
+    product_weights = list(accumulate(1 / (rank + 1) for rank in range(PRODUCTS)))
+    for _ in range(count):
+        items = [{'shortDescription': name, 'price': cost}
+                 for name, cost in rng.choices(products, cum_weights=product_weights, k=rng.randint(1, 10))]
+        cents = sum(int(item['price'].replace('.', '')) for item in items)
+        yield json.dumps({
+            'retailer': rng.choices(retailers, cum_weights=retailer_weights)[0],
+            'purchaseDate': f'2022-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'purchaseTime': f'{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}',
+            'items': items,
+            'total': f'{cents // 100}.{cents % 100:02d}'
+        })
+
+
+def own_copies(receipt):
+    # the record as built before interning, holding the decoded strings
+    record = read_receipt(receipt, score=False)[0]
+    return ReceiptRecord(receipt['retailer'], record.total_cents, record.purchase_date, record.purchase_minute,
+                         tuple([item['shortDescription'] for item in receipt['items']]), record.prices)
+
+
+def interned(receipt):
+    return read_receipt(receipt, score=False)[0]
+
+
+def build(documents, make_record):
+    # (records, bytes per record), every record from its own decoded request body
+    gc.collect()
+    tracemalloc.start()
+    records = [make_record(json.loads(document)) for document in documents]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, size / len(documents)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    documents = list(encoded_receipts(count))
+    rule_set = RuleSet(DEFAULT_RULES)
+    rows = []
+    for name, make_record in [('own copies', own_copies), ('interned', interned)]:
+        records, per_record = build(documents, make_record)
+        started = time.perf_counter()
+        for record in records:
+            rule_set.score(record)
+        scored = count / (time.perf_counter() - started)
+        rows.append([name, f'{per_record:,.0f}', f'{scored:,.0f}'])
+        del records
+    print(f'{count:,} receipts, 1-10 items from {PRODUCTS:,} products and {RETAILERS} retailers')
+    print_table(['strings', 'bytes/receipt', 'scored/s'], rows)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
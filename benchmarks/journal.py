@@ -0,0 +1,99 @@
+"""Write latency of the journal backend against the in memory and sqlite stores, and
+how long restarts take replaying its log or a snapshot.
+
+Writes are timed from one thread without waiting for the sync, and waiting for it from
+1 and 16 threads, where concurrent writes share a group commit.
+
+From root of project: python -m benchmarks.journal [receipt count]
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from uuid import uuid4
+from benchmarks.common import make_receipt, print_table, quiet_logging
+from handlers.utils import build_receipt_record
+from handlers.records import ReceiptRecord
+from storage import MemoryStore, SqliteStore, JournaledStore
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def timed_puts(store, count, entry, threads=1):
+    # (puts/s, p50 us, p99 us) of count puts split across threads
+    latencies = []
+
+    def run(ids):
+        own = []
+        for receipt_id in ids:
+            began = time.perf_counter()
+            store.put(receipt_id, entry)
+            own.append(time.perf_counter() - began)
+        latencies.extend(own)
+
+    ids = [str(uuid4()) for _ in range(count)]
+    workers = [threading.Thread(target=run, args=(ids[index::threads],)) for index in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return count / elapsed, percentile(latencies, 0.5) * 1e6, percentile(latencies, 0.99) * 1e6
+
+
+def journal(path, **options):
+    return JournaledStore(path, ReceiptRecord.to_json, ReceiptRecord.from_json, **options)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    entry = build_receipt_record(make_receipt(5))
+
+    with tempfile.TemporaryDirectory() as directory:
+        rows = []
+        cases = [
+            ('memory', lambda: MemoryStore(), 1),
+            ('sqlite', lambda: SqliteStore(os.path.join(directory, 'receipts.db'), ReceiptRecord.to_json,
+                                           ReceiptRecord.from_json), 1),
+            ('journal', lambda: journal(os.path.join(directory, 'journal')), 1),
+            ('journal, wait', lambda: journal(os.path.join(directory, 'journal-wait'), wait=True), 1),
+            ('journal, wait, 16 threads', lambda: journal(os.path.join(directory, 'journal-threads'), wait=True), 16),
+        ]
+        for name, make_store, threads in cases:
+            store = make_store()
+            # waiting writes are far slower, a tenth of them is enough for steady figures
+            writes = count // 10 if 'wait' in name else count
+            rate, p50, p99 = timed_puts(store, writes, entry, threads)
+            stats = store.stats() or {}
+            store.close()
+            per_sync = ''
+            if 'journal' in stats and stats['journal']['commits']:
+                per_sync = f'{stats["journal"]["records"] / stats["journal"]["commits"]:.1f}'
+            rows.append([name, f'{rate:,.0f}', f'{p50:,.1f}', f'{p99:,.1f}', per_sync])
+        print_table(['store', 'puts/s', 'p50 us', 'p99 us', 'writes per sync'], rows)
+
+        print()
+        path = os.path.join(directory, 'replay')
+        store = journal(path, snapshot_records=count * 100)
+        store.put_many({str(uuid4()): entry for _ in range(count * 5)})
+        store.close()
+        started = time.perf_counter()
+        store = journal(path, snapshot_records=1)
+        replayed = time.perf_counter() - started
+        # the first write after replaying that many records starts a snapshot
+        store.put('trigger', entry)
+        store.close()
+        started = time.perf_counter()
+        journal(path).close()
+        print(f'restart with {count * 5:,} receipts: replaying the log {replayed:.2f} s, '
+              f'loading the snapshot {time.perf_counter() - started:.2f} s')
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
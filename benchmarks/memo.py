@@ -0,0 +1,67 @@
+"""Compiled scorer throughput and memo hit rates on Zipf skewed receipts, by memo size.
+
+Retailers and items are drawn from catalogues of 2,000 retailers and 50,000 products
+(description and price), the rank r one picked with weight 1 / r ** exponent. Larger
+exponents concentrate traffic on fewer names. Receipts are validated up front, only
+score_record, which scores every stored receipt, is timed. Memo size 0 computes every
+lookup.
+
+From root of project: python -m benchmarks.memo [receipt count]
+"""
+import sys
+import time
+import random
+from itertools import accumulate
+from benchmarks.common import print_table, quiet_logging
+from benchmarks.generator import description, price
+from handlers.memo import configure_memos
+from handlers.rules import retailer_facts
+from handlers.utils import read_receipt, score_record
+
+RETAILERS = 2000
+PRODUCTS = 50000
+EXPONENTS = [0.8, 1.0, 1.2]
+SIZES = [0, 1000, 10000, 100000]
+
+
+def zipf_receipts(count, exponent, seed=0):
+    rng = random.Random(seed)
+    retailers = [f'{description(rng, rng.randint(4, 20)).strip()} Store' for _ in range(RETAILERS)]
+    products = [{'shortDescription': description(rng, rng.randint(3, 24)), 'price': price(rng)}
+                for _ in range(PRODUCTS)]
+    retailer_weights = list(accumulate(1 / rank ** exponent for rank in range(1, RETAILERS + 1)))
+    product_weights = list(accumulate(1 / rank ** exponent for rank in range(1, PRODUCTS + 1)))
+    return [{
+        'retailer': rng.choices(retailers, cum_weights=retailer_weights)[0],
+        'purchaseDate': f'2022-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        'purchaseTime': f'{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}',
+        'items': rng.choices(products, cum_weights=product_weights, k=rng.randint(1, 10)),
+        'total': price(rng)
+    } for _ in range(count)]
+
+
+def hit_rate(memo):
+    stats = memo.stats()
+    lookups = stats['hits'] + stats['misses']
+    return f'{stats["hits"] / lookups:.0%}' if lookups else '-'
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rows = []
+    for exponent in EXPONENTS:
+        records = [read_receipt(receipt, score=False)[0] for receipt in zipf_receipts(count, exponent)]
+        for size in SIZES:
+            configure_memos(size)
+            started = time.perf_counter()
+            for record in records:
+                score_record(record)
+            rate = count / (time.perf_counter() - started)
+            rows.append([exponent, f'{size:,}', f'{rate:,.0f}', hit_rate(retailer_facts)])
+    print(f'{count:,} receipts, 1-10 items each')
+    print_table(['exponent', 'memo size', 'receipts/s', 'retailer hits'], rows)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
@@ -0,0 +1,59 @@
+"""Bytes per stored receipt, request body dicts vs compact ReceiptRecords.
+
+From root of project: python -m benchmarks.memory [receipt count]
+"""
+import gc
+import sys
+import json
+import tracemalloc
+from benchmarks.common import print_table, quiet_logging
+from handlers.utils import determine_points, build_receipt_record, RULES_VERSION
+
+
+def encoded_receipts(count):
+    # distinct JSON documents, decoded one at a time like request bodies
+    for index in range(count):
+        yield json.dumps({
+            'retailer': f'Retailer {index % 1000}',
+            'purchaseDate': f'2022-{index % 12 + 1:02d}-{index % 28 + 1:02d}',
+            'purchaseTime': f'{index % 24:02d}:{index % 60:02d}',
+            'items': [
+                {'shortDescription': f'Item {index % 997} {item}', 'price': f'{(index + item) % 50}.{item * 7 % 100:02d}'}
+                for item in range(5)
+            ],
+            'total': f'{index % 200}.{index % 100:02d}'
+        })
+
+
+def dict_entry(receipt):
+    # what was stored before records
+    return {'receipt': receipt, 'points': determine_points(receipt), 'rules_version': RULES_VERSION}
+
+
+def bytes_per_receipt(build, count):
+    gc.collect()
+    tracemalloc.start()
+    store = {}
+    for index, encoded in enumerate(encoded_receipts(count)):
+        store[index] = build(json.loads(encoded))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return size / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    as_dicts = bytes_per_receipt(dict_entry, count)
+    as_records = bytes_per_receipt(build_receipt_record, count)
+    print(f'{count:,} receipts, 5 items each')
+    print_table(['storage', 'bytes/receipt'], [
+        ['request body dict', f'{as_dicts:,.0f}'],
+        ['ReceiptRecord', f'{as_records:,.0f}'],
+        ['saving', f'{1 - as_records / as_dicts:.0%}']
+    ])
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
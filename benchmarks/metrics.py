@@ -0,0 +1,109 @@
+"""Cost of the metrics instrumentation, per call and per request through the app.
+
+Requests go through the ASGI app in process, once as shipped and once with every
+metrics recording function replaced by a no-op. Needs fastapi and httpx.
+
+From root of project: python -m benchmarks.metrics [requests]
+"""
+import sys
+import time
+import asyncio
+import logging
+from benchmarks.common import make_receipt, per_second, print_table, quiet_logging
+from storage import MemoryStore
+from handlers.utils import build_receipt_record
+import metrics
+
+
+def no_op(*args):
+    pass
+
+
+async def requests_per_second(http, send, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        await send(http)
+    return count / (time.perf_counter() - started)
+
+
+def run_requests(app, count, rounds, instrument):
+    # best requests/s per route with and without metrics, the two alternate every round
+    # so drift in machine load affects both alike
+    import httpx
+
+    async def run():
+        best = {}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://benchmark') as http:
+            receipt_id = (await http.post('/receipts/process', json=make_receipt(5))).json()['id']
+            body = make_receipt(5)
+
+            async def process(http):
+                await http.post('/receipts/process', json=body)
+
+            async def points(http):
+                await http.get(f'/receipts/{receipt_id}/points')
+
+            await requests_per_second(http, points, count // 10)
+            for _ in range(rounds):
+                for enabled in (True, False):
+                    instrument(enabled)
+                    for route, send in [('POST /receipts/process', process), ('GET /receipts/{id}/points', points)]:
+                        rate = await requests_per_second(http, send, count)
+                        best[route, enabled] = max(best.get((route, enabled), 0.0), rate)
+            instrument(True)
+        return best
+
+    return asyncio.run(run())
+
+
+def main():
+    import main as service
+    import handlers.get.receipts_points as points_handler
+    import handlers.post.receipts_process as process_handler
+    from handlers.dedup import configure_dedup
+    logging.disable(logging.INFO)
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    started = time.perf_counter()
+    calls = {
+        'record_request': per_second(lambda _: metrics.record_request('get', 'receipts', 'points', 200, started), None),
+        'record_points_lookup': per_second(metrics.record_points_lookup, True),
+        'record_validation_failure': per_second(metrics.record_validation_failure, 'total')
+    }
+    print_table(['call', 'calls/s'], [[name, f'{rate:,.0f}'] for name, rate in calls.items()])
+
+    store = MemoryStore()
+    record = build_receipt_record(make_receipt(5))
+    store.put_many({str(index): record for index in range(100000)})
+    render_started = time.perf_counter()
+    text = metrics.render(store)
+    print(f'\nrender with 100,000 stored receipts: {(time.perf_counter() - render_started) * 1000:.2f} ms, '
+          f'{len(text):,} bytes\n')
+
+    # the modules imported the recording functions by name, so they're replaced where they're called
+    replaced = [(service, 'record_request'), (points_handler, 'record_points_lookup'),
+                (process_handler, 'record_validation_failure')]
+    originals = [getattr(module, name) for module, name in replaced]
+
+    def instrument(enabled):
+        for (module, name), original in zip(replaced, originals):
+            setattr(module, name, original if enabled else no_op)
+
+    # the same body is posted over and over, every one of them is scored and stored
+    configure_dedup('off')
+    service.store = MemoryStore()
+    best = run_requests(service.app, count, 5, instrument)
+    routes = ['POST /receipts/process', 'GET /receipts/{id}/points']
+    print_table(['route', 'without metrics req/s', 'with metrics req/s', 'overhead'], [
+        [route, f'{best[route, False]:,.0f}', f'{best[route, True]:,.0f}', f'{1 - best[route, True] / best[route, False]:+.1%}']
+        for route in routes
+    ])
+    # whole app timings are noisy, the recording cost itself is the steadier figure
+    recording = 1e6 / calls['record_request'] + 1e6 / calls['record_points_lookup']
+    request = 1e6 / best['GET /receipts/{id}/points', False]
+    print(f'\nrecording a points request: {recording:.2f} us of a {request:.0f} us request, {recording / request:.2%}')
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
@@ -0,0 +1,59 @@
+"""Throughput of the offline scorer (python -m app.scoring) by number of worker processes.
+
+Writes a file of seeded synthetic receipts, 5% of them invalid, and scores it with 1, 2,
+4, ... workers up to twice the core count. Speedup is against scoring in one process.
+
+From root of project: python -m benchmarks.offline_scoring [receipt count]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+from benchmarks.common import print_table, quiet_logging
+from benchmarks.generator import generate_receipts
+from app.scoring import score_file
+
+
+class DiscardOutput:
+    # counts the result bytes instead of keeping them
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    cores = os.cpu_count() or 1
+    counts = []
+    workers = 1
+    while workers <= max(2, cores * 2):
+        counts.append(workers)
+        workers *= 2
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'receipts.ndjson')
+        with open(path, 'w') as receipts:
+            for receipt in generate_receipts(count, invalid_ratio=0.05):
+                receipts.write(json.dumps(receipt) + '\n')
+        size = os.path.getsize(path)
+        print(f'{count:,} receipts, {size / 2 ** 20:,.1f} MiB, {cores} cores\n')
+
+        rows = []
+        baseline = None
+        for workers in counts:
+            started = time.perf_counter()
+            progress = score_file(path, DiscardOutput(), workers)
+            elapsed = time.perf_counter() - started
+            rate = progress.lines / elapsed
+            baseline = baseline or rate
+            rows.append([workers, f'{rate:,.0f}', f'{size / elapsed / 2 ** 20:,.1f}', f'{rate / baseline:.2f}x'])
+        print_table(['workers', 'receipts/s', 'MiB/s', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
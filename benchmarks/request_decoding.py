@@ -0,0 +1,64 @@
+"""Per request decode, validate, build and encode time, typed fast path vs the generic path,
+and what content hashing for dedup adds to ingest.
+
+From root of project: python -m benchmarks.request_decoding
+"""
+import json
+from benchmarks.common import make_receipt, per_second, print_table, quiet_logging
+from handlers.utils import find_receipt_error, build_receipt_record
+from handlers.codec import decode_receipt, dumps
+from handlers.dedup import receipt_digest, DedupIndex
+
+
+def render(document):
+    # what JSONResponse does with the results
+    return json.dumps(document, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+
+
+def generic_process(body):
+    # request.json(), then validation and record building each walk the document
+    receipt = json.loads(body)
+    if find_receipt_error(receipt) is None:
+        build_receipt_record(receipt)
+    return render({'id': '7fb1377b-b223-49d9-a31a-5a02701dd310'})
+
+
+def typed_process(body):
+    record, error = decode_receipt(body)
+    return dumps({'id': '7fb1377b-b223-49d9-a31a-5a02701dd310'})
+
+
+def main():
+    rows = []
+    for item_count in [1, 10, 100]:
+        body = json.dumps(make_receipt(item_count)).encode()
+        generic = 1e6 / per_second(generic_process, body)
+        typed = 1e6 / per_second(typed_process, body)
+        rows.append([f'process, {item_count} items', f'{generic:.1f}', f'{typed:.1f}', f'{generic / typed:.1f}x'])
+
+    generic = 1e6 / per_second(render, {'points': 109})
+    typed = 1e6 / per_second(dumps, {'points': 109})
+    rows.append(['points response', f'{generic:.2f}', f'{typed:.2f}', f'{generic / typed:.1f}x'])
+
+    print_table(['request', 'generic us', 'typed us', 'speedup'], rows)
+
+    # new receipts are hashed and claimed on top of decoding and scoring, duplicates skip scoring
+    rows = []
+    for item_count in [1, 10, 100]:
+        body = json.dumps(make_receipt(item_count)).encode()
+        record, _ = decode_receipt(body, score=False)
+        index = DedupIndex(86400.0, 100000)
+        index.claim(receipt_digest(record), 'first')
+        ingest = 1e6 / per_second(decode_receipt, body)
+        digest = 1e6 / per_second(receipt_digest, record)
+        duplicate = 1e6 / per_second(lambda body: index.claim(receipt_digest(decode_receipt(body, score=False)[0]),
+                                                              'again'), body)
+        rows.append([f'{item_count} items', f'{ingest:.1f}', f'{digest:.2f}', f'{digest / ingest:.0%}',
+                     f'{duplicate:.1f}'])
+    print()
+    print_table(['receipt', 'decode and score us', 'hash us', 'hash share', 'duplicate us'], rows)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
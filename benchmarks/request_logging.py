@@ -0,0 +1,77 @@
+"""Receipts processed per second under each logging setup.
+
+From root of project: python -m benchmarks.request_logging
+"""
+import os
+import time
+import logging
+from benchmarks.common import make_receipt, per_second, print_table
+from benchmarks.validation import legacy_validate_receipt
+from handlers.utils import find_receipt_error, build_receipt_record, determine_points
+from logs import configure_logging, stop_logging, log_request
+
+
+def legacy_request(receipt):
+    # previous hot path, every step logged eagerly at INFO
+    legacy_validate_receipt(receipt)
+    determine_points(receipt)
+
+
+def current_request(receipt):
+    started = time.perf_counter()
+    if find_receipt_error(receipt) is None:
+        build_receipt_record(receipt)
+    log_request('POST /receipts/process', None, 200, started)
+
+
+class SlowStream:
+    # stands in for stderr piped to a log collector that is falling behind
+
+    def write(self, text):
+        time.sleep(0.0005)
+
+    def flush(self):
+        pass
+
+
+def synchronous_logging(level, stream):
+    # what logging.basicConfig sets up, records are formatted and written on the calling thread
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.StreamHandler(stream))
+    root.setLevel(level)
+
+
+def main():
+    receipt = make_receipt(10)
+    rows = []
+
+    with open(os.devnull, 'w') as devnull:
+        synchronous_logging(logging.INFO, devnull)
+        rows.append(['legacy handlers, INFO, synchronous', f'{per_second(legacy_request, receipt):,.0f}'])
+
+        synchronous_logging(logging.DEBUG, devnull)
+        rows.append(['current handlers, DEBUG, synchronous', f'{per_second(current_request, receipt):,.0f}'])
+
+        configure_logging('INFO', stream=devnull)
+        rows.append(['current handlers, INFO, queued', f'{per_second(current_request, receipt):,.0f}'])
+        stop_logging()
+
+        synchronous_logging(logging.INFO, SlowStream())
+        rows.append(['current handlers, INFO, synchronous, slow output',
+                     f'{per_second(current_request, receipt):,.0f}'])
+
+        handler = configure_logging('INFO', queue_size=1000, stream=SlowStream())
+        rows.append(['current handlers, INFO, queued, slow output',
+                     f'{per_second(current_request, receipt):,.0f} ({handler.dropped:,} dropped)'])
+        stop_logging()
+
+        logging.disable(logging.CRITICAL)
+        rows.append(['current handlers, logging disabled', f'{per_second(current_request, receipt):,.0f}'])
+
+    print_table(['setup', 'receipts/s'], rows)
+
+
+if __name__ == '__main__':
+    main()
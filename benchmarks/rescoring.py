@@ -0,0 +1,81 @@
+"""Background rescoring of stored receipts after a rules change, and what it costs requests.
+
+The store holds receipts scored with the default rules while a promotion is active. A
+foreground loop stands in for the event loop, looking up and refreshing a random receipt's
+points every millisecond, and its latency is measured from when each lookup was due, so
+time spent waiting for the GIL counts. Each case rescores the whole store with a chunk size
+and core share, the first row runs the foreground alone. The 10M column projects the pass
+to 10M receipts at the measured rate.
+
+From root of project: python -m benchmarks.rescoring [receipt count]
+"""
+import gc
+import sys
+import time
+import random
+from benchmarks.common import print_table, quiet_logging
+from benchmarks.generator import generate_receipts
+from storage import MemoryStore
+from handlers.rescore import configure_rescoring, rescoring_stats
+from handlers.rules import DEFAULT_RULES, configure_rules, reload_rules
+from handlers.utils import build_receipt_record, refresh_record
+
+PROMOTION = {'name': 'promotion', 'version': 2, 'rules': DEFAULT_RULES['rules'] + [
+    {'name': 'promotion', 'kind': 'total_at_least', 'cents': 0, 'points': 1000}]}
+# (chunk size, share)
+CASES = [(100, 1.0), (5000, 1.0), (100, 0.5), (100, 0.25), (500, 0.25)]
+INTERVAL = 0.001
+
+
+def foreground(store, ids, done, seconds=None):
+    # request latencies in ms, one lookup due every INTERVAL until done() or seconds elapse
+    rng = random.Random(0)
+    latencies = []
+    started = time.perf_counter()
+    due = started
+    while not done() if seconds is None else due - started < seconds:
+        due += INTERVAL
+        wait = due - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        refresh_record(store.get(rng.choice(ids)))
+        latencies.append((time.perf_counter() - due) * 1000)
+    latencies.sort()
+    return latencies
+
+
+def percentile(latencies, fraction):
+    return f'{latencies[min(int(len(latencies) * fraction), len(latencies) - 1)]:.2f}'
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    configure_rules(None)
+    # distinct receipts recombined under many ids, a record of its own per id
+    records = [build_receipt_record(receipt) for receipt in generate_receipts(10_000)]
+    ids = [str(index) for index in range(count)]
+    store = MemoryStore()
+    store.put_many({receipt_id: records[index % len(records)].with_points(0, DEFAULT_RULES['version'])
+                    for index, receipt_id in enumerate(ids)})
+    reload_rules(PROMOTION)
+
+    latencies = foreground(store, ids, None, seconds=2.0)
+    rows = [['-', 'off', '-', '-', percentile(latencies, 0.5), percentile(latencies, 0.99), f'{latencies[-1]:.2f}']]
+    for chunk_size, share in CASES:
+        for _, record in store.iterate():
+            record.rules_version = DEFAULT_RULES['version']
+        gc.collect()
+        configure_rescoring(store, chunk_size, share, check_seconds=60)
+        latencies = foreground(store, ids, lambda: rescoring_stats()['passes'])
+        progress = rescoring_stats()['pass']
+        configure_rescoring(None)
+        rate = progress['receipts_per_second']
+        rows.append([chunk_size, share, f'{rate:,}', f'{10_000_000 / rate / 60:.1f}', percentile(latencies, 0.5),
+                     percentile(latencies, 0.99), f'{latencies[-1]:.2f}'])
+    print(f'{count:,} stored receipts, a lookup every {INTERVAL * 1000:g} ms')
+    print_table(['chunk', 'share', 'rescored/s', '10M min', 'p50 ms', 'p99 ms', 'max ms'], rows)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
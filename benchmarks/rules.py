@@ -0,0 +1,70 @@
+"""Receipts scored per second by the compiled rule set vs the hand written scorers, then
+the rule set's per rule stats.
+
+From root of project: python -m benchmarks.rules [receipt count]
+"""
+import sys
+import math
+import time
+from benchmarks.common import make_receipt, print_table, quiet_logging
+from handlers.utils import determine_points
+from handlers.records import ReceiptRecord, is_calendar_date
+from handlers.rules import RuleSet, DEFAULT_RULES
+
+
+# previous hand written record scorer, kept verbatim for comparison
+def legacy_determine_record_points(record):
+    points = sum(map(str.isalnum, record.retailer))
+
+    total_cents = record.total_cents
+    if total_cents % 100 == 0:
+        points += 50
+    if total_cents % 25 == 0:
+        points += 25
+
+    prices = record.prices
+    points += 5 * (len(prices) // 2)
+    for description, price in zip(record.item_descriptions, prices):
+        if len(description.strip()) % 3 == 0:
+            points += math.ceil(price / 100 * 0.2)
+
+    if record.purchase_date % 2 != 0 and is_calendar_date(record.purchase_date):
+        points += 6
+
+    if 840 < record.purchase_minute < 960:
+        points += 10
+
+    return points
+
+
+def rate(count, function):
+    start = time.perf_counter()
+    function()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    receipts = [make_receipt(1 + index % 10) for index in range(count)]
+    records = [ReceiptRecord.from_receipt(receipt) for receipt in receipts]
+    rule_set = RuleSet(DEFAULT_RULES)
+    assert [rule_set.score(record) for record in records[:1000]] == [determine_points(receipt) for receipt in receipts[:1000]]
+
+    rows = [
+        ['determine_points', f'{rate(count, lambda: [determine_points(receipt) for receipt in receipts]):,.0f}'],
+        ['hand written record scorer',
+         f'{rate(count, lambda: [legacy_determine_record_points(record) for record in records]):,.0f}'],
+        ['compiled default rule set', f'{rate(count, lambda: [rule_set.score(record) for record in records]):,.0f}'],
+    ]
+    print(f'{count:,} receipts, 1-10 items each')
+    print_table(['scorer', 'receipts/s'], rows)
+
+    print()
+    stats = rule_set.stats()
+    print_table(['rule', 'hits', 'mean us'],
+                [[rule['name'], f'{rule["hits"]:,}', rule['mean_us']] for rule in stats['rules']])
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
@@ -0,0 +1,74 @@
+"""Throughput of the in memory stores under 1 to 32 threads.
+
+Every thread loops over get, put and get_many of 20 ids (8:1:1) on ids spread over the
+whole store for a fixed time. The memory store is a bare dict, safe only because the
+GIL makes single dict operations atomic. 'one lock' is the sharded store with one shard,
+what guarding the dict with a lock costs. On a GIL build threads take turns whatever the
+store, free threaded builds (python3.13t) show what the striping buys.
+
+From root of project: python -m benchmarks.sharded_store [seconds per case]
+"""
+import os
+import sys
+import time
+import random
+import threading
+from benchmarks.common import make_receipt, print_table, quiet_logging
+from handlers.utils import build_receipt_record
+from storage import MemoryStore, ShardedStore
+
+KEYS = 100_000
+THREADS = [1, 2, 4, 8, 16, 32]
+
+
+def hammer(store, ids, entry, threads, seconds):
+    # operations per second of threads workers running the mix until seconds elapse
+    # workers watch the clock themselves, with one contended lock on few cores the main
+    # thread can wait on the GIL for as long as they keep it busy
+    done = []
+    deadline = time.perf_counter() + seconds
+
+    def run(seed):
+        generator = random.Random(seed)
+        picks = [generator.choice(ids) for _ in range(4096)]
+        operations = 0
+        index = 0
+        while time.perf_counter() < deadline:
+            for _ in range(8):
+                store.get(picks[index % 4096])
+                index += 1
+            store.put(picks[index % 4096], entry)
+            store.get_many(picks[index % 4076:index % 4076 + 20])
+            index += 1
+            operations += 10
+        done.append(operations)
+
+    workers = [threading.Thread(target=run, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(done) / (time.perf_counter() - started)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    entry = build_receipt_record(make_receipt(5))
+    ids = [str(index) for index in range(KEYS)]
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f'{os.cpu_count()} cores, GIL {"enabled" if gil else "disabled"}\n')
+
+    stores = [('memory', MemoryStore()), ('one lock', ShardedStore(1)), ('16 shards', ShardedStore(16)),
+              ('64 shards', ShardedStore(64))]
+    for _, store in stores:
+        store.put_many({receipt_id: entry for receipt_id in ids})
+    rows = []
+    for threads in THREADS:
+        rows.append([threads] + [f'{hammer(store, ids, entry, threads, seconds):,.0f}' for _, store in stores])
+    print_table(['threads'] + [f'{name} ops/s' for name, _ in stores], rows)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
@@ -0,0 +1,90 @@
+"""Ingest + lookup throughput through the shared store as worker processes are added.
+
+Each worker validates and scores a receipt, stores it and reads it back, like a
+POST /receipts/process followed by a GET /receipts/{id}/points.
+
+From root of project: python -m benchmarks.shared_store [max workers] [seconds]
+"""
+import os
+import sys
+import time
+import tempfile
+import multiprocessing
+from uuid import uuid4
+from benchmarks.common import make_receipt, print_table, quiet_logging
+from handlers.utils import find_receipt_error, build_receipt_record
+from storage import MemoryStore, SharedStore, StoreServer
+
+AUTHKEY = b'benchmark'
+
+
+def serve(address):
+    StoreServer(MemoryStore(), address, AUTHKEY).serve_forever()
+
+
+def ingest_and_lookup(store, receipt):
+    assert find_receipt_error(receipt) is None
+    receipt_id = str(uuid4())
+    store.put(receipt_id, build_receipt_record(receipt))
+    assert store.get(receipt_id) is not None
+
+
+def worker(address, seconds, start_event, results):
+    store = SharedStore(address, AUTHKEY)
+    receipt = make_receipt(5)
+    start_event.wait()
+    operations = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        ingest_and_lookup(store, receipt)
+        operations += 1
+    results.put(operations)
+    store.close()
+
+
+def run_workers(address, count, seconds):
+    start_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(address, seconds, start_event, results))
+                 for _ in range(count)]
+    for process in processes:
+        process.start()
+    # give every worker time to connect before the clock starts
+    time.sleep(0.5)
+    start_event.set()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / seconds
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+
+    store = MemoryStore()
+    receipt = make_receipt(5)
+    operations = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        ingest_and_lookup(store, receipt)
+        operations += 1
+    rows = [['in process dict', 1, f'{operations / seconds:,.0f}']]
+
+    with tempfile.TemporaryDirectory() as directory:
+        address = os.path.join(directory, 'receipts.sock')
+        server = multiprocessing.Process(target=serve, args=(address,), daemon=True)
+        server.start()
+        count = 1
+        while count <= max_workers:
+            rows.append(['shared store', count, f'{run_workers(address, count, seconds):,.0f}'])
+            count *= 2
+        server.terminate()
+
+    print(f'{os.cpu_count()} cores')
+    print_table(['mode', 'workers', 'receipts/s'], rows)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
@@ -0,0 +1,82 @@
+"""Put/get throughput and p99 latency of the store backends, including the bounded store
+with a tenth of the receipts in memory, without and with a disk tier.
+
+From root of project: python -m benchmarks.storage [receipt count]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from uuid import uuid4
+from benchmarks.common import make_receipt, print_table, quiet_logging
+from handlers.utils import build_receipt_record
+from handlers.records import ReceiptRecord
+from storage import MemoryStore, SqliteStore, BoundedStore
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def measure(operation, arguments):
+    latencies = []
+    start = time.perf_counter()
+    for argument in arguments:
+        began = time.perf_counter()
+        operation(*argument)
+        latencies.append(time.perf_counter() - began)
+    elapsed = time.perf_counter() - start
+    return len(arguments) / elapsed, percentile(latencies, 0.99) * 1e6
+
+
+def run(name, store, count, entry):
+    ids = [str(uuid4()) for _ in range(count)]
+    put_rate, put_p99 = measure(store.put, [(receipt_id, entry) for receipt_id in ids])
+
+    batch_ids = [str(uuid4()) for _ in range(count)]
+    start = time.perf_counter()
+    for offset in range(0, count, 1000):
+        store.put_many({receipt_id: entry for receipt_id in batch_ids[offset:offset + 1000]})
+    put_many_rate = count / (time.perf_counter() - start)
+
+    lookups = random.Random(1).choices(ids, k=count)
+    get_rate, get_p99 = measure(store.get, [(receipt_id,) for receipt_id in lookups])
+
+    return [name, f'{put_rate:,.0f}', f'{put_p99:.1f}', f'{put_many_rate:,.0f}', f'{get_rate:,.0f}', f'{get_p99:.1f}']
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    entry = build_receipt_record(make_receipt(5))
+    rows = [run('memory', MemoryStore(), count, entry)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = SqliteStore(os.path.join(directory, 'receipts.db'), ReceiptRecord.to_json, ReceiptRecord.from_json)
+        rows.append(run('sqlite', store, count, entry))
+        store.close()
+
+        rows.append(run('bounded, no limit', BoundedStore(), count, entry))
+        # every entry is measured when there is a byte limit
+        rows.append(run('bounded, 1 GB limit', BoundedStore(max_bytes=2 ** 30), count, entry))
+        # run stores count receipts one at a time and count more in batches, a fifth of them fit
+        store = BoundedStore(max_entries=count // 5)
+        rows.append(run('bounded lru, 10% held', store, count, entry))
+        stats = [['bounded lru, 10% held', store.stats()]]
+        disk = SqliteStore(os.path.join(directory, 'spill.db'), ReceiptRecord.to_json, ReceiptRecord.from_json)
+        store = BoundedStore(max_entries=count // 5, disk=disk)
+        rows.append(run('bounded lru, 10% held, disk tier', store, count, entry))
+        stats.append(['bounded lru, 10% held, disk tier', store.stats()])
+        store.close()
+
+    print(f'{count:,} receipts')
+    print_table(['backend', 'put/s', 'put p99 us', 'put_many/s', 'get/s', 'get p99 us'], rows)
+    print()
+    print_table(['backend', 'evictions', 'memory reads', 'disk reads', 'missing'], [
+        [name, f'{stats["evictions"]["capacity"]:,}', f'{stats["reads"]["memory"]:,}', f'{stats["reads"]["disk"]:,}',
+         f'{stats["reads"]["missing"]:,}'] for name, stats in stats])
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
@@ -0,0 +1,215 @@
+"""Benchmark suite: micro benchmarks of every handlers/utils function plus end to end
+requests through the ASGI app, all over seeded synthetic receipts.
+
+From root of project:
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --compare results.json --threshold 0.1
+
+--compare exits with status 1 when any benchmark's throughput falls more than threshold
+below the baseline's. The end to end benchmarks need fastapi and httpx and are skipped
+without them.
+"""
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+from datetime import datetime, timezone
+from itertools import cycle, islice
+from benchmarks.common import print_table, quiet_logging
+from benchmarks.generator import generate_receipts
+from handlers import utils
+from handlers.codec import decode_receipt
+from handlers.dedup import configure_dedup
+from handlers.records import ReceiptRecord
+
+
+def measure(function, inputs, min_seconds, repeats):
+    # calls per second over inputs, cycled, best of repeats runs of at least min_seconds each
+    best = 0.0
+    for _ in range(repeats):
+        calls = 0
+        batch = len(inputs)
+        source = cycle(inputs)
+        start = time.perf_counter()
+        while True:
+            for argument in islice(source, batch):
+                function(argument)
+            calls += batch
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_seconds:
+                break
+        best = max(best, calls / elapsed)
+    return best
+
+
+def micro_benchmarks(receipts):
+    valid = [receipt for receipt in receipts if utils.find_receipt_error(receipt) is None]
+    records = [utils.build_receipt_record(receipt) for receipt in valid]
+    stale = [record.with_points(None, None) for record in records]
+    bodies = [json.dumps(receipt).encode() for receipt in receipts]
+
+    def field(name):
+        # from valid receipts, the point helpers log an error for every malformed value
+        return [receipt[name] for receipt in valid]
+
+    return {
+        'validate_receipt': (utils.validate_receipt, receipts),
+        'find_receipt_error': (utils.find_receipt_error, receipts),
+        'read_receipt': (utils.read_receipt, receipts),
+        'decode_receipt': (decode_receipt, bodies),
+        'item_full_match': (utils.item_full_match, [item for receipt in valid for item in receipt['items']]),
+        'is_valid_price': (utils.is_valid_price, field('total')),
+        'is_valid_date': (utils.is_valid_date, field('purchaseDate')),
+        'is_valid_time': (utils.is_valid_time, field('purchaseTime')),
+        'determine_points': (utils.determine_points, valid),
+        'get_points_from_retailer': (utils.get_points_from_retailer, field('retailer')),
+        'get_points_from_total': (utils.get_points_from_total, field('total')),
+        'get_points_from_items': (utils.get_points_from_items, field('items')),
+        'get_points_from_purchase_date': (utils.get_points_from_purchase_date, field('purchaseDate')),
+        'get_points_from_purchase_time': (utils.get_points_from_purchase_time, field('purchaseTime')),
+        'build_receipt_record': (utils.build_receipt_record, valid),
+        'determine_record_points': (utils.determine_record_points, records),
+        'refresh_record.current': (utils.refresh_record, records),
+        'refresh_record.stale': (utils.refresh_record, stale),
+        'ReceiptRecord.to_json': (ReceiptRecord.to_json, records),
+    }
+
+
+def end_to_end_benchmarks(receipts, min_seconds, repeats):
+    # requests per second through the whole app in process, no network
+    try:
+        import httpx
+        import main as service
+    except ImportError as error:
+        print(f'Skipping end to end benchmarks: {error}')
+        return {}
+    logging.disable(logging.INFO)
+    # receipts are posted more than once, every post is scored and stored as it was before dedup
+    configure_dedup('off')
+
+    valid = [receipt for receipt in receipts if utils.find_receipt_error(receipt) is None]
+    bodies = [json.dumps(receipt).encode() for receipt in receipts]
+    batch_body = '\n'.join(json.dumps(receipt) for receipt in receipts[:500]).encode()
+
+    async def run():
+        results = {}
+        transport = httpx.ASGITransport(app=service.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as http:
+            ids = [(await http.post('/receipts/process', json=receipt)).json()['id'] for receipt in valid[:1000]]
+
+            async def requests_per_second(send, inputs):
+                best = 0.0
+                for _ in range(repeats):
+                    calls = 0
+                    start = time.perf_counter()
+                    for argument in cycle(inputs):
+                        await send(argument)
+                        calls += 1
+                        if calls % 50 == 0 and time.perf_counter() - start >= min_seconds:
+                            break
+                    best = max(best, calls / (time.perf_counter() - start))
+                return best
+
+            results['POST /receipts/process'] = await requests_per_second(
+                lambda body: http.post('/receipts/process', content=body), bodies)
+            results['GET /receipts/{id}/points'] = await requests_per_second(
+                lambda receipt_id: http.get(f'/receipts/{receipt_id}/points'), ids)
+            results['POST /receipts/points, 100 ids'] = await requests_per_second(
+                lambda start: http.post('/receipts/points', json={'ids': ids[start:start + 100]}), range(0, 900, 100))
+            # receipts per second, 500 receipts per request
+            results['POST /receipts/process/batch, per receipt'] = 500 * await requests_per_second(
+                lambda body: http.post('/receipts/process/batch', content=body), [batch_body])
+        return results
+
+    return asyncio.run(run())
+
+
+def run_suite(arguments):
+    receipts = generate_receipts(arguments.receipts, seed=arguments.seed, items=(arguments.min_items, arguments.max_items),
+                                 description_length=(arguments.min_description, arguments.max_description),
+                                 invalid_ratio=arguments.invalid_ratio)
+    results = {}
+    for name, (function, inputs) in micro_benchmarks(receipts).items():
+        results[f'micro {name}'] = measure(function, inputs, arguments.min_seconds, arguments.repeats)
+    for name, rate in end_to_end_benchmarks(receipts, arguments.min_seconds, arguments.repeats).items():
+        results[f'e2e {name}'] = rate
+
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'parameters': {key: value for key, value in vars(arguments).items()
+                       if key not in ('output', 'compare', 'threshold', 'allow_missing')},
+        'ops_per_second': results
+    }
+
+
+def compare(current, baseline, threshold, allow_missing=False):
+    # rows for every benchmark in either run and the names of those that fail the comparison,
+    # regressed past threshold or, unless allow_missing, in the baseline but not in this run
+    rows = []
+    regressions = []
+    for name, rate in current['ops_per_second'].items():
+        base = baseline['ops_per_second'].get(name, None)
+        if base is None:
+            rows.append([name, '-', f'{rate:,.0f}', '', 'new'])
+            continue
+        change = rate / base - 1
+        regressed = change < -threshold
+        if regressed:
+            regressions.append(name)
+        rows.append([name, f'{base:,.0f}', f'{rate:,.0f}', f'{change:+.1%}', 'REGRESSED' if regressed else ''])
+    for name, base in baseline['ops_per_second'].items():
+        if name not in current['ops_per_second']:
+            if not allow_missing:
+                regressions.append(name)
+            rows.append([name, f'{base:,.0f}', '-', '', 'missing' if allow_missing else 'MISSING'])
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Receipt processing benchmark suite')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline results JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='largest allowed throughput drop against the baseline, 0.1 is 10%%')
+    parser.add_argument('--allow-missing', action='store_true',
+                        help='pass the comparison when benchmarks in the baseline were not run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--receipts', type=int, default=2000)
+    parser.add_argument('--min-items', type=int, default=1)
+    parser.add_argument('--max-items', type=int, default=10)
+    parser.add_argument('--min-description', type=int, default=3)
+    parser.add_argument('--max-description', type=int, default=24)
+    parser.add_argument('--invalid-ratio', type=float, default=0.1)
+    parser.add_argument('--min-seconds', type=float, default=0.5)
+    parser.add_argument('--repeats', type=int, default=3)
+    arguments = parser.parse_args()
+
+    current = run_suite(arguments)
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(current, output, indent=2)
+
+    if not arguments.compare:
+        print_table(['benchmark', 'ops/s'], [[name, f'{rate:,.0f}'] for name, rate in current['ops_per_second'].items()])
+        return
+
+    with open(arguments.compare) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get('parameters') != current['parameters']:
+        print('Warning: baseline was recorded with different parameters')
+    rows, regressions = compare(current, baseline, arguments.threshold, arguments.allow_missing)
+    print_table(['benchmark', 'baseline ops/s', 'ops/s', 'change', ''], rows)
+    if regressions:
+        print(f'{len(regressions)} benchmark(s) regressed more than {arguments.threshold:.0%} or missing')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
@@ -0,0 +1,99 @@
+"""Receipts validated per second, compiled validator vs the previous regex chain.
+
+From root of project: python -m benchmarks.validation
+"""
+import re
+import logging
+from benchmarks.common import make_receipt, per_second, print_table, quiet_logging
+from handlers.utils import validate_receipt
+
+logger = logging.getLogger(__name__)
+
+
+# previous implementation, kept verbatim for comparison
+def legacy_item_full_match(item):
+    logger.info(f'Validting item: {item}')
+    description = item.get('shortDescription', None)
+    price = item.get('price', None)
+
+    if not (description and price):
+        logger.info('Required field(s) missing, item invalid')
+        return None
+    
+    logger.info(f'Validating description: {description}')
+    if re.fullmatch('^[\\w\\s\\-]+$', description) is None:
+        logger.info('Invalid')
+        return None
+    logger.info('Valid')
+    
+    logger.info(f'Validating price: {price}')
+    if re.fullmatch('^\\d+\\.\\d{2}$', price) is None:
+        logger.info('Invalid')
+        return None
+    logger.info('Valid')
+    
+    logger.info('Item valid')
+    return True
+
+def legacy_validate_receipt(receipt):
+    try:
+        logger.info('Validating receipt')
+        retailer = receipt.get('retailer', None)
+        purchase_date = receipt.get('purchaseDate', None)
+        purchase_time = receipt.get('purchaseTime', None)
+        items = receipt.get('items', None)
+        total = receipt.get('total', None)
+
+        if not (retailer and purchase_date and purchase_time and items and total):
+            logger.info('Required field(s) missing, receipt invalid')
+            return False
+        
+        logger.info(f'Validating retailer: {retailer}')
+        if re.fullmatch('^[\\w\\s\\-&]+$', retailer) is None:
+            logger.info('Invalid')
+            return False
+        logger.info('Valid')
+        
+        logger.info(f'Validating total: {total}')
+        if re.fullmatch('^\\d+\\.\\d{2}$', total) is None:
+            logger.info('Invalid')
+            return False
+        logger.info('Valid')
+        
+        for item in items:
+            if legacy_item_full_match(item) is None:
+                return False
+            
+        logger.info(f'Validating purchase time: {purchase_time}')
+        if re.fullmatch('^([01]?[0-9]|2[0-3]):([0-5]?[0-9])$', purchase_time) is None:
+            logger.info('Invalid')
+            return False
+        logger.info('Valid')
+        
+        logger.info(f'Validating purchase date: {purchase_date}')
+        if re.fullmatch('^\\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])$', purchase_date) is None:
+            logger.info('Invalid')
+            return False
+        logger.info('Valid')
+    except Exception as error:
+        logger.error(f'''Caught exception validating receipt, returning invalid. 
+                     Error: {error}''')
+        return False
+
+    return True
+
+
+def main():
+    rows = []
+    for item_count in (5, 50, 500):
+        receipt = make_receipt(item_count)
+        assert validate_receipt(receipt) and legacy_validate_receipt(receipt)
+        legacy = per_second(legacy_validate_receipt, receipt)
+        compiled = per_second(validate_receipt, receipt)
+        rows.append([item_count, f'{legacy:,.0f}', f'{compiled:,.0f}', f'{compiled / legacy:.1f}x'])
+    print_table(['items', 'legacy/s', 'compiled/s', 'speedup'], rows)
+
+
+if __name__ == '__main__':
+    quiet_logging()
+    main()
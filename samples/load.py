@@ -0,0 +1,333 @@
+"""Load generator for a running receipt processor.
+
+Sends a weighted mix of operations either at a fixed arrival rate (open loop) or from a
+fixed number of clients that each wait for their previous response (closed loop), then
+reports throughput, latency percentiles and errors per operation.
+
+From root of project:
+
+    python -m samples.load --mode open --rate 500 --duration 30 --mix process=20,points=80
+    python -m samples.load --mode closed --concurrency 32 --duration 30 --histogram
+
+Operations:
+    process      posts a new synthetic receipt
+    points       gets the points of a receipt id returned by an earlier process
+    bulk_points  posts up to 100 of those ids to /receipts/points
+
+Open loop latency is measured from the time a request was scheduled, not the time it was
+sent, so requests held back by a saturated client or server count their wait.
+"""
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter, defaultdict
+from samples.config import base_url, receipt_id
+from benchmarks.generator import generate_receipts
+
+OPERATIONS = ['process', 'points', 'bulk_points']
+BULK_SIZE = 100
+MAX_IDS = 100000
+JSON_HEADERS = {'content-type': 'application/json'}
+
+
+class LatencyHistogram:
+    '''
+    Latencies in microseconds counted in log linear buckets the way HdrHistogram does:
+    exact below 2 ** SUB_BUCKET_BITS, within 1 / 2 ** (SUB_BUCKET_BITS - 1) of the true
+    value above it, in memory that grows with the range of values rather than their count.
+    '''
+    SUB_BUCKET_BITS = 8
+
+    def __init__(self):
+        self.counts = Counter()
+        self.total = 0
+        self.maximum = 0
+
+    def record(self, seconds):
+        # rounded, 0.000003 * 1000000 is 2.9999999999999996
+        value = max(round(seconds * 1000000), 0)
+        shift = max(value.bit_length() - self.SUB_BUCKET_BITS, 0)
+        self.counts[(shift, value >> shift)] += 1
+        self.total += 1
+        self.maximum = max(self.maximum, value)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+
+    def buckets(self):
+        # (highest value in the bucket, count) in increasing order
+        for (shift, sub_bucket), count in sorted(self.counts.items()):
+            yield min(((sub_bucket + 1) << shift) - 1, self.maximum), count
+
+    def value_at(self, percentile):
+        # microseconds at or below which percentile percent of values fall
+        if not self.total:
+            return 0
+        target = max(math.ceil(self.total * percentile / 100), 1)
+        seen = 0
+        for value, count in self.buckets():
+            seen += count
+            if seen >= target:
+                return value
+        return self.maximum
+
+    def percentile_distribution(self):
+        '''
+        Rows of (value, percentile, total count, 1 / (1 - percentile)) at percentiles that
+        halve the distance to 100 each step, as in HdrHistogram's percentile output.
+        '''
+        rows = []
+        percentile = 0.0
+        while self.total:
+            value = self.value_at(percentile)
+            count = sum(count for bucket, count in self.buckets() if bucket <= value)
+            rows.append((value, percentile, count, 1 / (1 - percentile / 100)))
+            if count >= self.total:
+                break
+            percentile = 100 - (100 - percentile) / 2 if percentile else 50.0
+        return rows
+
+
+class LoadState:
+    # receipt bodies to post, ids returned so far, and what every request came to
+
+    def __init__(self, bodies, weights, seed):
+        self.rng = random.Random(seed)
+        self.bodies = bodies
+        self.next_body = 0
+        self.operations = list(weights)
+        self.cumulative_weights = []
+        for weight in weights.values():
+            self.cumulative_weights.append(weight + (self.cumulative_weights[-1] if self.cumulative_weights else 0))
+        self.ids = []
+        self.latencies = defaultdict(LatencyHistogram)
+        self.outcomes = defaultdict(Counter)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def choose_operation(self):
+        return self.rng.choices(self.operations, cum_weights=self.cumulative_weights)[0]
+
+    def body(self):
+        body = self.bodies[self.next_body % len(self.bodies)]
+        self.next_body += 1
+        return body
+
+    def remember(self, identifier):
+        # past MAX_IDS a random earlier id is replaced, keeping memory flat on long runs
+        if len(self.ids) < MAX_IDS:
+            self.ids.append(identifier)
+        else:
+            self.ids[self.rng.randrange(MAX_IDS)] = identifier
+
+    def known_id(self):
+        return self.rng.choice(self.ids) if self.ids else receipt_id
+
+    def record(self, operation, outcome, seconds):
+        self.outcomes[operation][outcome] += 1
+        if outcome == '200':
+            self.latencies[operation].record(seconds)
+
+
+async def process(http, state):
+    response = await http.post('/receipts/process', content=state.body(), headers=JSON_HEADERS)
+    if response.status_code == 200:
+        state.remember(response.json()['id'])
+    return response
+
+
+async def points(http, state):
+    return await http.get(f'/receipts/{state.known_id()}/points')
+
+
+async def bulk_points(http, state):
+    return await http.post('/receipts/points', json={'ids': [state.known_id() for _ in range(BULK_SIZE)]})
+
+
+operation_functions = {
+    'process': process,
+    'points': points,
+    'bulk_points': bulk_points
+}
+
+
+async def send(http, state, operation, started):
+    # started is when the request was due, which open loop callers set to the schedule
+    import httpx
+
+    state.in_flight += 1
+    state.max_in_flight = max(state.max_in_flight, state.in_flight)
+    try:
+        response = await operation_functions[operation](http, state)
+        outcome = str(response.status_code)
+    except httpx.HTTPError as error:
+        outcome = type(error).__name__
+    finally:
+        state.in_flight -= 1
+    state.record(operation, outcome, time.perf_counter() - started)
+
+
+async def open_loop(http, state, rate, duration):
+    # requests leave on a fixed schedule whether or not earlier ones have finished
+    tasks = set()
+    started = time.perf_counter()
+    for index in range(int(rate * duration)):
+        due = started + index / rate
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        task = asyncio.create_task(send(http, state, state.choose_operation(), due))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+
+
+async def closed_loop(http, state, concurrency, duration):
+    # every client sends its next request as soon as its last one is answered
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            await send(http, state, state.choose_operation(), time.perf_counter())
+
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+
+
+async def run_load(arguments, state):
+    import httpx
+
+    limits = httpx.Limits(max_connections=arguments.connections, max_keepalive_connections=arguments.connections)
+    async with httpx.AsyncClient(base_url=arguments.base_url, limits=limits, timeout=arguments.timeout) as http:
+        # ids for points requests to ask about, not counted in the results
+        for _ in range(arguments.prefill):
+            await process(http, state)
+
+        started = time.perf_counter()
+        if arguments.mode == 'open':
+            await open_loop(http, state, arguments.rate, arguments.duration)
+        else:
+            await closed_loop(http, state, arguments.concurrency, arguments.duration)
+        return time.perf_counter() - started
+
+
+def parse_mix(text):
+    # 'process=20,points=80' to {'process': 20.0, 'points': 80.0}
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in operation_functions:
+            raise argparse.ArgumentTypeError(f'Unknown operation {name!r}, expected one of {", ".join(OPERATIONS)}')
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'Weight for {name} must be a number, got {weight!r}')
+        if weights[name] < 0:
+            raise argparse.ArgumentTypeError(f'Weight for {name} must not be negative')
+    if not sum(weights.values()):
+        raise argparse.ArgumentTypeError('At least one operation needs a positive weight')
+    return weights
+
+
+def milliseconds(microseconds):
+    return f'{microseconds / 1000:.2f}'
+
+
+def print_table(header, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(cell).rjust(width) for cell, width in zip(row, widths)))
+
+
+def report(state, elapsed, show_histogram):
+    operations = [operation for operation in OPERATIONS if operation in state.outcomes]
+    overall = LatencyHistogram()
+    for operation in operations:
+        overall.merge(state.latencies[operation])
+
+    rows = []
+    for operation, latencies in [(operation, state.latencies[operation]) for operation in operations] + \
+            [('all', overall)]:
+        outcomes = state.outcomes[operation] if operation != 'all' else \
+            sum((state.outcomes[name] for name in operations), Counter())
+        requests = sum(outcomes.values())
+        errors = requests - outcomes['200']
+        rows.append([operation, requests, f'{requests / elapsed:,.1f}', errors] +
+                    [milliseconds(latencies.value_at(percentile)) for percentile in (50, 90, 99, 99.9)] +
+                    [milliseconds(latencies.maximum)])
+    print_table(['operation', 'requests', 'requests/s', 'errors', 'p50 ms', 'p90 ms', 'p99 ms', 'p99.9 ms', 'max ms'],
+                rows)
+    print(f'{elapsed:.1f}s, at most {state.max_in_flight} requests in flight, latencies from 200 responses only')
+
+    errors = [[operation, outcome, count] for operation in operations
+              for outcome, count in sorted(state.outcomes[operation].items()) if outcome != '200']
+    if errors:
+        print()
+        print_table(['operation', 'outcome', 'count'], errors)
+
+    if show_histogram:
+        for operation, latencies in [(operation, state.latencies[operation]) for operation in operations]:
+            print(f'\n{operation}')
+            print_table(['value ms', 'percentile', 'total count', '1/(1-percentile)'],
+                        [[milliseconds(value), f'{percentile:.6f}', count,
+                          f'{inverse:,.2f}' if percentile < 100 else 'inf']
+                         for value, percentile, count, inverse in latencies.percentile_distribution()])
+
+
+def results_json(state, elapsed, arguments):
+    return {
+        'parameters': {key: value for key, value in vars(arguments).items() if key != 'output'},
+        'elapsed_seconds': elapsed,
+        'max_in_flight': state.max_in_flight,
+        'operations': {
+            operation: {
+                'outcomes': dict(state.outcomes[operation]),
+                'requests_per_second': sum(state.outcomes[operation].values()) / elapsed,
+                'latency_ms': {str(percentile): state.latencies[operation].value_at(percentile) / 1000
+                               for percentile in (50, 90, 99, 99.9, 99.99, 100)}
+            }
+            for operation in OPERATIONS if operation in state.outcomes
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Receipt processor load generator')
+    parser.add_argument('--base-url', default=base_url)
+    parser.add_argument('--mode', choices=['open', 'closed'], default='open',
+                        help='open sends at --rate, closed keeps --concurrency requests outstanding')
+    parser.add_argument('--rate', type=float, default=100, help='requests per second in open mode')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients in closed mode')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to send for')
+    parser.add_argument('--mix', type=parse_mix, default='process=20,points=80',
+                        help=f'operation weights, from {", ".join(OPERATIONS)}')
+    parser.add_argument('--connections', type=int, default=64, help='connection pool size')
+    parser.add_argument('--timeout', type=float, default=10, help='seconds before a request fails')
+    parser.add_argument('--prefill', type=int, default=100, help='receipts to process before the run')
+    parser.add_argument('--receipts', type=int, default=1000,
+                        help='distinct synthetic receipts to post, posted again in turn once all were sent, '
+                             'the server answers repeats from its dedup index unless DEDUP_POLICY=off')
+    parser.add_argument('--invalid-ratio', type=float, default=0.0, help='share of receipts that fail validation')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--histogram', action='store_true', help='print the full latency distribution')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    arguments = parser.parse_args()
+    if arguments.rate <= 0 or arguments.concurrency < 1 or arguments.duration <= 0:
+        parser.error('--rate and --duration must be positive and --concurrency at least 1')
+
+    bodies = [json.dumps(receipt).encode() for receipt in
+              generate_receipts(arguments.receipts, seed=arguments.seed, invalid_ratio=arguments.invalid_ratio)]
+    state = LoadState(bodies, arguments.mix, arguments.seed)
+    elapsed = asyncio.run(run_load(arguments, state))
+
+    report(state, elapsed, arguments.histogram)
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            json.dump(results_json(state, elapsed, arguments), output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+import json
+import requests
+from samples.config import base_url
+
+with open('samples/rules_holiday.json') as rules_file:
+    rules = json.load(rules_file)
+
+response = requests.post(f'{base_url}/rules/reload', json=rules)
+
+print(response.text)
+print(response.status_code)
+
+response = requests.get(f'{base_url}/rules/current/stats')
+
+print(response.text)
+print(response.status_code)
@@ -0,0 +1,127 @@
+from app.handlers import aggregates
+from app.handlers.aggregates import (Totals, PointsAggregates, Rebuild, configure_aggregates, expect_receipts,
+                                     record_receipts, forget_receipts, rebuild_chunk, summarize)
+from app.handlers.rules import DEFAULT_RULES, configure_rules, current_rules, reload_rules
+from app.handlers.utils import build_receipt_record
+from app.storage import MemoryStore
+
+import unittest
+
+
+def make_record(retailer, purchase_date, total):
+    return build_receipt_record({
+        'retailer': retailer,
+        'purchaseDate': purchase_date,
+        'purchaseTime': '14:33',
+        'items': [{'shortDescription': 'Gatorade', 'price': total}],
+        'total': total
+    })
+
+
+def wait_for_rebuild():
+    while aggregates.rebuild is not None:
+        aggregates.rebuild.thread.join()
+
+
+class TestTotals(unittest.TestCase):
+
+    def test_add_and_merge(self):
+        first = Totals()
+        first.add(10, 250)
+        first.add(4, 1000)
+        second = Totals()
+        second.add(20, 125)
+        first.merge(second)
+        assert first.to_dict() == {
+            'count': 3,
+            'points': {'sum': 34, 'min': 4, 'max': 20, 'average': 11.33},
+            'total': {'sum': '13.75', 'min': '1.25', 'max': '10.00', 'average': '4.58'}
+        }
+        assert Totals().to_dict() == {'count': 0, 'points': None, 'total': None}
+
+
+class TestPointsAggregates(unittest.TestCase):
+
+    def setUp(self):
+        configure_rules(None)
+        self.aggregates = PointsAggregates(DEFAULT_RULES['version'])
+        for retailer, purchase_date, total in [('Target', '2022-01-01', '1.00'), (' target ', '2022-01-02', '2.00'),
+                                               ('Walgreens', '2022-01-01', '3.00')]:
+            self.aggregates.add(make_record(retailer, purchase_date, total))
+
+    def counts(self, group, **query):
+        return [(name, day, totals.count) for name, day, totals in self.aggregates.groups(group, **query)]
+
+    def test_groups(self):
+        assert self.counts('retailer') == [('Target', None, 2), ('Walgreens', None, 1)]
+        assert self.counts('date') == [(None, 20220101, 2), (None, 20220102, 1)]
+        assert self.counts('retailer_date') == [('Target', 20220101, 1), ('Target', 20220102, 1),
+                                                ('Walgreens', 20220101, 1)]
+
+    def test_filters(self):
+        assert self.counts('retailer', start=20220102) == [('Target', None, 1)]
+        assert self.counts('date', retailer='TARGET') == [(None, 20220101, 1), (None, 20220102, 1)]
+        assert self.counts('date', retailer='nobody') == []
+        assert self.counts('retailer_date', end=20220101) == [('Target', 20220101, 1), ('Walgreens', 20220101, 1)]
+
+
+class TestMaintainedAggregates(unittest.TestCase):
+
+    def setUp(self):
+        configure_rules(None)
+        self.store = MemoryStore()
+        self.store.put('stored', make_record('Target', '2022-01-01', '1.00'))
+        configure_aggregates(self.store)
+        wait_for_rebuild()
+
+    def tearDown(self):
+        configure_aggregates(None)
+        configure_rules(None)
+
+    def ingest(self, receipt_id, record):
+        expect_receipts((receipt_id,))
+        self.store.put(receipt_id, record)
+        record_receipts({receipt_id: record})
+
+    def test_built_from_store_and_updated_at_ingest(self):
+        self.ingest('new', make_record('Target', '2022-01-02', '2.00'))
+        summary = summarize('retailer')
+        assert summary['rebuilding'] is False
+        assert summary['groups'][0]['count'] == 2
+        assert summary['overall']['total']['sum'] == '3.00'
+
+    def test_rebuilt_when_rules_change(self):
+        before = summarize('retailer')['overall']['points']['sum']
+        reload_rules({'name': 'promotion', 'version': 2, 'rules': DEFAULT_RULES['rules'] + [
+            {'name': 'promotion', 'kind': 'total_at_least', 'cents': 0, 'points': 1000}]})
+        self.ingest('new', make_record('Target', '2022-01-02', '2.00'))
+        wait_for_rebuild()
+        summary = summarize('retailer')
+        assert summary['rules_version'] == 2
+        assert summary['overall']['count'] == 2
+        assert summary['overall']['points']['min'] >= 1000
+        assert summary['overall']['points']['sum'] > before + 2000
+        # writing rescored receipts back is left to the rescorer
+        assert self.store.get('stored').rules_version == DEFAULT_RULES['version']
+
+    def test_receipts_being_stored_are_counted_once(self):
+        # a scan reaching a receipt between its put and record_receipts leaves it to them
+        target = Rebuild(current_rules())
+        expect_receipts(('new', 'failed'))
+        record = make_record('Target', '2022-01-02', '2.00')
+        self.store.put('new', record)
+        rebuild_chunk(target, [('stored', self.store.get('stored')), ('new', record)])
+        assert len(target.aggregates) == 1
+        record_receipts({'new': record})
+        forget_receipts(('failed',))
+        assert summarize('retailer')['overall']['count'] == 2
+        assert not aggregates.pending
+        reload_rules(dict(DEFAULT_RULES, version=2))
+        summarize('retailer')
+        wait_for_rebuild()
+        assert summarize('retailer')['overall']['count'] == 2
+
+    def test_not_kept_without_store(self):
+        configure_aggregates(None)
+        record_receipts({'ignored': make_record('Target', '2022-01-01', '1.00')})
+        assert summarize('retailer') is None
@@ -0,0 +1,46 @@
+from app.handlers.batch_scoring import np, score_records
+from app.handlers.records import ReceiptRecord
+from app.handlers.utils import determine_points
+
+import random
+import unittest
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestBatchScoring(unittest.TestCase):
+
+    def make_receipts(self, count):
+        generator = random.Random(11)
+        words = ['Gatorade', 'Pepsi - 12-oz', '   Klarbrunn 12-PK  ', 'ab', 'Emils Cheese Pizza', 'Café Olé', ' abc ', '   ']
+        receipts = []
+        for _ in range(count):
+            receipts.append({
+                "retailer": generator.choice(words + ['M&M Corner Market', 'Ünïcode 7']),
+                "purchaseDate": f"{generator.randint(1999, 2030)}-{generator.randint(1, 12):02d}-{generator.randint(1, 31):02d}",
+                "purchaseTime": f"{generator.randint(0, 23)}:{generator.randint(0, 59):02d}",
+                "items": [
+                    {"shortDescription": generator.choice(words),
+                     "price": f"{generator.randint(0, 40)}.{generator.choice([0, 25, 50, generator.randint(0, 99)]):02d}"}
+                    for _ in range(generator.randint(1, 7))
+                ],
+                "total": f"{generator.randint(0, 200)}.{generator.choice([0, 25, 50, 75, generator.randint(0, 99)]):02d}"
+            })
+        return receipts
+
+    def test_matches_determine_points(self):
+        receipts = self.make_receipts(3000)
+        records = [ReceiptRecord.from_receipt(receipt) for receipt in receipts]
+        assert score_records(records) == [determine_points(receipt) for receipt in receipts]
+
+    def test_example_receipt(self):
+        receipt = {
+            "retailer": "M&M Corner Market",
+            "purchaseDate": "2022-03-20",
+            "purchaseTime": "14:33",
+            "items": [{"shortDescription": "Gatorade", "price": "2.25"}] * 4,
+            "total": "9.00"
+        }
+        assert score_records([ReceiptRecord.from_receipt(receipt)]) == [109]
+
+    def test_empty_batch(self):
+        assert score_records([]) == []
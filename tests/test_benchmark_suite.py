@@ -0,0 +1,50 @@
+from benchmarks.suite import compare
+
+import logging
+import unittest
+
+
+def results(**rates):
+    return {'ops_per_second': {name.replace('_', ' '): rate for name, rate in rates.items()}}
+
+
+class TestCompare(unittest.TestCase):
+
+    baseline = results(micro_validate=1000.0, micro_score=2000.0, e2e_process=500.0)
+
+    def test_regressions_past_threshold(self):
+        current = results(micro_validate=899.0, micro_score=2500.0, e2e_process=450.0)
+        rows, regressions = compare(current, self.baseline, 0.1)
+        assert regressions == ['micro validate']
+        assert rows == [
+            ['micro validate', '1,000', '899', '-10.1%', 'REGRESSED'],
+            ['micro score', '2,000', '2,500', '+25.0%', ''],
+            ['e2e process', '500', '450', '-10.0%', '']
+        ]
+
+    def test_threshold(self):
+        current = results(micro_validate=950.0, micro_score=2000.0, e2e_process=500.0)
+        assert compare(current, self.baseline, 0.1)[1] == []
+        assert compare(current, self.baseline, 0.01)[1] == ['micro validate']
+        assert compare(current, self.baseline, 0.0)[1] == ['micro validate']
+
+    def test_new_and_missing_benchmarks(self):
+        current = results(micro_validate=1000.0, micro_new=5.0)
+        rows, regressions = compare(current, self.baseline, 0.1)
+        assert regressions == ['micro score', 'e2e process']
+        assert rows == [
+            ['micro validate', '1,000', '1,000', '+0.0%', ''],
+            ['micro new', '-', '5', '', 'new'],
+            ['micro score', '2,000', '-', '', 'MISSING'],
+            ['e2e process', '500', '-', '', 'MISSING']
+        ]
+
+    def test_allow_missing(self):
+        current = results(micro_validate=1000.0, micro_score=2000.0)
+        rows, regressions = compare(current, self.baseline, 0.1, allow_missing=True)
+        assert regressions == []
+        assert rows[-1] == ['e2e process', '500', '-', '', 'missing']
+
+    def test_import_leaves_logging_enabled(self):
+        # benchmarks only drop log records when run as scripts
+        assert logging.root.manager.disable == logging.NOTSET
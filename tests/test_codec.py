@@ -0,0 +1,61 @@
+from app.handlers.codec import decode_receipt, dumps
+from app.handlers.utils import find_receipt_error, build_receipt_record
+
+import json
+import unittest
+
+
+class TestDecodeReceipt(unittest.TestCase):
+
+    receipt = {
+        "retailer": "M&M Corner Market",
+        "purchaseDate": "2022-03-21",
+        "purchaseTime": "14:33",
+        "items": [
+            {"shortDescription": "Gatorade", "price": "2.25"},
+            {"shortDescription": "   Klarbrunn 12-PK 12 FL OZ  ", "price": "12.00"}
+        ],
+        "total": "14.25"
+    }
+
+    def variants(self):
+        # one valid receipt plus one invalid variant per rule, including several at once
+        yield self.receipt
+        for field in self.receipt:
+            yield {key: value for key, value in self.receipt.items() if key != field}
+            for value in [None, '', 5, [], {}, ';', '1.5', '25:00', '2022-13-01', 'x' * 3]:
+                yield dict(self.receipt, **{field: value})
+        for item in [None, 'item', {}, {"shortDescription": "Gatorade"},
+                     {"shortDescription": ";", "price": "2.25"}, {"shortDescription": "Gatorade", "price": "2"}]:
+            yield dict(self.receipt, items=[self.receipt['items'][0], item])
+        yield dict(self.receipt, retailer=';', purchaseDate='bad', items='none')
+        for document in [[], 'receipt', 5, None]:
+            yield document
+
+    def test_matches_validate_then_build(self):
+        for receipt in self.variants():
+            record, error = decode_receipt(json.dumps(receipt).encode())
+            assert error == find_receipt_error(receipt), receipt
+            if error is None:
+                assert record == build_receipt_record(receipt)
+            else:
+                assert record is None
+
+    def test_accepts_str(self):
+        record, error = decode_receipt(json.dumps(self.receipt))
+        assert error is None
+        assert record.points == build_receipt_record(self.receipt).points
+
+    def test_malformed_json(self):
+        for body in [b'', b'{"retailer": ', b'not json']:
+            with self.assertRaises(ValueError):
+                decode_receipt(body)
+
+
+class TestDumps(unittest.TestCase):
+
+    def test_matches_json_response_rendering(self):
+        for document in [{'id': '7fb1377b-b223-49d9-a31a-5a02701dd310'}, {'points': 109},
+                         {'points': {'a': 1}, 'missing': ['b', 'é']}]:
+            expected = json.dumps(document, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+            assert dumps(document) == expected.encode()
@@ -0,0 +1,93 @@
+from app.handlers import dedup
+from app.handlers.codec import decode_receipt
+
+import json
+import unittest
+from unittest import mock
+
+
+class TestReceiptDigest(unittest.TestCase):
+
+    receipt = {
+        "retailer": "M&M Corner Market",
+        "purchaseDate": "2022-03-21",
+        "purchaseTime": "14:33",
+        "items": [
+            {"shortDescription": "Gatorade", "price": "2.25"},
+            {"shortDescription": "Klarbrunn 12-PK 12 FL OZ", "price": "12.00"}
+        ],
+        "total": "14.25"
+    }
+
+    def digest(self, body):
+        record, error = decode_receipt(body, score=False)
+        assert error is None
+        return dedup.receipt_digest(record)
+
+    def test_ignores_layout(self):
+        compact = json.dumps(self.receipt, separators=(',', ':')).encode()
+        reordered = json.dumps(dict(reversed(list(self.receipt.items()))), indent=4).encode()
+        padded = json.dumps(dict(self.receipt, retailer='  M&M Corner Market ', items=[
+            {"price": "2.25", "shortDescription": " Gatorade"},
+            {"shortDescription": "Klarbrunn 12-PK 12 FL OZ  ", "price": "12.00"}
+        ])).encode()
+        assert self.digest(compact) == self.digest(reordered) == self.digest(padded)
+
+    def test_content_changes_digest(self):
+        original = self.digest(json.dumps(self.receipt).encode())
+        for change in [{'total': '14.26'}, {'purchaseTime': '14:34'}, {'retailer': 'M&M  Corner Market'},
+                       {'items': list(reversed(self.receipt['items']))},
+                       {'items': [self.receipt['items'][0], dict(self.receipt['items'][1], price='12.01')]}]:
+            assert self.digest(json.dumps(dict(self.receipt, **change)).encode()) != original, change
+
+
+class TestDedupIndex(unittest.TestCase):
+
+    def tearDown(self):
+        dedup.configure_dedup()
+
+    def test_claim(self):
+        index = dedup.DedupIndex(60.0, 10)
+        assert index.claim(b'a', 'first') is None
+        assert index.claim(b'a', 'second') == 'first'
+        assert index.claim(b'b', 'third') is None
+        assert len(index) == 2
+
+    def test_window(self):
+        index = dedup.DedupIndex(60.0, 10)
+        with mock.patch('time.monotonic', return_value=100.0):
+            index.claim(b'a', 'first')
+        with mock.patch('time.monotonic', return_value=159.0):
+            assert index.claim(b'a', 'second') == 'first'
+        with mock.patch('time.monotonic', return_value=161.0):
+            assert index.claim(b'a', 'third') is None
+        assert len(index) == 1
+
+    def test_max_entries(self):
+        index = dedup.DedupIndex(60.0, 3)
+        for key in [b'a', b'b', b'c', b'd']:
+            index.claim(key, key.decode())
+        assert len(index) == 3
+        assert index.claim(b'a', 'again') is None
+        assert index.claim(b'd', 'again') == 'd'
+
+    def test_release(self):
+        index = dedup.DedupIndex(60.0, 10)
+        index.claim(b'a', 'first')
+        index.release(b'a', 'other')
+        assert index.claim(b'a', 'second') == 'first'
+        index.release(b'a', 'first')
+        assert index.claim(b'a', 'second') is None
+
+    def test_policy_off(self):
+        record, _ = decode_receipt(json.dumps(TestReceiptDigest.receipt).encode(), score=False)
+        dedup.configure_dedup('off')
+        assert dedup.find_duplicate(record, 'first') is None
+        assert dedup.find_duplicate(record, 'second') is None
+        dedup.configure_dedup('return')
+        assert dedup.find_duplicate(record, 'first') is None
+        assert dedup.find_duplicate(record, 'second') == 'first'
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            dedup.configure_dedup('ignore')
@@ -0,0 +1,56 @@
+from app.executor import BoundedExecutor, ExecutorSaturated
+
+import asyncio
+import operator
+import threading
+import unittest
+
+
+class TestBoundedExecutor(unittest.IsolatedAsyncioTestCase):
+
+    def make(self, mode, **kwargs):
+        executor = BoundedExecutor(mode, **kwargs)
+        self.addCleanup(executor.shutdown)
+        return executor
+
+    async def test_inline_runs_on_the_calling_thread(self):
+        timings = {}
+        result = await self.make('inline').run(threading.get_ident, timings=timings)
+        assert result == threading.get_ident()
+        assert timings['queued'] == 0.0
+        assert timings['handler'] >= 0.0
+
+    async def test_thread_runs_off_the_event_loop(self):
+        timings = {}
+        result = await self.make('thread', workers=2).run(threading.get_ident, timings=timings)
+        assert result != threading.get_ident()
+        assert set(timings) == {'queued', 'handler'}
+
+    async def test_process_pool(self):
+        assert await self.make('process', workers=1).run(operator.add, 2, 3) == 5
+
+    async def test_errors_are_raised_to_the_caller(self):
+        for mode in ['inline', 'thread']:
+            with self.assertRaises(ZeroDivisionError):
+                await self.make(mode).run(operator.truediv, 1, 0)
+
+    async def test_saturated_calls_are_rejected(self):
+        executor = self.make('thread', workers=1, queue_size=1)
+        release = threading.Event()
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with self.assertRaises(ExecutorSaturated):
+            await executor.run(release.wait)
+        assert executor.rejected == 1
+
+        release.set()
+        await asyncio.gather(*running)
+        # the slots are released on the event loop once the calls finish
+        await asyncio.sleep(0)
+        assert executor.in_flight == 0
+        assert await executor.run(operator.add, 1, 1) == 2
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            BoundedExecutor('fibers')
@@ -0,0 +1,257 @@
+import os
+import sys
+
+# handlers import their siblings the way the app runs them, from inside app/, so the
+# modules they configure are imported the same way here
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app'))
+
+from fastapi import HTTPException
+from handlers import aggregates, dedup
+from handlers.codec import dumps
+from handlers.get.receipts_query import ReceiptsQueryHandler
+from handlers.post.receipts_points_bulk import ReceiptsPointsBulkHandler, STREAM_CHUNK_SIZE
+from handlers.post.receipts_process import ReceiptsProcessHandler
+from handlers.post.receipts_process_batch import ReceiptsProcessBatchHandler
+from handlers.post.rules_reload import RulesReloadHandler, configure_rules_reload
+from handlers.rules import DEFAULT_RULES, configure_rules, current_rules
+from handlers.streaming import MAX_DOCUMENT_BYTES
+from handlers.utils import build_receipt_record
+from config import BULK_POINTS_STREAM_THRESHOLD
+from storage import BoundedStore, IndexedStore, MemoryStore
+
+import json
+import asyncio
+import sqlite3
+import unittest
+from unittest import mock
+
+RECEIPT = {
+    'retailer': 'Target',
+    'purchaseDate': '2022-01-01',
+    'purchaseTime': '13:01',
+    'items': [{'shortDescription': 'Mountain Dew 12PK', 'price': '6.49'}],
+    'total': '6.49'
+}
+
+
+def stream(*chunks):
+    async def body():
+        for chunk in chunks:
+            yield chunk
+    return body()
+
+
+def streamed_lines(handler):
+    # the decoded NDJSON lines of a batch handler's streamed response
+    async def collect():
+        return [chunk async for chunk in handler.results]
+    return [json.loads(line) for chunk in asyncio.run(collect()) for line in chunk.decode().splitlines()]
+
+
+def wait_for_rebuild():
+    while aggregates.rebuild is not None:
+        aggregates.rebuild.thread.join()
+
+
+class TestReceiptsProcess(unittest.TestCase):
+
+    def setUp(self):
+        configure_rules(None)
+        dedup.configure_dedup('return')
+        self.store = MemoryStore()
+        aggregates.configure_aggregates(self.store)
+        wait_for_rebuild()
+
+    def tearDown(self):
+        aggregates.configure_aggregates(None)
+        dedup.configure_dedup()
+
+    def process(self):
+        return ReceiptsProcessHandler('receipts', 'process', self.store, None, json.dumps(RECEIPT).encode()).results
+
+    def counted(self):
+        return aggregates.summarize('retailer')['overall']['count']
+
+    def test_duplicate_answered_with_first_id(self):
+        first = self.process()['id']
+        assert self.process()['id'] == first
+        assert len(self.store) == 1
+        assert self.counted() == 1
+
+    def test_dropped_receipt_is_stored_again(self):
+        store = BoundedStore(max_entries=1)
+        store.on_drop(dedup.forget_dropped)
+        first = ReceiptsProcessHandler('receipts', 'process', store, None, json.dumps(RECEIPT).encode()).results['id']
+        ReceiptsProcessHandler('receipts', 'process', store, None,
+                               json.dumps({**RECEIPT, 'retailer': 'Walgreens'}).encode())
+        assert store.get(first) is None
+        again = ReceiptsProcessHandler('receipts', 'process', store, None, json.dumps(RECEIPT).encode()).results['id']
+        assert again != first
+        assert store.get(again) is not None
+
+    def test_failed_put_is_not_claimed_or_counted(self):
+        with mock.patch.object(self.store, 'put', side_effect=sqlite3.OperationalError('disk I/O error')):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.process()
+        assert self.counted() == 0
+        receipt_id = self.process()['id']
+        assert self.store.get(receipt_id) is not None
+        assert self.counted() == 1
+
+    def test_failed_batch_put_is_not_claimed_or_counted(self):
+        body = json.dumps(RECEIPT).encode() + b'\n'
+        handler = ReceiptsProcessBatchHandler('receipts', 'process/batch', self.store, None, stream(body))
+        with mock.patch.object(self.store, 'put_many', side_effect=sqlite3.OperationalError('disk I/O error')):
+            with self.assertRaises(sqlite3.OperationalError):
+                streamed_lines(handler)
+        assert self.counted() == 0
+        handler = ReceiptsProcessBatchHandler('receipts', 'process/batch', self.store, None, stream(body))
+        [line] = streamed_lines(handler)
+        assert self.store.get(line['id']) is not None
+        assert self.counted() == 1
+
+    def test_invalid_receipt(self):
+        with self.assertRaises(HTTPException) as raised:
+            ReceiptsProcessHandler('receipts', 'process', self.store, None, b'{"retailer": "Target"}')
+        assert raised.exception.status_code == 400
+
+
+class TestReceiptsProcessBatch(unittest.TestCase):
+
+    def setUp(self):
+        configure_rules(None)
+        dedup.configure_dedup('off')
+        self.store = MemoryStore()
+
+    def tearDown(self):
+        dedup.configure_dedup()
+
+    def process(self, *chunks):
+        return streamed_lines(ReceiptsProcessBatchHandler('receipts', 'process/batch', self.store, None, stream(*chunks)))
+
+    def test_malformed_array_element(self):
+        receipt = json.dumps(RECEIPT).encode()
+        # more than MAX_DOCUMENT_BYTES follow, the element is reported as soon as it's complete
+        following = [receipt + b','] * (MAX_DOCUMENT_BYTES // len(receipt) + 1)
+        lines = self.process(b'[' + receipt + b',', b'{"retailer" "Target"},', *following, receipt + b']')
+        assert [line.get('error') for line in lines] == [None, 'Malformed JSON']
+        assert len(self.store) == 1
+
+    def test_out_of_range_price(self):
+        huge = dict(RECEIPT, items=[{'shortDescription': 'Gold', 'price': '100000000000000000000.00'}])
+        lines = self.process(json.dumps(huge).encode() + b'\n' + json.dumps(RECEIPT).encode() + b'\n')
+        assert lines[0] == {'line': 1, 'error': 'The receipt is invalid', 'field': 'items[0]'}
+        assert 'id' in lines[1]
+        assert len(self.store) == 1
+
+    def test_lines_are_compact(self):
+        handler = ReceiptsProcessBatchHandler('receipts', 'process/batch', self.store, None,
+                                              stream(json.dumps(RECEIPT).encode() + b'\n{}\n'))
+        async def collect():
+            return [chunk async for chunk in handler.results]
+        [body] = asyncio.run(collect())
+        [receipt_id] = [receipt_id for receipt_id, _ in self.store.iterate()]
+        assert body == (dumps({'line': 1, 'id': receipt_id}) + b'\n'
+                        + dumps({'line': 2, 'error': 'The receipt is invalid', 'field': 'retailer'}) + b'\n')
+
+    def test_oversized_array_element(self):
+        receipt = json.dumps(RECEIPT).encode()
+        padding = [b' ' * 65536] * (MAX_DOCUMENT_BYTES // 65536 + 1)
+        lines = self.process(b'[' + receipt + b', {"retailer": ', *padding, b'"Target"}, ' + receipt + b']')
+        assert [line.get('error') for line in lines] == [None, 'Document too large']
+        assert len(self.store) == 1
+
+
+class TestReceiptsQuery(unittest.TestCase):
+
+    def setUp(self):
+        configure_rules(None)
+
+    def query(self, store):
+        store.put('stored', build_receipt_record(RECEIPT))
+        return ReceiptsQueryHandler('receipts', 'query', store, None, {'retailer': 'target'}).results
+
+    def test_indexed_store(self):
+        results = self.query(IndexedStore(MemoryStore(), lambda record: (record.retailer, record.purchase_date)))
+        assert [receipt['id'] for receipt in results['receipts']] == ['stored']
+
+    def test_unindexed_store(self):
+        with self.assertRaises(HTTPException) as raised:
+            self.query(MemoryStore())
+        assert raised.exception.status_code == 501
+
+
+class TestReceiptsPointsBulk(unittest.TestCase):
+
+    def setUp(self):
+        configure_rules(None)
+        self.store = MemoryStore()
+        record = build_receipt_record(RECEIPT)
+        self.points = record.points
+        self.store.put_many({f'stored-{index}': record for index in range(BULK_POINTS_STREAM_THRESHOLD)})
+
+    def bulk(self, body):
+        return ReceiptsPointsBulkHandler('receipts', 'points/bulk', self.store, None, body).results
+
+    def test_unknown_ids(self):
+        results = self.bulk({'ids': ['stored-0', 'unknown', 'stored-1']})
+        assert results == {'points': {'stored-0': self.points, 'stored-1': self.points}, 'missing': ['unknown']}
+
+    def test_empty_input(self):
+        assert self.bulk({'ids': []}) == {'points': {}, 'missing': []}
+        assert self.bulk([]) == {'points': {}, 'missing': []}
+
+    def test_invalid_input(self):
+        for body in [{'ids': 'stored-0'}, {'ids': [1]}, 'stored-0', None]:
+            with self.assertRaises(HTTPException) as raised:
+                self.bulk(body)
+            assert raised.exception.status_code == 400
+
+    def test_large_input_is_streamed_compact(self):
+        ids = [f'stored-{index}' for index in range(BULK_POINTS_STREAM_THRESHOLD)]
+        ids[STREAM_CHUNK_SIZE:STREAM_CHUNK_SIZE * 2] = [f'unknown-{index}' for index in range(STREAM_CHUNK_SIZE)]
+        ids.append('unknown-\u00e9')
+        body = b''.join(self.bulk({'ids': ids}))
+        points = {receipt_id: self.points for receipt_id in ids if receipt_id.startswith('stored-')}
+        missing = [receipt_id for receipt_id in ids if not receipt_id.startswith('stored-')]
+        assert json.loads(body) == {'points': points, 'missing': missing}
+        # the same bytes as the document rendered whole, like the other JSON responses
+        assert body == dumps({'points': points, 'missing': missing})
+
+    def test_large_input_of_unknown_ids(self):
+        ids = [f'unknown-{index}' for index in range(BULK_POINTS_STREAM_THRESHOLD + 1)]
+        body = b''.join(self.bulk(ids))
+        assert body == dumps({'points': {}, 'missing': ids})
+
+
+class TestRulesReload(unittest.TestCase):
+
+    promotion = dict(DEFAULT_RULES, version=2)
+
+    def setUp(self):
+        configure_rules(None)
+
+    def tearDown(self):
+        configure_rules_reload()
+        configure_rules(None)
+
+    def reload(self):
+        return RulesReloadHandler('rules', 'reload', MemoryStore(), None, self.promotion).results
+
+    def assert_refused(self, status_code):
+        with self.assertRaises(HTTPException) as raised:
+            self.reload()
+        assert raised.exception.status_code == status_code
+        assert current_rules().version == DEFAULT_RULES['version']
+
+    def test_disabled_by_default(self):
+        self.assert_refused(403)
+
+    def test_refused_where_other_processes_score(self):
+        configure_rules_reload(True, 'with HANDLER_EXECUTOR=process')
+        self.assert_refused(409)
+
+    def test_enabled(self):
+        configure_rules_reload(True)
+        assert self.reload()['version'] == 2
+        assert current_rules().version == 2
@@ -0,0 +1,54 @@
+from samples.load import LatencyHistogram
+
+import math
+import random
+import unittest
+
+
+def histogram(microseconds):
+    recorded = LatencyHistogram()
+    for value in microseconds:
+        recorded.record(value / 1000000)
+    return recorded
+
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_empty(self):
+        assert LatencyHistogram().value_at(99) == 0
+        assert LatencyHistogram().percentile_distribution() == []
+
+    def test_exact_below_sub_buckets(self):
+        recorded = histogram(range(1, 101))
+        assert recorded.value_at(0) == 1
+        assert recorded.value_at(50) == 50
+        assert recorded.value_at(99) == 99
+        assert recorded.value_at(99.5) == 100
+        assert recorded.value_at(100) == 100
+
+    def test_microseconds_are_rounded(self):
+        recorded = histogram([3, 9, 17])
+        assert [value for value, _ in recorded.buckets()] == [3, 9, 17]
+
+    def test_relative_error_above_sub_buckets(self):
+        values = sorted(random.Random(0).randint(1, 10000000) for _ in range(10000))
+        recorded = histogram(values)
+        for percentile in (50, 90, 99, 99.9):
+            exact = values[math.ceil(len(values) * percentile / 100) - 1]
+            # the top of exact's bucket, within 1 / 2 ** (SUB_BUCKET_BITS - 1) above it
+            assert exact <= recorded.value_at(percentile) <= exact * (1 + 1 / 2 ** (LatencyHistogram.SUB_BUCKET_BITS - 1))
+        assert recorded.value_at(100) == values[-1]
+
+    def test_merge(self):
+        merged = histogram(range(1, 51))
+        merged.merge(histogram(range(51, 101)))
+        assert merged.total == 100
+        assert merged.maximum == 100
+        assert merged.value_at(50) == 50
+
+    def test_percentile_distribution(self):
+        rows = histogram(range(1, 101)).percentile_distribution()
+        assert [row[1] for row in rows[:3]] == [0.0, 50.0, 75.0]
+        assert rows[1][:3] == (50, 50.0, 50)
+        assert rows[-1][0] == 100
+        assert rows[-1][2] == 100
@@ -0,0 +1,55 @@
+from app import logs
+
+import io
+import queue
+import logging
+import unittest
+
+
+class TestLogs(unittest.TestCase):
+
+    def setUp(self):
+        root = logging.getLogger()
+        self.root_handlers = list(root.handlers)
+        self.root_level = root.level
+
+    def tearDown(self):
+        logs.stop_logging()
+        logs.debug_sample_rate = 0.0
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in self.root_handlers:
+            root.addHandler(handler)
+        root.setLevel(self.root_level)
+
+    def test_full_queue_drops(self):
+        handler = logs.DroppingQueueHandler(queue.Queue(maxsize=2))
+        for index in range(5):
+            handler.handle(logging.makeLogRecord({'msg': 'record %s', 'args': (index,)}))
+        assert handler.queue.qsize() == 2
+        assert handler.dropped == 3
+
+    def test_writes_in_background(self):
+        stream = io.StringIO()
+        logs.configure_logging('INFO', stream=stream)
+        logging.getLogger('test').info('stored: %s', 3)
+        logging.getLogger('test').debug('not written: %s', 4)
+        logs.log_request('GET /receipts/points', 'abc', 200, 0.0)
+        logs.stop_logging()
+
+        lines = stream.getvalue().splitlines()
+        assert lines[0] == 'INFO:test:stored: 3'
+        assert lines[1].startswith('INFO:receipts.access:route=GET /receipts/points id=abc outcome=200 duration_ms=')
+        assert len(lines) == 2
+
+    def test_sample_debug(self):
+        logger = logging.getLogger('test')
+        logs.configure_logging('INFO', sample_rate=1.0, stream=io.StringIO())
+        assert not logs.sample_debug(logger)
+
+        logs.configure_logging('DEBUG', sample_rate=1.0, stream=io.StringIO())
+        assert logs.sample_debug(logger)
+
+        logs.configure_logging('DEBUG', sample_rate=0.0, stream=io.StringIO())
+        assert not logs.sample_debug(logger)
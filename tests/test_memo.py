@@ -0,0 +1,70 @@
+from app.handlers.memo import Memo, configure_memos, memo_stats, memos
+from app.handlers.rules import DEFAULT_RULES, configure_rules, reload_rules, retailer_facts
+from app.handlers.utils import get_points_from_retailer, read_receipt, score_record
+
+import unittest
+
+
+class TestMemo(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.memo = Memo('test', self.square, size=2)
+
+    def tearDown(self):
+        memos.remove(self.memo)
+        configure_memos()
+        configure_rules()
+
+    def square(self, value):
+        self.calls.append(value)
+        if value < 0:
+            raise ValueError(value)
+        return value * value
+
+    def test_hits_misses_and_evictions(self):
+        for value in (1, 2, 1, 3, 2):
+            self.memo.lookup(value)
+        # 3 evicted 2, the least recently used, so 2 was computed again
+        assert self.calls == [1, 2, 3, 2]
+        stats = self.memo.stats()
+        assert (stats['hits'], stats['misses'], stats['evictions'], stats['entries']) == (1, 4, 2, 2)
+
+    def test_exceptions_are_not_memoized(self):
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.memo.lookup(-1)
+        assert self.calls == [-1, -1]
+
+    def test_size_zero_computes_every_call(self):
+        configure_memos(0)
+        self.memo.lookup(1)
+        self.memo.lookup(1)
+        assert self.calls == [1, 1]
+        assert self.memo.stats()['evictions'] == 0
+
+    def test_cleared_when_rules_change(self):
+        self.memo.lookup(1)
+        reload_rules(dict(DEFAULT_RULES, version=2))
+        assert self.memo.stats()['entries'] == 1
+
+        configure_memos(10, clear_on_reload=True)
+        self.memo.lookup(1)
+        reload_rules(dict(DEFAULT_RULES, version=3))
+        stats = self.memo.stats()
+        assert stats['entries'] == 0
+        assert stats['evictions'] == 0
+        self.memo.lookup(1)
+        assert self.calls == [1, 1, 1]
+
+    def test_scoring_memos(self):
+        configure_memos()
+        receipt = {'retailer': 'Target', 'purchaseDate': '2022-01-01', 'purchaseTime': '13:01', 'total': '35.35',
+                   'items': [{'shortDescription': 'Emils Cheese Pizza', 'price': '12.25'}] * 3}
+        first, second = (score_record(read_receipt(receipt, score=False)[0]) for _ in range(2))
+        assert first.points == second.points == 26
+        assert get_points_from_retailer('Target') == 6
+        # the compiled scorer looks the retailer up once per receipt
+        stats = retailer_facts.stats()
+        assert (stats['misses'], stats['hits']) == (1, 2)
+        assert 'retailer_facts' in {stats['name'] for stats in memo_stats()}
@@ -0,0 +1,77 @@
+from app import metrics
+from app.storage import MemoryStore
+
+import time
+import unittest
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.reset()
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+        # a value equal to a bound falls in that bound's bucket, like Prometheus' le
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.sum == 2.65
+
+    def test_render_requests(self):
+        started = time.perf_counter()
+        metrics.record_request('get', 'receipts', 'points', 200, started)
+        metrics.record_request('get', 'receipts', 'points', 404, started)
+        text = metrics.render()
+        assert 'receipt_requests_total{method="get",base="receipts",handler="points",status="404"} 1' in text
+        assert 'receipt_request_duration_seconds_bucket{method="get",base="receipts",handler="points",le="+Inf"} 2' \
+            in text
+        assert 'receipt_request_duration_seconds_count{method="get",base="receipts",handler="points"} 2' in text
+        assert text.count('# TYPE receipt_requests_total counter') == 1
+
+    def test_render_handler_counts(self):
+        metrics.record_validation_failure('total')
+        metrics.record_validation_failure('total')
+        metrics.record_points_lookup(False)
+        text = metrics.render()
+        assert 'receipt_validation_failures_total{field="total"} 2' in text
+        assert 'receipt_points_lookups_total{result="missing"} 1' in text
+        assert 'receipt_points_lookups_total{result="found"} 0' in text
+
+    def test_render_store(self):
+        store = MemoryStore()
+        store.put('a', {'points': 6})
+        text = metrics.render(store)
+        assert 'receipt_store_receipts 1' in text
+        assert 'receipt_store_bytes ' in text
+
+    def test_store_count_is_reused(self):
+        store = MemoryStore()
+        store.put('a', {'points': 6})
+        assert 'receipt_store_receipts 1' in metrics.render(store)
+        store.put('b', {'points': 6})
+        assert 'receipt_store_receipts 1' in metrics.render(store)
+        metrics.store_count[1] -= metrics.STORE_COUNT_SECONDS
+        assert 'receipt_store_receipts 2' in metrics.render(store)
+        other = MemoryStore()
+        assert 'receipt_store_receipts 0' in metrics.render(other)
+
+    def test_render_memos(self):
+        text = metrics.render(memos=[{'name': 'retailer_facts', 'size': 10, 'entries': 4, 'hits': 7, 'misses': 5,
+                                      'evictions': 1}])
+        assert 'receipt_memo_entries{memo="retailer_facts"} 4' in text
+        assert 'receipt_memo_lookups_total{memo="retailer_facts",result="hit"} 7' in text
+        assert 'receipt_memo_evictions_total{memo="retailer_facts"} 1' in text
+
+    def test_render_rescoring(self):
+        text = metrics.render(rescoring={'rules_version': 1, 'running': True, 'passes': 1, 'scanned': 30,
+                                         'rescored': 20, 'pass': {'rules_version': 2, 'total': 40, 'scanned': 10}})
+        assert 'receipt_rescore_running 1' in text
+        assert 'receipt_rescore_receipts_total{result="rescored"} 20' in text
+        assert 'receipt_rescore_pass_ratio{version="2"} 0.25' in text
+
+    def test_label_escaping(self):
+        assert metrics.labels(field='a"b\\c') == '{field="a\\"b\\\\c"}'
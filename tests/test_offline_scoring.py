@@ -0,0 +1,79 @@
+from app.scoring import score_file, score_lines, split_chunks
+from app.handlers.rules import configure_rules
+from app.handlers.utils import determine_points
+
+import io
+import os
+import json
+import tempfile
+import unittest
+
+
+receipt = {
+    "retailer": "M&M Corner Market",
+    "purchaseDate": "2022-03-21",
+    "purchaseTime": "14:33",
+    "items": [
+        {"shortDescription": "Gatorade", "price": "2.25"},
+        {"shortDescription": "Gatorade", "price": "2.25"}
+    ],
+    "total": "4.50"
+}
+
+
+class TestScoreLines(unittest.TestCase):
+
+    def setUp(self):
+        configure_rules(None)
+
+    def test_results_per_line(self):
+        lines = [json.dumps(dict(receipt, id='a')), '', '{not json', json.dumps(dict(receipt, total='4.5')),
+                 json.dumps(receipt)]
+        results = [json.loads(line) for line in score_lines('\n'.join(lines).encode(), first_line=10).splitlines()]
+        points = determine_points(receipt)
+        assert results == [
+            {'line': 10, 'points': points, 'id': 'a'},
+            {'line': 12, 'error': 'Malformed JSON'},
+            {'line': 13, 'error': 'The receipt is invalid', 'field': 'total'},
+            {'line': 14, 'points': points}
+        ]
+
+    def test_chunks_end_at_line_ends(self):
+        data = b'aaaa\nbb\n\ncccccc\nd'
+        chunks = list(split_chunks(data, chunk_bytes=3))
+        assert b''.join(data[start:end] for start, end, _ in chunks) == data
+        assert all(data[end - 1:end] == b'\n' for _, end, _ in chunks[:-1])
+        assert [line for _, _, line in chunks] == [1, 2, 3, 5]
+
+
+class TestScoreFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'receipts.ndjson')
+        with open(self.path, 'w') as receipts:
+            for index in range(200):
+                receipts.write(json.dumps(dict(receipt, id=str(index), total='4.5' if index % 7 else '4.50')) + '\n')
+
+    def tearDown(self):
+        configure_rules(None)
+        self.directory.cleanup()
+
+    def score(self, **options):
+        output = io.BytesIO()
+        progress = score_file(self.path, output, chunk_bytes=1000, **options)
+        assert progress.lines == 200
+        return output.getvalue()
+
+    def test_workers_keep_input_order(self):
+        in_process = self.score(workers=1)
+        assert self.score(workers=2) == in_process
+        results = [json.loads(line) for line in in_process.splitlines()]
+        assert [result['line'] for result in results] == list(range(1, 201))
+        assert [result['id'] for result in results if 'points' in result] == [str(index) for index in range(0, 200, 7)]
+
+    def test_empty_file(self):
+        open(self.path, 'w').close()
+        output = io.BytesIO()
+        assert score_file(self.path, output).lines == 0
+        assert output.getvalue() == b''
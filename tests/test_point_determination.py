@@ -1,8 +1,31 @@
 from app.handlers.utils import (determine_points, get_points_from_retailer, get_points_from_total, 
-                            get_points_from_items, get_points_from_purchase_date, get_points_from_purchase_time)
+                            get_points_from_items, get_points_from_purchase_date, get_points_from_purchase_time,
+                            build_receipt_record, refresh_record, determine_record_points, RULES_VERSION)
+from app.handlers.records import ReceiptRecord
+from app.handlers.rules import RuleSet, DEFAULT_RULES
 
+import random
 import unittest
 
+BLANK_RECEIPT = {
+    "retailer": "",
+    "purchaseDate": "2022-01-02",
+    "purchaseTime": "12:00",
+    "items": [],
+    "total": "0.01"
+}
+
+
+def rule_points(kinds, **fields):
+    # the points the compiled default rules of kinds give a receipt scoring nothing else
+    rules = [rule for rule in DEFAULT_RULES['rules'] if rule['kind'] in kinds]
+    receipt = dict(BLANK_RECEIPT, **fields)
+    return RuleSet({'name': 'only', 'version': 1, 'rules': rules}).score(ReceiptRecord.from_receipt(receipt))
+
+
+def engine_points(receipt):
+    return RuleSet(DEFAULT_RULES).score(ReceiptRecord.from_receipt(receipt))
+
 class TestOverallPointDetermination(unittest.TestCase):
 
     def test_empty_receipt(self):
@@ -37,6 +60,7 @@ class TestOverallPointDetermination(unittest.TestCase):
         }
         points = determine_points(receipt)
         assert points == 28
+        assert engine_points(receipt) == 28
 
 
         receipt = {
@@ -61,8 +85,8 @@ class TestOverallPointDetermination(unittest.TestCase):
             "total": "9.00"
         }
         points = determine_points(receipt)
-        print(points)
         assert points == 109
+        assert engine_points(receipt) == 109
 
 class TestAlphaNumericPointDetermination(unittest.TestCase):
     
@@ -73,18 +97,22 @@ class TestAlphaNumericPointDetermination(unittest.TestCase):
     def test_all_specials(self):
         points = get_points_from_retailer('***')
         assert 0 == points
+        assert 0 == rule_points('retailer_alphanumeric', retailer='***')
 
     def test_all_letters(self):
         points = get_points_from_retailer('please give me this job')
         assert 19 == points
+        assert 19 == rule_points('retailer_alphanumeric', retailer='please give me this job')
 
     def test_all_numbers(self):
         points = get_points_from_retailer('12345')
         assert 5 == points
+        assert 5 == rule_points('retailer_alphanumeric', retailer='12345')
 
     def test_combination(self):
         points = get_points_from_retailer('test 1234 test')
         assert 12 == points
+        assert 12 == rule_points('retailer_alphanumeric', retailer='test 1234 test')
 
     def test_passing_none(self):
         points = get_points_from_retailer(None)
@@ -99,10 +127,12 @@ class TestTotalPointDetermination(unittest.TestCase):
     def test_total_is_integer_and_quarter_multiple(self):
         points = get_points_from_total('10.00')
         assert points == 75
+        assert rule_points('total_multiple', total='10.00') == 75
 
     def test_total_is_quarter_multiple_not_integer(self):
         points = get_points_from_total('10.25')
         assert points == 25
+        assert rule_points('total_multiple', total='10.25') == 25
 
     def test_total_is_none(self):
         points = get_points_from_total(None)
@@ -111,6 +141,7 @@ class TestTotalPointDetermination(unittest.TestCase):
     def test_total_is_neither_integer_or_multiple(self):
         points = get_points_from_total('10.33')
         assert points == 0
+        assert rule_points('total_multiple', total='10.33') == 0
 
 class TestItemsPointDetermination(unittest.TestCase):
     
@@ -121,6 +152,7 @@ class TestItemsPointDetermination(unittest.TestCase):
     def test_empty_list(self):
         points = get_points_from_items([])
         assert points == 0
+        assert rule_points(('item_count_multiple', 'item_description_length_multiple'), items=[]) == 0
 
     def test_list_without_correct_keys(self):
         item = {
@@ -142,6 +174,13 @@ class TestItemsPointDetermination(unittest.TestCase):
         points = get_points_from_items([item, item, item, item])
         assert points == 10
 
+        item = {
+            'shortDescription': 'test',
+            'price': "1.00"
+        }
+        for count, points in [(1, 0), (2, 5), (3, 5), (4, 10)]:
+            assert rule_points(('item_count_multiple', 'item_description_length_multiple'), items=[item] * count) == points
+
     def test_price_is_none(self):
         item = {
             'shortDescription': 'something', 
@@ -165,6 +204,7 @@ class TestItemsPointDetermination(unittest.TestCase):
         }
         points = get_points_from_items([item])
         assert points == 0
+        assert rule_points(('item_count_multiple', 'item_description_length_multiple'), items=[item]) == 0
 
     def test_valid_point_earners(self):
         item = {
@@ -173,6 +213,7 @@ class TestItemsPointDetermination(unittest.TestCase):
         }
         points = get_points_from_items([item])
         assert points == 20
+        assert rule_points(('item_count_multiple', 'item_description_length_multiple'), items=[item]) == 20
 
         item = {
             'shortDescription': ' withspace ',
@@ -180,6 +221,7 @@ class TestItemsPointDetermination(unittest.TestCase):
         }
         points = get_points_from_items([item])
         assert points == 20
+        assert rule_points(('item_count_multiple', 'item_description_length_multiple'), items=[item]) == 20
 
         item = {
             'shortDescription': ' withspace ',
@@ -187,6 +229,7 @@ class TestItemsPointDetermination(unittest.TestCase):
         }
         points = get_points_from_items([item])
         assert points == 60
+        assert rule_points(('item_count_multiple', 'item_description_length_multiple'), items=[item]) == 60
 
         item = {
             'shortDescription': ' withspace ',
@@ -194,6 +237,7 @@ class TestItemsPointDetermination(unittest.TestCase):
         }
         points = get_points_from_items([item, item])
         assert points == 125
+        assert rule_points(('item_count_multiple', 'item_description_length_multiple'), items=[item, item]) == 125
 
 class TestPurchaseDatePointDetermination(unittest.TestCase):
 
@@ -213,11 +257,13 @@ class TestPurchaseDatePointDetermination(unittest.TestCase):
         date = "2022-01-02"
         points = get_points_from_purchase_date(date)
         assert points == 0
+        assert rule_points('purchase_day_odd', purchaseDate=date) == 0
 
     def test_date_is_odd(self):
         date = "2022-01-03"
         points = get_points_from_purchase_date(date)
         assert points == 6
+        assert rule_points('purchase_day_odd', purchaseDate=date) == 6
 
 class TestPurchaseTimePointDetermination(unittest.TestCase):
     def test_time_is_list(self):
@@ -236,27 +282,83 @@ class TestPurchaseTimePointDetermination(unittest.TestCase):
         time = "14:00"
         points = get_points_from_purchase_time(time)
         assert points == 0
+        assert rule_points('purchase_time_between', purchaseTime=time) == 0
 
     def test_time_is_at_four(self):
         time = "16:00"
         points = get_points_from_purchase_time(time)
         assert points == 0
+        assert rule_points('purchase_time_between', purchaseTime=time) == 0
 
     def test_time_is_not_point_earner(self):
         date = "12:00"
         points = get_points_from_purchase_time(date)
         assert points == 0
+        assert rule_points('purchase_time_between', purchaseTime=date) == 0
 
     def test_time_is_point_earner(self):
         date = "14:30"
         points = get_points_from_purchase_time(date)
         assert points == 10
+        assert rule_points('purchase_time_between', purchaseTime=date) == 10
 
         date = "15:00"
         points = get_points_from_purchase_time(date)
         assert points == 10
+        assert rule_points('purchase_time_between', purchaseTime=date) == 10
 
         date = "15:30"
         points = get_points_from_purchase_time(date)
         assert points == 10
-            
\ No newline at end of file
+        assert rule_points('purchase_time_between', purchaseTime=date) == 10
+            
+class TestRecordPointDetermination(unittest.TestCase):
+
+    receipt = {
+        "retailer": "target",
+        "purchaseDate": "2022-01-01",
+        "purchaseTime": "13:01",
+        "items": [{"shortDescription": "tes", "price": "100.00"}],
+        "total": "100.00"
+    }
+
+    def test_record_is_scored_and_tagged(self):
+        record = build_receipt_record(self.receipt)
+        assert record.points == determine_points(self.receipt)
+        assert record.rules_version == RULES_VERSION
+
+    def test_stale_record_is_rescored(self):
+        record = build_receipt_record(self.receipt)
+        stale = record.with_points(0, RULES_VERSION - 1)
+        current = refresh_record(stale)
+        assert current.points == record.points
+        assert current.rules_version == RULES_VERSION
+        assert refresh_record(record) is record
+
+    def test_float_rounding_matches(self):
+        # 15.00 * 0.2 is 3.0000000000000004 as a float, which rounds up to 4
+        receipt = dict(self.receipt, items=[{"shortDescription": "abc", "price": "15.00"}])
+        assert determine_record_points(ReceiptRecord.from_receipt(receipt)) == determine_points(receipt)
+
+    def test_impossible_dates_match(self):
+        for purchase_date in ("2022-02-31", "2021-02-29", "2020-02-29", "0000-01-01", "2022-04-31"):
+            receipt = dict(self.receipt, purchaseDate=purchase_date)
+            assert determine_record_points(ReceiptRecord.from_receipt(receipt)) == determine_points(receipt)
+
+    def test_random_receipts_match(self):
+        generator = random.Random(7)
+        words = ['Gatorade', 'Pepsi - 12-oz', ' Klarbrunn 12-PK ', 'ab', 'Emils Cheese Pizza', 'M&M']
+        for _ in range(2000):
+            items = [
+                {"shortDescription": generator.choice(words[:-1]),
+                 "price": f"{generator.randint(0, 40)}.{generator.choice([0, 25, 50, 75, generator.randint(0, 99)]):02d}"}
+                for _ in range(generator.randint(1, 6))
+            ]
+            receipt = {
+                "retailer": generator.choice(words),
+                "purchaseDate": f"{generator.randint(1999, 2030)}-{generator.randint(1, 12):02d}-{generator.randint(1, 31):02d}",
+                "purchaseTime": f"{generator.randint(0, 23)}:{generator.randint(0, 59):02d}",
+                "items": items,
+                "total": f"{generator.randint(0, 200)}.{generator.choice([0, 25, 50, 75, generator.randint(0, 99)]):02d}"
+            }
+            assert determine_record_points(ReceiptRecord.from_receipt(receipt)) == determine_points(receipt), receipt
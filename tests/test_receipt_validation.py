@@ -1,4 +1,4 @@
-from app.handlers.utils import validate_receipt
+from app.handlers.utils import validate_receipt, find_receipt_error, read_receipt
 
 import unittest
 
@@ -161,4 +161,59 @@ class TestReceiptValidation(unittest.TestCase):
         receipt['items'][0].update({
             'price': '1.25'
         })
-        assert validate_receipt(receipt) is True
\ No newline at end of file
+        assert validate_receipt(receipt) is True
+
+
+class TestReceiptValidationErrors(unittest.TestCase):
+
+    def setUp(self):
+        self.receipt = {
+            "retailer": "target",
+            "purchaseDate": "2022-01-02",
+            "purchaseTime": "13:13",
+            "total": "1.25",
+            "items": [
+                {"shortDescription": "Pepsi - 12-oz", "price": "1.25"},
+                {"shortDescription": "Dasani", "price": "1.40"}
+            ]
+        }
+
+    def test_valid_receipt_has_no_error(self):
+        assert find_receipt_error(self.receipt) is None
+
+    def test_non_object_receipt(self):
+        assert find_receipt_error([]).field == 'receipt'
+
+    def test_missing_field_is_named(self):
+        del self.receipt['purchaseTime']
+        assert find_receipt_error(self.receipt).field == 'purchaseTime'
+
+    def test_offending_item_is_named(self):
+        self.receipt['items'][1]['price'] = '1.4'
+        error = find_receipt_error(self.receipt)
+        assert error.field == 'items[1]'
+        assert error.reason == 'invalid price'
+
+    def test_amounts_fit_in_64_bits(self):
+        # 2 ** 63 - 1 cents is the largest amount a record holds
+        for field, item_price, total in [('items[0]', '92233720368547758.08', '1.25'),
+                                         ('total', '1.25', '92233720368547758.08'),
+                                         ('items[0]', '100000000000000000000.00', '1.25')]:
+            self.receipt['items'][0]['price'] = item_price
+            self.receipt['total'] = total
+            error = find_receipt_error(self.receipt)
+            assert error.field == field
+            assert 'out of range' in error.reason
+            assert read_receipt(self.receipt) == (None, error)
+
+        self.receipt['items'][0]['price'] = '92233720368547758.07'
+        self.receipt['total'] = '92233720368547758.07'
+        assert find_receipt_error(self.receipt) is None
+        record, error = read_receipt(self.receipt)
+        assert error is None
+        assert record.prices[0] == record.total_cents == 2 ** 63 - 1
+
+    def test_first_failure_is_reported(self):
+        self.receipt['retailer'] = ';'
+        self.receipt['purchaseDate'] = 'bad'
+        assert find_receipt_error(self.receipt).field == 'retailer'
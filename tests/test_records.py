@@ -0,0 +1,54 @@
+from app.handlers.records import ReceiptRecord
+
+import json
+import pickle
+import unittest
+
+
+class TestReceiptRecord(unittest.TestCase):
+
+    receipt = {
+        "retailer": "M&M Corner Market",
+        "purchaseDate": "2022-03-20",
+        "purchaseTime": "14:33",
+        "items": [
+            {"shortDescription": "Gatorade", "price": "2.25"},
+            {"shortDescription": "   Klarbrunn 12-PK 12 FL OZ  ", "price": "12.00"}
+        ],
+        "total": "14.25"
+    }
+
+    def test_columns(self):
+        record = ReceiptRecord.from_receipt(self.receipt)
+        assert record.total_cents == 1425
+        assert record.purchase_date == 20220320
+        assert record.purchase_minute == 14 * 60 + 33
+        assert record.item_descriptions == ["Gatorade", "   Klarbrunn 12-PK 12 FL OZ  "]
+        assert list(record.prices) == [225, 1200]
+
+    def test_rebuilds_receipt(self):
+        assert ReceiptRecord.from_receipt(self.receipt).to_receipt() == self.receipt
+
+    def test_rebuild_normalizes_time(self):
+        record = ReceiptRecord.from_receipt(dict(self.receipt, purchaseTime="9:5"))
+        assert record.to_receipt()['purchaseTime'] == "09:05"
+
+    def test_json_round_trip(self):
+        record = ReceiptRecord.from_receipt(self.receipt).with_points(109, 1)
+        assert ReceiptRecord.from_json(record.to_json()) == record
+
+    def test_pickle_round_trip(self):
+        record = ReceiptRecord.from_receipt(self.receipt).with_points(109, 1)
+        assert pickle.loads(pickle.dumps(record)) == record
+
+    def test_strings_are_shared(self):
+        copy = json.loads(json.dumps(self.receipt))
+        first, second = ReceiptRecord.from_receipt(self.receipt), ReceiptRecord.from_receipt(copy)
+        assert first.retailer is second.retailer
+        assert all(a is b for a, b in zip(first.descriptions, second.descriptions))
+
+    def test_decoded_records_share_strings(self):
+        record = ReceiptRecord.from_receipt(self.receipt)
+        for decoded in (ReceiptRecord.from_json(record.to_json()), pickle.loads(pickle.dumps(record))):
+            assert decoded.retailer is record.retailer
+            assert decoded.descriptions[1] is record.descriptions[1]
@@ -0,0 +1,130 @@
+from app.handlers import rescore
+from app.handlers.rescore import Rescore, Rescorer, configure_rescoring, wake_rescoring, rescoring_stats
+from app.handlers.records import ReceiptRecord
+from app.handlers.rules import DEFAULT_RULES, configure_rules, reload_rules
+from app.handlers.utils import build_receipt_record
+from app.storage import MemoryStore, BoundedStore, SqliteStore
+
+import os
+import time
+import tempfile
+import unittest
+
+PROMOTION = {'name': 'promotion', 'version': 2, 'rules': DEFAULT_RULES['rules'] + [
+    {'name': 'promotion', 'kind': 'total_at_least', 'cents': 0, 'points': 1000}]}
+
+
+def make_record(total):
+    return build_receipt_record({
+        'retailer': 'Target',
+        'purchaseDate': '2022-01-01',
+        'purchaseTime': '14:33',
+        'items': [{'shortDescription': 'Gatorade', 'price': total}],
+        'total': total
+    })
+
+
+def wait_for_version(version, seconds=5.0):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        stats = rescoring_stats()
+        if stats['rules_version'] == version and not stats['running']:
+            return stats
+        time.sleep(0.01)
+    raise AssertionError(f'Rescoring to v{version} did not finish, {rescoring_stats()}')
+
+
+class TestRescoring(unittest.TestCase):
+
+    def setUp(self):
+        configure_rules(None)
+        self.store = MemoryStore()
+        self.store.put_many({str(index): make_record(f'{index}.00') for index in range(25)})
+        self.before = {receipt_id: record.points for receipt_id, record in self.store.iterate()}
+        # a long check interval, only wake_rescoring starts passes for new rules
+        configure_rescoring(self.store, chunk_size=10, share=1.0, check_seconds=60)
+        wait_for_version(DEFAULT_RULES['version'])
+
+    def tearDown(self):
+        configure_rescoring(None)
+        configure_rules(None)
+
+    def test_first_pass_keeps_current_receipts(self):
+        stats = rescoring_stats()
+        assert stats['passes'] == 1
+        assert stats['rescored'] == 0
+        assert stats['pass']['scanned'] == stats['pass']['total'] == 25
+        assert stats['pass']['remaining_seconds'] == 0
+
+    def test_rescored_when_rules_change(self):
+        reload_rules(PROMOTION)
+        wake_rescoring()
+        stats = wait_for_version(2)
+        assert stats['passes'] == 2
+        assert stats['rescored'] == 25
+        assert stats['pass']['rescored'] == 25
+        for receipt_id, record in self.store.iterate():
+            assert record.rules_version == 2
+            assert record.points == self.before[receipt_id] + 1000
+
+    def test_stored_records_are_not_changed(self):
+        stored = dict(self.store.iterate())
+        reload_rules(PROMOTION)
+        wake_rescoring()
+        wait_for_version(2)
+        assert all(record.rules_version == DEFAULT_RULES['version'] for record in stored.values())
+        assert all(self.store.get(receipt_id) is not record for receipt_id, record in stored.items())
+
+    def test_pass_stops_for_newer_rules(self):
+        promotion = reload_rules(PROMOTION)
+        reload_rules(dict(PROMOTION, version=3))
+        # a pass for rules no longer active leaves the store alone, the next one starts over
+        rescorer = Rescorer(self.store, share=1.0)
+        rescorer.resumed = time.perf_counter()
+        assert not rescorer.rescore_chunk(Rescore(promotion, 25), list(self.store.iterate()))
+        assert all(record.rules_version == DEFAULT_RULES['version'] for _, record in self.store.iterate())
+        wake_rescoring()
+        wait_for_version(3)
+        assert all(record.rules_version == 3 for _, record in self.store.iterate())
+
+    def test_stopped_without_store(self):
+        thread = rescore.rescorer.thread
+        configure_rescoring(None)
+        assert not thread.is_alive()
+        assert rescoring_stats() is None
+        wake_rescoring()
+
+    def test_validation(self):
+        for chunk_size, share in [(0, 0.5), (10, 0), (10, 1.5)]:
+            with self.assertRaises(ValueError):
+                Rescorer(self.store, chunk_size, share)
+
+
+class TestRescoringBoundedStore(unittest.TestCase):
+
+    def setUp(self):
+        configure_rules(None)
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = BoundedStore(max_entries=10, disk=SqliteStore(
+            os.path.join(self.directory.name, 'spill.db'), encode=ReceiptRecord.to_json, decode=ReceiptRecord.from_json))
+        self.store.put_many({str(index): make_record(f'{index}.00') for index in range(300)})
+        configure_rescoring(self.store, chunk_size=50, share=1.0, check_seconds=60)
+        wait_for_version(DEFAULT_RULES['version'])
+
+    def tearDown(self):
+        configure_rescoring(None)
+        configure_rules(None)
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_pass_leaves_spilled_receipts_on_disk(self):
+        in_memory = list(self.store.entries)
+        evictions = dict(self.store.stats()['evictions'])
+        reload_rules(PROMOTION)
+        wake_rescoring()
+        assert wait_for_version(2)['rescored'] == 300
+        assert len(self.store.entries) <= 10
+        assert list(self.store.entries) == in_memory
+        assert self.store.stats()['evictions'] == evictions
+        assert all(record.rules_version == 2 for _, record in self.store.iterate())
+        assert len(self.store) == 300
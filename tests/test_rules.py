@@ -0,0 +1,132 @@
+from app.handlers import rules
+from app.handlers.rules import RuleSet, RuleError, DEFAULT_RULES, configure_rules, current_rules, reload_rules
+from app.handlers.records import ReceiptRecord
+from app.handlers.utils import build_receipt_record, refresh_record, determine_points
+
+import os
+import json
+import tempfile
+import unittest
+
+
+receipt = {
+    "retailer": "M&M Corner Market",
+    "purchaseDate": "2022-12-21",
+    "purchaseTime": "14:33",
+    "items": [
+        {"shortDescription": "Gatorade", "price": "2.25"},
+        {"shortDescription": "Holiday Cookies", "price": "4.00"},
+        {"shortDescription": "Pepsi - 12-oz", "price": "1.25"}
+    ],
+    "total": "7.50"
+}
+
+
+def promotion(version=2, **rule):
+    return {'name': 'promotion', 'version': version, 'rules': DEFAULT_RULES['rules'] + [dict(name='promotion', **rule)]}
+
+
+class TestRuleSet(unittest.TestCase):
+
+    record = ReceiptRecord.from_receipt(receipt)
+
+    def test_default_rules_match_determine_points(self):
+        assert RuleSet(DEFAULT_RULES).score(self.record) == determine_points(receipt)
+
+    def test_promotion_kinds(self):
+        base = determine_points(receipt)
+        cases = [
+            (dict(kind='retailer_contains', text='corner', points=30), 30),
+            (dict(kind='retailer_contains', text='target', points=30), 0),
+            (dict(kind='total_at_least', cents=750, points=15), 15),
+            (dict(kind='total_at_least', cents=751, points=15), 0),
+            (dict(kind='purchase_date_between', **{'from': '2022-12-01', 'to': '2022-12-21'}, points=100), 100),
+            (dict(kind='purchase_date_between', **{'from': '2022-12-22', 'to': '2022-12-31'}, points=100), 0),
+            (dict(kind='item_description_contains', text='COOKIE', points=8), 8),
+            (dict(kind='item_count_multiple', count=3, points=7), 7),
+        ]
+        for rule, extra in cases:
+            assert RuleSet(promotion(**rule)).score(self.record) == base + extra, rule
+
+    def test_invalid_definitions(self):
+        for definition in [
+            [],
+            {'name': 'no version', 'rules': []},
+            {'name': 'bool version', 'version': True, 'rules': []},
+            promotion(kind='no_such_kind', points=1),
+            promotion(kind='total_multiple', points=1),
+            promotion(kind='total_multiple', cents=0, points=1),
+            promotion(kind='total_at_least', cents=100, points=True),
+            promotion(kind='purchase_date_between', **{'from': '2022-02-30', 'to': '2022-03-01'}, points=1),
+            promotion(kind='purchase_time_between', after='25:00', before='26:00', points=1),
+            promotion(kind='item_description_length_multiple', length=3, price_multiplier=float('inf')),
+            promotion(kind='item_description_length_multiple', length=3, price_multiplier=float('nan')),
+            promotion(kind='item_description_length_multiple', length=3, price_multiplier=-0.2),
+            promotion(kind='item_description_length_multiple', length=3, price_multiplier=10 ** 400),
+            promotion(kind='item_description_length_multiple', length=3, price_multiplier='0.2'),
+        ]:
+            with self.assertRaises(RuleError):
+                RuleSet(definition)
+
+    def test_hits_and_timings(self):
+        rule_set = RuleSet(DEFAULT_RULES, timing_interval=2)
+        for _ in range(4):
+            rule_set.score(self.record)
+
+        stats = rule_set.stats()
+        assert stats['scored'] == 4
+        hits = {rule['name']: rule['hits'] for rule in stats['rules']}
+        assert hits['odd purchase day'] == 4
+        assert hits['round dollar total'] == 0
+        assert all(rule['mean_us'] is not None for rule in stats['rules'])
+
+
+class TestRuleReload(unittest.TestCase):
+
+    def setUp(self):
+        configure_rules(None)
+
+    def tearDown(self):
+        configure_rules(None)
+
+    def test_new_version_rescores_records(self):
+        record = build_receipt_record(receipt)
+        reload_rules(promotion(kind='total_at_least', cents=0, points=1000))
+        assert current_rules().version == 2
+
+        current = refresh_record(record)
+        assert current.points == record.points + 1000
+        assert current.rules_version == 2
+
+    def test_changed_rules_need_a_new_version(self):
+        with self.assertRaises(RuleError):
+            reload_rules(promotion(version=1, kind='total_at_least', cents=0, points=1000))
+        assert current_rules().definition == DEFAULT_RULES
+        # reloading the active rules again is a no op
+        assert reload_rules(DEFAULT_RULES) is current_rules()
+
+        # neither can a version used earlier
+        reload_rules(promotion(version=5, kind='total_at_least', cents=0, points=1))
+        reload_rules(DEFAULT_RULES)
+        with self.assertRaises(RuleError):
+            reload_rules(promotion(version=5, kind='total_at_least', cents=0, points=2))
+
+    def test_rules_file_is_polled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'rules.json')
+            with open(path, 'w') as rules_file:
+                json.dump(promotion(kind='total_at_least', cents=0, points=1), rules_file)
+            configure_rules(path, check_seconds=0)
+            assert current_rules().version == 2
+
+            with open(path, 'w') as rules_file:
+                json.dump(promotion(version=3, kind='total_at_least', cents=0, points=2), rules_file)
+            os.utime(path, ns=(1, 1))
+            assert current_rules().version == 3
+
+            # a broken file keeps the active rules
+            with open(path, 'w') as rules_file:
+                rules_file.write('{')
+            os.utime(path, ns=(2, 2))
+            assert current_rules().version == 3
+            assert rules.rules_mtime == 2
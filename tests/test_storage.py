@@ -0,0 +1,367 @@
+from app.storage import MemoryStore, SqliteStore, SharedStore, StoreServer, BoundedStore, IndexedStore, JournaledStore, ShardedStore, create_store
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+
+class StoreContract:
+
+    entry = {'receipt': {'retailer': 'target'}, 'points': 6, 'rules_version': 1}
+
+    def test_get_missing(self):
+        assert self.store.get('missing') is None
+        assert self.store.get('missing', 5) == 5
+
+    def test_put_and_get(self):
+        self.store.put('a', self.entry)
+        assert self.store.get('a') == self.entry
+        assert len(self.store) == 1
+
+    def test_put_replaces(self):
+        self.store.put('a', self.entry)
+        self.store.put('a', dict(self.entry, points=10))
+        assert self.store.get('a')['points'] == 10
+        assert len(self.store) == 1
+
+    def test_get_many_skips_missing(self):
+        self.store.put_many({'a': self.entry, 'b': self.entry})
+        assert self.store.get_many(['a', 'missing', 'b']) == {'a': self.entry, 'b': self.entry}
+
+    def test_iterate(self):
+        entries = {str(index): dict(self.entry, points=index) for index in range(25)}
+        self.store.put_many(entries)
+        assert dict(self.store.iterate(chunk_size=10)) == entries
+
+    def test_delete_many(self):
+        self.store.put_many({'a': self.entry, 'b': self.entry})
+        self.store.delete_many(['a', 'missing'])
+        assert self.store.get('a') is None
+        assert self.store.get('b') == self.entry
+        assert len(self.store) == 1
+
+    def test_replace_many(self):
+        self.store.put_many({'a': self.entry, 'b': self.entry})
+        self.store.replace_many({'a': dict(self.entry, points=10)})
+        assert self.store.get('a')['points'] == 10
+        assert self.store.get('b') == self.entry
+        assert len(self.store) == 2
+
+    def test_approximate_bytes_grows(self):
+        empty = self.store.approximate_bytes()
+        self.store.put_many({str(index): dict(self.entry, points=index) for index in range(500)})
+        assert self.store.approximate_bytes() > empty
+
+
+class TestMemoryStore(StoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryStore()
+
+
+class TestShardedStore(StoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.store = ShardedStore(shards=4)
+
+    def test_ids_spread_across_shards(self):
+        self.store.put_many({str(index): self.entry for index in range(100)})
+        assert all(shard.entries for shard in self.store.shards)
+        assert len(self.store) == 100
+
+    def test_concurrent_writers(self):
+        def write(prefix):
+            for index in range(500):
+                self.store.put(f'{prefix}-{index}', self.entry)
+            self.store.put_many({f'{prefix}-batch-{index}': self.entry for index in range(500)})
+            self.store.delete_many([f'{prefix}-{index}' for index in range(0, 500, 2)])
+
+        threads = [threading.Thread(target=write, args=(prefix,)) for prefix in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(self.store) == 8 * 750
+        assert len(dict(self.store.iterate(chunk_size=100))) == 8 * 750
+
+    def test_needs_a_shard(self):
+        with self.assertRaises(ValueError):
+            ShardedStore(shards=0)
+
+
+class TestSqliteStore(StoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'receipts.db')
+        self.store = SqliteStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_entries_survive_reopen(self):
+        self.store.put('a', self.entry)
+        self.store.close()
+        self.store = SqliteStore(self.path)
+        assert self.store.get('a') == self.entry
+
+
+class TestBoundedStore(StoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.store = BoundedStore()
+
+    def test_lru_eviction_order(self):
+        store = BoundedStore(max_entries=2)
+        store.put('a', 1)
+        store.put('b', 2)
+        store.get('a')
+        store.put('c', 3)
+        assert store.get('b') is None
+        assert store.get('a') == 1 and store.get('c') == 3
+        assert store.stats()['evictions']['capacity'] == 1
+
+    def test_byte_ceiling(self):
+        store = BoundedStore(max_bytes=5000)
+        store.put_many({str(index): 'x' * 100 for index in range(100)})
+        assert store.approximate_bytes() <= 5000
+        assert 0 < len(store) < 100
+
+    def test_ttl_expiry(self):
+        store = BoundedStore(eviction='ttl', ttl_seconds=60.0)
+        with mock.patch('time.monotonic', return_value=100.0):
+            store.put('a', 1)
+        with mock.patch('time.monotonic', return_value=150.0):
+            store.put('b', 2)
+            assert store.get('a') == 1
+        with mock.patch('time.monotonic', return_value=161.0):
+            assert store.get('a') is None
+            assert store.get('b') == 2
+        assert store.stats()['evictions']['expired'] == 1
+
+
+class TestBoundedStoreWithDisk(StoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.disk = SqliteStore(os.path.join(self.directory.name, 'spill.db'))
+        self.store = BoundedStore(max_entries=3, disk=self.disk)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_spills_and_reads_back(self):
+        entries = {str(index): dict(self.entry, points=index) for index in range(600)}
+        self.store.put_many(entries)
+        assert len(self.store.entries) == 3
+        assert len(self.store) == 600
+        assert self.store.get('0') == entries['0']
+        assert self.store.get_many(['1', '599', 'missing']) == {'1': entries['1'], '599': entries['599']}
+        assert len(self.store) == 600
+        assert dict(self.store.iterate(chunk_size=50)) == entries
+        reads = self.store.stats()['reads']
+        assert reads['disk'] >= 2 and reads['missing'] == 1
+
+    def test_replace_keeps_tiers(self):
+        self.store.put_many({str(index): dict(self.entry, points=index) for index in range(600)})
+        in_memory = list(self.store.entries)
+        evictions = self.store.stats()['evictions']
+        replaced = {str(index): dict(self.entry, points=index + 1000) for index in range(600)}
+        self.store.replace_many(dict(replaced, missing=self.entry))
+        # nothing promoted or evicted, the memory tier keeps its entries in their order
+        assert list(self.store.entries) == in_memory
+        assert self.store.stats()['evictions'] == evictions
+        assert self.store.stats()['reads']['disk'] == 0
+        assert len(self.store) == 600
+        assert dict(self.store.iterate(chunk_size=50)) == replaced
+
+    def test_spilled_entries_survive_close(self):
+        self.store.put_many({str(index): self.entry for index in range(10)})
+        self.store.close()
+        self.disk = SqliteStore(os.path.join(self.directory.name, 'spill.db'))
+        self.store = BoundedStore(max_entries=3, disk=self.disk)
+        assert len(self.disk) == 7
+        assert self.store.get('0') == self.entry
+
+
+class TestJournaledStore(StoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'journal')
+        self.store = JournaledStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def reopen(self, **options):
+        self.store.close()
+        self.store = JournaledStore(self.path, **options)
+
+    def test_writes_survive_reopen(self):
+        self.store.put_many({str(index): dict(self.entry, points=index) for index in range(100)})
+        self.store.put('5', self.entry)
+        self.store.delete_many(['6'])
+        self.reopen()
+        assert len(self.store) == 99
+        assert self.store.get('5') == self.entry
+        assert self.store.get('6') is None
+
+    def test_wait_returns_after_sync(self):
+        self.reopen(wait=True)
+        self.store.put('a', self.entry)
+        assert self.store.committed == self.store.sequence
+        assert self.store.stats()['journal']['records'] == 1
+
+    def test_torn_tail_is_dropped(self):
+        self.store.put_many({'a': self.entry, 'b': self.entry})
+        self.store.close()
+        segment = os.path.join(self.path, 'log.1')
+        with open(segment, 'ab') as log:
+            log.write(b'\x40\x00\x00\x00torn')
+        self.store = JournaledStore(self.path)
+        assert len(self.store) == 2
+        self.store.put('c', self.entry)
+        self.reopen()
+        assert len(self.store) == 3
+
+    def test_snapshot_replaces_segments(self):
+        self.reopen(snapshot_records=50)
+        for index in range(120):
+            self.store.put(str(index), dict(self.entry, points=index))
+        self.store.delete_many(['0'])
+        self.reopen()
+        files = os.listdir(self.path)
+        assert any(name.startswith('snapshot.') for name in files)
+        assert 'log.1' not in files
+        assert len(self.store) == 119
+        assert self.store.get('119')['points'] == 119
+
+
+def purchase_keys(entry):
+    return (entry['receipt']['retailer'], entry.get('date', 20220101)) if isinstance(entry, dict) else None
+
+
+class TestIndexedStore(StoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.store = IndexedStore(MemoryStore(), purchase_keys)
+
+    def put_receipts(self):
+        # receipt i from retailer i % 3, purchased on day i % 10 + 1 of january
+        self.store.put_many({f'id{index:02d}': dict(self.entry, receipt={'retailer': f'shop {index % 3}'},
+                                                    date=20220101 + index % 10) for index in range(30)})
+
+    def ids(self, **query):
+        return [receipt_id for receipt_id, _ in self.store.query(**query)[0]]
+
+    def test_query_by_retailer_and_dates(self):
+        self.put_receipts()
+        ids = self.ids(retailer=' SHOP 1', start=20220103, end=20220105)
+        assert ids == ['id22', 'id13', 'id04']
+        assert len(self.ids()) == 30
+        assert self.ids(retailer='other') == []
+        assert self.ids(start=20220111) == []
+
+    def test_pages_cover_every_match_once(self):
+        self.put_receipts()
+        pages = []
+        after = None
+        while True:
+            page, after = self.store.query(retailer='shop 2', after=after, limit=3)
+            pages.extend(receipt_id for receipt_id, _ in page)
+            if after is None:
+                break
+        assert pages == self.ids(retailer='shop 2', limit=100)
+        assert len(pages) == 10
+
+    def test_index_follows_writes(self):
+        self.put_receipts()
+        self.store.put('id00', dict(self.entry, receipt={'retailer': 'shop 1'}, date=20220301))
+        self.store.delete_many(['id01'])
+        assert 'id00' in self.ids(retailer='shop 1')
+        assert 'id00' not in self.ids(retailer='shop 0')
+        assert 'id01' not in self.ids()
+        assert len(self.store.index) == 29
+
+    def test_built_from_stored_entries(self):
+        self.put_receipts()
+        rebuilt = IndexedStore(self.store.store, purchase_keys)
+        assert self.ids(retailer='shop 0') == [receipt_id for receipt_id, _ in rebuilt.query(retailer='shop 0')[0]]
+
+    def test_evicted_entries_leave_the_index(self):
+        self.store = IndexedStore(BoundedStore(max_entries=10), purchase_keys)
+        for index in range(500):
+            self.store.put(f'id{index}', dict(self.entry, receipt={'retailer': 'shop'}))
+            assert len(self.store.index) == len(self.store)
+        assert len(self.store) == 10
+        assert len(self.ids()) == 10
+
+    def test_expired_entries_leave_the_index(self):
+        self.store = IndexedStore(BoundedStore(eviction='ttl', ttl_seconds=60.0), purchase_keys)
+        with mock.patch('time.monotonic', return_value=100.0):
+            self.put_receipts()
+        with mock.patch('time.monotonic', return_value=200.0):
+            self.store.put('new', dict(self.entry, receipt={'retailer': 'shop'}))
+        assert len(self.store.index) == len(self.store) == 1
+
+    def test_spilled_entries_stay_in_the_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.store = IndexedStore(BoundedStore(max_entries=10, disk=SqliteStore(os.path.join(directory, 'spill.db'))),
+                                      purchase_keys)
+            self.put_receipts()
+            assert len(self.store.index) == len(self.store) == 30
+            assert len(self.ids()) == 30
+            self.store.close()
+
+    def test_failed_put_leaves_the_index(self):
+        with mock.patch.object(self.store.store, 'put_many', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                self.put_receipts()
+        assert len(self.store.index) == 0
+
+    def test_only_indexed_stores_support_queries(self):
+        assert self.store.supports_query
+        assert not MemoryStore().supports_query
+        with self.assertRaises(NotImplementedError):
+            MemoryStore().query(retailer='shop 0')
+
+
+class TestSharedStore(StoreContract, unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        address = os.path.join(self.directory.name, 'receipts.sock')
+        self.server = StoreServer(MemoryStore(), address, b'test')
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.store = SharedStore(address, b'test')
+        self.other_worker = SharedStore(address, b'test')
+
+    def tearDown(self):
+        self.store.close()
+        self.other_worker.close()
+        self.server.close()
+        self.directory.cleanup()
+
+    def test_writes_are_visible_to_other_clients(self):
+        self.store.put('a', self.entry)
+        assert self.other_worker.get('a') == self.entry
+
+    def test_abandoned_iteration(self):
+        self.store.put_many({str(index): self.entry for index in range(25)})
+        iterator = self.store.iterate(chunk_size=10)
+        next(iterator)
+        iterator.close()
+        assert len(list(self.store.iterate(chunk_size=10))) == 25
+
+
+class TestCreateStore(unittest.TestCase):
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_store('nope')
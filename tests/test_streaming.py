@@ -0,0 +1,59 @@
+from app.handlers.streaming import iter_json_documents
+
+import json
+import unittest
+
+
+async def collect(body, chunk_size, **kwargs):
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    documents = []
+    async for batch in iter_json_documents(chunks(), **kwargs):
+        documents.extend(batch)
+    return documents
+
+
+class TestJsonDocumentStreaming(unittest.IsolatedAsyncioTestCase):
+
+    receipt = {"retailer": "target", "total": "1.25"}
+
+    async def test_ndjson_across_chunk_boundaries(self):
+        body = '\n'.join([json.dumps(self.receipt), '{bad', '', json.dumps(self.receipt)]).encode()
+        for chunk_size in (1, 7, len(body)):
+            documents = await collect(body, chunk_size)
+            assert documents == [
+                (1, self.receipt, None),
+                (2, None, 'Malformed JSON'),
+                (3, self.receipt, None)
+            ]
+
+    async def test_json_array_across_chunk_boundaries(self):
+        body = json.dumps([self.receipt, 123, self.receipt]).encode()
+        for chunk_size in (1, 5, len(body)):
+            documents = await collect(body, chunk_size)
+            assert documents == [(1, self.receipt, None), (2, 123, None), (3, self.receipt, None)]
+
+    async def test_unterminated_array(self):
+        documents = await collect(b'[{"a": 1}, {"b": ', 4)
+        assert documents == [(1, {'a': 1}, None), (2, None, 'Malformed JSON')]
+
+    async def test_malformed_array_element_is_reported_once_complete(self):
+        # the rest of the body is more than max_document_bytes, an incomplete element that long is too large
+        body = b'[{"a": 1}, {"b" 2}, ' + b'{"c": 3}, ' * 10 + b']'
+        for chunk_size in (1, 4, len(body)):
+            documents = await collect(body, chunk_size, max_document_bytes=20)
+            assert documents == [(1, {'a': 1}, None), (2, None, 'Malformed JSON')]
+
+    async def test_oversized_array_element(self):
+        body = b'[{"a": 1}, {"b": "' + b'x' * 50 + b'"}, {"c": 3}]'
+        documents = await collect(body, 4, max_document_bytes=20)
+        assert documents == [(1, {'a': 1}, None), (2, None, 'Document too large')]
+
+    async def test_oversized_line_is_skipped(self):
+        documents = await collect(b'x' * 50 + b'\n{"a": 1}', 4, max_document_bytes=10)
+        assert documents == [(1, None, 'Document too large'), (2, {'a': 1}, None)]
+
+    async def test_empty_body(self):
+        assert await collect(b'', 4) == []